@@ -37,6 +37,7 @@
 #include "lsst/ip/diffim/KernelCandidateDetection.h"
 
 #include "lsst/ip/diffim/KernelPca.h"
+#include "lsst/ip/diffim/SpatialKernelImageCache.h"
 #include "lsst/ip/diffim/AssessSpatialKernelVisitor.h"
 #include "lsst/ip/diffim/BuildSingleKernelVisitor.h"
 #include "lsst/ip/diffim/BuildSpatialKernelVisitor.h"
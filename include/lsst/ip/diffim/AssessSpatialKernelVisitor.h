@@ -15,6 +15,7 @@
 #include "lsst/afw/math.h"
 #include "lsst/afw/image.h"
 #include "lsst/ip/diffim.h"
+#include "lsst/ip/diffim/SpatialKernelImageCache.h"
 #include "lsst/daf/base/PropertySet.h"
 
 namespace lsst {
@@ -33,26 +34,41 @@ namespace detail {
             lsst::afw::math::Kernel::SpatialFunctionPtr spatialBackground, ///< Spatially varying background
             lsst::daf::base::PropertySet const& ps                        ///< PropertySet config
             );
+        AssessSpatialKernelVisitor(
+            std::shared_ptr<SpatialKernelImageCache> kernelImageCache,   ///< Evaluations of the solution
+            lsst::daf::base::PropertySet const& ps                        ///< PropertySet config
+            );
         virtual ~AssessSpatialKernelVisitor() {};
 
         void reset() {_nGood = 0; _nRejected = 0; _nProcessed = 0;}
 
+        /*
+           Assess candidates whose single kernels have not been built.  The
+           use case for this functionality is : screening candidates with a
+           spatial kernel from a previous solution, before spending time
+           building their single kernels.
+        */
+        void setAssessUninitialized(bool assess) {_assessUninitialized = assess;}
+
+        std::shared_ptr<SpatialKernelImageCache> getKernelImageCache() {return _kernelImageCache;}
+
         int getNGood() {return _nGood;}
         int getNRejected() {return _nRejected;}
         int getNProcessed() {return _nProcessed;}
         void processCandidate(lsst::afw::math::SpatialCellCandidate *candidate);
 
     private:
-        std::shared_ptr<lsst::afw::math::LinearCombinationKernel> _spatialKernel;   ///< Spatial kernel function
-        lsst::afw::math::Kernel::SpatialFunctionPtr _spatialBackground; ///< Spatial background function
+        std::shared_ptr<SpatialKernelImageCache> _kernelImageCache; ///< Spatial kernel and background evaluations
         lsst::daf::base::PropertySet::Ptr _ps; ///< PropertySet configuration controlling behavior
         ImageStatistics<PixelT> _imstats;     ///< To calculate statistics of difference image
+        DifferenceImagePool<PixelT> _diffimPool; ///< Reused difference images, by stamp size
         int _nGood;                           ///< Number of good candidates remaining
         int _nRejected;                       ///< Number of candidates rejected during processCandidate()
         int _nProcessed;                      ///< Number of candidates processed during processCandidate()
 
         bool _useCoreStats;                   ///< Extracted from PropertySet config
         int _coreRadius;                      ///< Extracted from PropertySet config
+        bool _assessUninitialized;            ///< Assess candidates without a built kernel
     };
 
     template<typename PixelT>
@@ -68,6 +84,18 @@ namespace detail {
             );
     }
 
+    template<typename PixelT>
+    std::shared_ptr<AssessSpatialKernelVisitor<PixelT> >
+    makeAssessSpatialKernelVisitor(
+        std::shared_ptr<SpatialKernelImageCache> kernelImageCache,
+        lsst::daf::base::PropertySet const& ps
+         ) {
+
+        return std::shared_ptr<AssessSpatialKernelVisitor<PixelT>>(
+            new AssessSpatialKernelVisitor<PixelT>(kernelImageCache, ps)
+            );
+    }
+
 }}}} // end of namespace lsst::ip::diffim::detail
 
 #endif
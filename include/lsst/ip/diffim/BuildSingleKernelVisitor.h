@@ -20,6 +20,7 @@
 #include "lsst/daf/base/PropertySet.h"
 
 #include "lsst/ip/diffim/ImageStatistics.h"
+#include "lsst/ip/diffim/ImageSubtract.h"
 
 namespace lsst {
 namespace ip {
@@ -63,6 +64,7 @@ namespace detail {
         lsst::daf::base::PropertySet::Ptr _ps; ///< PS controlling behavior
         Eigen::MatrixXd const _hMat;          ///< Regularization matrix
         ImageStatistics<PixelT> _imstats;     ///< To calculate statistics of difference image
+        DifferenceImagePool<PixelT> _diffimPool; ///< Reused difference images, by stamp size
         bool _skipBuilt;                      ///< Skip over built candidates during processCandidate()
         int _nRejected;                       ///< Number of candidates rejected during processCandidate()
         int _nProcessed;                      ///< Number of candidates processed during processCandidate()
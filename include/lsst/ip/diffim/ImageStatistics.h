@@ -35,9 +35,11 @@
 #ifndef LSST_IP_DIFFIM_IMAGESTATISTICS_H
 #define LSST_IP_DIFFIM_IMAGESTATISTICS_H
 
+#include <algorithm>
 #include <cmath>
 #include <limits>
 #include <memory>
+#include <vector>
 
 #include "lsst/afw/image.h"
 #include "lsst/log/Log.h"
@@ -53,6 +55,12 @@ namespace diffim {
      * @note Find mean and unbiased variance of pixel residuals in units of
      * sqrt(variance)
      *
+     * @note The pixels are read row by row from the contiguous image, mask and
+     * variance arrays, in a single pass over the full image or its core.  If
+     * requested with setRobustStats(), the good residuals are also kept in a
+     * reused buffer, from which the median and inner quartile range are found
+     * by selection rather than by sorting.
+     *
      * @ingroup ip_diffim
      */
     template <typename PixelT>
@@ -62,7 +70,9 @@ namespace diffim {
         typedef typename lsst::afw::image::MaskedImage<PixelT>::x_iterator x_iterator;
 
         ImageStatistics(lsst::daf::base::PropertySet const& ps) :
-        _xsum(0.), _x2sum(0.), _npix(0), _bpMask(0) {
+        _xsum(0.), _x2sum(0.), _npix(0), _bpMask(0), _doRobust(false), _resid(),
+        _median(std::numeric_limits<double>::quiet_NaN()),
+        _iqr(std::numeric_limits<double>::quiet_NaN()) {
 
             std::vector<std::string> detBadMaskPlanes = ps.getArray<std::string>("badMaskPlanes");
             for (std::vector<std::string>::iterator mi = detBadMaskPlanes.begin();
@@ -81,7 +91,12 @@ namespace diffim {
         virtual ~ImageStatistics() {} ;
 
         // Clear the accumulators
-        void reset() { _xsum = _x2sum = 0.; _npix = 0;}
+        void reset() {
+            _xsum = _x2sum = 0.;
+            _npix = 0;
+            _resid.clear();
+            _median = _iqr = std::numeric_limits<double>::quiet_NaN();
+        }
 
         // Work your magic
         void apply(lsst::afw::image::MaskedImage<PixelT> const& image) {
@@ -103,29 +118,57 @@ namespace diffim {
                 x0 = std::max(0, image.getWidth()/2 - core);
                 x1 = std::min(image.getWidth(), image.getWidth()/2 + core + 1);
             }
+            if (_doRobust) {
+                _resid.reserve(std::max(0, (y1 - y0) * (x1 - x0)));
+            }
 
+            auto const imArr = image.getImage()->getArray();
+            auto const mskArr = image.getMask()->getArray();
+            auto const varArr = image.getVariance()->getArray();
+            lsst::afw::image::MaskPixel const bpMask = _bpMask;
+            double xsum = 0.;
+            double x2sum = 0.;
+            int npix = 0;
             for (int y = y0; y != y1; ++y) {
-                for (x_iterator ptr = image.x_at(x0, y), end = image.x_at(x1, y);
-                     ptr != end; ++ptr) {
-                    if (!((*ptr).mask() & _bpMask)) {
-                        double const ivar = 1. / (*ptr).variance();
-                        if (std::isfinite(ivar)) {
-                            _xsum  += (*ptr).image() * sqrt(ivar);
-                            _x2sum += (*ptr).image() * (*ptr).image() * ivar;
-                            _npix  += 1;
-                        }
+                PixelT const* im = imArr[y].getData();
+                lsst::afw::image::MaskPixel const* msk = mskArr[y].getData();
+                lsst::afw::image::VariancePixel const* var = varArr[y].getData();
+                for (int x = x0; x != x1; ++x) {
+                    double const ivar = 1. / var[x];
+                    bool const good = !(msk[x] & bpMask) && std::isfinite(ivar);
+                    double const resid = good ? im[x] * std::sqrt(ivar) : 0.;
+                    xsum  += resid;
+                    x2sum += resid * resid;
+                    npix  += good;
+                    if (_doRobust && good) {
+                        _resid.push_back(resid);
                     }
                 }
             }
+            _xsum = xsum;
+            _x2sum = x2sum;
+            _npix = npix;
             if ((!std::isfinite(_xsum)) || (!std::isfinite(_x2sum))) {
                 throw LSST_EXCEPT(pexExcept::Exception,
                                   "Nan/Inf in ImageStatistics.apply");
             }
+            if (_doRobust && (_npix > 0)) {
+                std::size_t first = 0;
+                double const q1 = _selectQuantile(0.25, first);
+                double const q2 = _selectQuantile(0.50, first);
+                double const q3 = _selectQuantile(0.75, first);
+                _median = q2;
+                _iqr = q3 - q1;
+            }
         }
 
         void setBpMask(lsst::afw::image::MaskPixel bpMask) {_bpMask = bpMask;}
         lsst::afw::image::MaskPixel getBpMask() {return _bpMask;}
 
+        // Also find the median and inner quartile range in apply()
+        void setRobustStats(bool doRobust) {_doRobust = doRobust;}
+        bool getRobustStats() const {return _doRobust;}
+
         // Mean of distribution
         double getMean() const {
             return (_npix > 0) ? _xsum/_npix : std::numeric_limits<double>::quiet_NaN();
@@ -139,6 +182,10 @@ namespace diffim {
         double getRms() const {
             return sqrt(getVariance());
         }
+        // Median of distribution; NaN unless setRobustStats(true)
+        double getMedian() const { return _median; }
+        // Inner quartile range of distribution; NaN unless setRobustStats(true)
+        double getIqr() const { return _iqr; }
         // Return the number of good pixels
         int getNpix() const { return _npix; }
 
@@ -150,10 +197,33 @@ namespace diffim {
         }
 
     private:
+        /*
+           Quantile of the kept residuals, interpolated linearly between the
+           order statistics as numpy.percentile does.  Each selection leaves
+           the buffer partitioned about the selected element, so increasing
+           quantiles are selected from the upper part only, starting at first.
+        */
+        double _selectQuantile(double q, std::size_t& first) {
+            double const pos = q * (_resid.size() - 1);
+            std::size_t const lo = static_cast<std::size_t>(std::floor(pos));
+            std::nth_element(_resid.begin() + first, _resid.begin() + lo, _resid.end());
+            first = lo;
+            double const low = _resid[lo];
+            if (lo + 1 >= _resid.size()) {
+                return low;
+            }
+            double const high = *std::min_element(_resid.begin() + lo + 1, _resid.end());
+            return low + (pos - lo) * (high - low);
+        }
+
         double _xsum;
         double _x2sum;
         int    _npix;
         lsst::afw::image::MaskPixel _bpMask;
+        bool   _doRobust;                 ///< Find the median and inner quartile range
+        std::vector<double> _resid;       ///< Good residuals of the last apply(), if _doRobust
+        double _median;
+        double _iqr;
     };
 
 
@@ -35,6 +35,9 @@
 #ifndef LSST_IP_DIFFIM_IMAGESUBTRACT_H
 #define LSST_IP_DIFFIM_IMAGESUBTRACT_H
 
+#include <map>
+#include <utility>
+
 #include "Eigen/Core"
 
 #include "lsst/afw/math.h"
@@ -89,6 +92,84 @@ namespace diffim {
         bool invert=true
         );
 
+    /**
+     * @brief Convolve the template and subtract it from the science image, into an existing image
+     *
+     * @note This version accepts a MaskedImage for the template
+     *
+     * @param outputImage  MaskedImage, with the dimensions of templateImage, that is
+     *                     overwritten with the difference image
+     * @param templateImage  MaskedImage to apply convolutionKernel to
+     * @param scienceMaskedImage  MaskedImage from which convolved templateImage is subtracted
+     * @param convolutionKernel  Kernel to apply to templateImage
+     * @param background  Background scalar or function to subtract after convolution
+     * @param invert  Invert the output difference image
+     *
+     * @ingroup ip_diffim
+     */
+    template <typename PixelT, typename BackgroundT>
+    void convolveAndSubtract(
+        lsst::afw::image::MaskedImage<PixelT> & outputImage,
+        lsst::afw::image::MaskedImage<PixelT> const& templateImage,
+        lsst::afw::image::MaskedImage<PixelT> const& scienceMaskedImage,
+        lsst::afw::math::Kernel const& convolutionKernel,
+        BackgroundT background,
+        bool invert=true
+        );
+
+    /**
+     * @brief Convolve the template and subtract it from the science image, into an existing image
+     *
+     * @note This version accepts an Image for the template, and is thus faster during convolution
+     *
+     * @param outputImage  MaskedImage, with the dimensions of templateImage, that is
+     *                     overwritten with the difference image
+     * @param templateImage  Image to apply convolutionKernel to
+     * @param scienceMaskedImage  MaskedImage from which convolved templateImage is subtracted
+     * @param convolutionKernel  Kernel to apply to templateImage
+     * @param background  Background scalar or function to subtract after convolution
+     * @param invert  Invert the output difference image
+     *
+     * @ingroup ip_diffim
+     */
+    template <typename PixelT, typename BackgroundT>
+    void convolveAndSubtract(
+        lsst::afw::image::MaskedImage<PixelT> & outputImage,
+        lsst::afw::image::Image<PixelT> const& templateImage,
+        lsst::afw::image::MaskedImage<PixelT> const& scienceMaskedImage,
+        lsst::afw::math::Kernel const& convolutionKernel,
+        BackgroundT background,
+        bool invert=true
+        );
+
+    /**
+     * @brief Scratch MaskedImages for difference images, one per stamp dimensions
+     *
+     * @note Visitors make a difference image for every candidate they process, and
+     * the stamps of a cell set have few distinct sizes.  Writing the difference images
+     * into the images of a pool avoids allocating new planes for each candidate.  The
+     * image returned by get() is overwritten by the next difference image of that size.
+     *
+     * @ingroup ip_diffim
+     */
+    template <typename PixelT>
+    class DifferenceImagePool {
+    public:
+        lsst::afw::image::MaskedImage<PixelT> & get(lsst::geom::Extent2I const& dimensions) {
+            std::pair<int, int> key(dimensions.getX(), dimensions.getY());
+            auto found = _images.find(key);
+            if (found == _images.end()) {
+                found = _images.emplace(key, lsst::afw::image::MaskedImage<PixelT>(dimensions)).first;
+            }
+            return found->second;
+        }
+        void clear() {_images.clear();}
+        std::size_t size() const {return _images.size();}
+
+    private:
+        std::map<std::pair<int, int>, lsst::afw::image::MaskedImage<PixelT>> _images; ///< Images by size
+    };
+
     /**
      * @brief Turns a 2-d Image into a 2-d Eigen Matrix
      *
@@ -110,6 +110,14 @@ namespace diffim {
         CONST_PTR(ImageT) getImage() const; // For SpatialCellImageCandidate
         std::shared_ptr<StaticKernelSolution<PixelT> > getKernelSolution(CandidateSwitch cand) const;
 
+        /**
+         * @brief Set the solution for the original basis, e.g. when restoring a saved candidate
+         *
+         * @note The candidate is marked as initialized, so that BuildSingleKernelVisitor does
+         * not rebuild it; a later build() with a new (e.g. Pca) basis fills the Pca solution.
+         */
+        void setKernelSolution(std::shared_ptr<StaticKernelSolution<PixelT> > kernelSolution);
+
         /**
          * @brief Calculate associated difference image using internal solutions
          */
@@ -125,6 +133,29 @@ namespace diffim {
             double background
             );
 
+        /**
+         * @brief Calculate associated difference image using internal solutions, into diffim
+         *
+         * @note diffim must have the dimensions of the template stamp, and is overwritten;
+         * e.g. an image of a DifferenceImagePool
+         */
+        void getDifferenceImage(
+            afw::image::MaskedImage<PixelT> & diffim,
+            CandidateSwitch cand
+            );
+
+        /**
+         * @brief Calculate associated difference image using input kernel and background, into diffim
+         *
+         * @note diffim must have the dimensions of the template stamp, and is overwritten;
+         * e.g. an image of a DifferenceImagePool
+         */
+        void getDifferenceImage(
+            afw::image::MaskedImage<PixelT> & diffim,
+            std::shared_ptr<afw::math::Kernel> kernel,
+            double background
+            );
+
         bool isInitialized() const {return _isInitialized;}
 
 
@@ -253,6 +284,32 @@ namespace diffim {
                                                                                     ps));
     }
 
+    /**
+     * @brief Make KernelCandidates from stacks of stamps and insert them into a SpatialCellSet
+     *
+     * @param kernelCellSet  SpatialCellSet to insert the candidates into
+     * @param xCenters  X-centers of the candidates
+     * @param yCenters  Y-centers of the candidates
+     * @param templateStamps  Template stamps, with shape (nCandidate, height, width)
+     * @param scienceStamps  Science stamps, with shape (nCandidate, height, width)
+     * @param ps    PropertySet for creation of rating
+     *
+     * @return The number of candidates inserted
+     *
+     * @note The image planes of the candidates are views into the stamp arrays, which are not
+     * copied.  All candidates share a single zero mask plane and a single unit variance plane,
+     * as appropriate for noiseless stamps such as realizations of Psf models.
+     *
+     * @ingroup ip_diffim
+     */
+    template <typename PixelT>
+    int insertKernelCandidates(afw::math::SpatialCellSet & kernelCellSet,
+                               ndarray::Array<float const, 1, 1> const& xCenters,
+                               ndarray::Array<float const, 1, 1> const& yCenters,
+                               ndarray::Array<PixelT, 3, 3> const& templateStamps,
+                               ndarray::Array<PixelT, 3, 3> const& scienceStamps,
+                               daf::base::PropertySet const& ps);
+
 
 }}} // end of namespace lsst::ip::diffim
 
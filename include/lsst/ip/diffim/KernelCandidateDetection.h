@@ -12,7 +12,11 @@
 #ifndef LSST_IP_DIFFIM_KERNELCANDIDATEDETECTION_H
 #define LSST_IP_DIFFIM_KERNELCANDIDATEDETECTION_H
 
+#include "Eigen/Core"
+
+#include "lsst/geom/Box.h"
 #include "lsst/afw/image/Image.h"
+#include "lsst/afw/image/Mask.h"
 #include "lsst/afw/detection/Footprint.h"
 #include "lsst/daf/base/PropertySet.h"
 
@@ -25,6 +29,9 @@ namespace diffim {
      *
      * @note Runs detection on the template; searches through both images for masked pixels
      *
+     * @note During apply(), the bad pixels of both images are summed once into an integral
+     * image, so that each grown Footprint is checked for masked pixels with a single box query.
+     *
      * @param templateMaskedImage  MaskedImage that will be convolved with kernel
      * @param scienceMaskedImage   MaskedImage to subtract convolved template from
      * @param ps  PropertySet for operations; in particular object detection
@@ -55,6 +62,18 @@ namespace diffim {
         lsst::daf::base::PropertySet::Ptr _ps;
         lsst::afw::image::MaskPixel _badBitMask;
         std::vector<std::shared_ptr<lsst::afw::detection::Footprint>> _footprints;
+
+        /* Integral image of the pixels with bad bits set in either mask, over the template bbox,
+         * kept only during apply(); element (y, x) is the number of bad pixels in the rows < y
+         * and columns < x.  It is stored row by row, in the order of the mask pixels. */
+        Eigen::Matrix<int, Eigen::Dynamic, Eigen::Dynamic, Eigen::RowMajor> _badPixelIntegral;
+        lsst::geom::Box2I _badPixelBBox;
+
+        void _buildBadPixelIntegral(MaskedImagePtr const& templateMaskedImage,
+                                    MaskedImagePtr const& scienceMaskedImage);
+        int _countBadPixels(lsst::geom::Box2I const& bbox,
+                            MaskedImagePtr const& templateMaskedImage,
+                            MaskedImagePtr const& scienceMaskedImage) const;
     };
 
 
@@ -29,11 +29,29 @@ namespace detail {
         using lsst::afw::image::ImagePca<ImageT>::getEigenValues;
         using lsst::afw::image::ImagePca<ImageT>::addImage;
 
-        /// Ctor
-        explicit KernelPca(bool constantWeight=true) : Super(constantWeight) {}
+        /**
+         * @brief Ctor
+         *
+         * @param constantWeight  Give every image the same weight
+         * @param nComponents  Number of leading components to compute; if positive and smaller
+         * than the number of images, a truncated randomized decomposition replaces the full one
+         */
+        explicit KernelPca(bool constantWeight=true, int nComponents=0) :
+            Super(constantWeight), _nComponents(nComponents), _mean() {}
 
         /// Generate eigenimages that are normalised
         virtual void analyze();
+
+        int getNComponents() const { return _nComponents; }
+
+        /// Subtract a mean image from the stacked images in analyze(), rather than from each image
+        void setMean(PTR(ImageT) mean) { _mean = mean; }
+
+    private:
+        int _nComponents;                                 ///< Number of components of a truncated Pca
+        PTR(ImageT) _mean;                                ///< Mean image to subtract within analyze()
+
+        void _analyzeTruncated();
     };
 
     template<typename PixelT>
@@ -14,6 +14,9 @@
 
 #include <memory>
 #include "Eigen/Core"
+#include "Eigen/Cholesky"
+#include "Eigen/Eigenvalues"
+#include "Eigen/Sparse"
 
 #include "lsst/afw/math.h"
 #include "lsst/afw/image.h"
@@ -44,7 +47,8 @@ namespace diffim {
 
         enum ConditionNumberType {
             EIGENVALUE = 0,
-            SVD        = 1
+            SVD        = 1,
+            LDLT       = 2
         };
 
         explicit KernelSolution(Eigen::MatrixXd mMat,
@@ -60,6 +64,7 @@ namespace diffim {
         KernelSolvedBy getSolvedBy() {return _solvedBy;}
         virtual double getConditionNumber(ConditionNumberType conditionType);
         virtual double getConditionNumber(Eigen::MatrixXd const& mMat, ConditionNumberType conditionType);
+        void releaseDecomposition() {_ldlt.reset(); _eigenSolver.reset();}
 
         inline Eigen::MatrixXd const& getM() {return _mMat;}
         inline Eigen::VectorXd const& getB() {return _bVec;}
@@ -77,6 +82,14 @@ namespace diffim {
         bool _fitForBackground;                                 ///< Background terms included in fit
         static int _SolutionId;                                 ///< Unique identifier for solution
 
+        /* Decompositions of _mMat made by getConditionNumber(), used then released by solve() */
+        std::shared_ptr<Eigen::LDLT<Eigen::MatrixXd> > _ldlt;  ///< LDLt factorization of _mMat
+        std::shared_ptr<Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> > _eigenSolver; ///< Eigensystem of _mMat
+
+        void _solve(Eigen::MatrixXd const& mMat,
+                    Eigen::VectorXd const& bVec,
+                    std::shared_ptr<Eigen::LDLT<Eigen::MatrixXd> > ldlt,
+                    std::shared_ptr<Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> > eigenSolver);
     };
 
     template <typename InputT>
@@ -101,6 +114,13 @@ namespace diffim {
         virtual double getKsum();
         virtual std::pair<std::shared_ptr<lsst::afw::math::Kernel>, double> getSolutionPair();
 
+        /* Restore M and B, e.g. saved from a previous build, in place of build() */
+        void setNormalEquations(Eigen::MatrixXd const& mMat, Eigen::VectorXd const& bVec);
+
+        /* Weighted sum of squares I^T W I of the science pixels used in build(); at the
+         * solution of any subset of the basis, chi^2 = I^T W I - B_s^T a_s */
+        double getWeightedScienceNorm();
+
     protected:
         Eigen::MatrixXd _cMat;               ///< K_i x R
         Eigen::VectorXd _iVec;               ///< Vectorized I
@@ -159,15 +179,16 @@ namespace diffim {
         double getLambda() {return _lambda;}
         double estimateRisk(double maxCond);
 
-        /* Include additive term (_lambda * _hMat) in M matrix? */
+        /* Include additive term (_lambda * _hSparse) in M matrix? */
         Eigen::MatrixXd getM(bool includeHmat = true);
 
     private:
-        Eigen::MatrixXd const _hMat;               ///< Regularization weights
+        Eigen::SparseMatrix<double> const _hSparse; ///< Regularization weights, stored sparse
         double _lambda;                                         ///< Overall regularization strength
         lsst::daf::base::PropertySet::Ptr _ps;
 
         std::vector<double> _createLambdaSteps();
+        Eigen::MatrixXd _makeMLambda(double lambda);
     };
 
 
@@ -0,0 +1,87 @@
+// -*- lsst-c++ -*-
+/**
+ * @file SpatialKernelImageCache.h
+ *
+ * @brief Declaration of SpatialKernelImageCache
+ *
+ * @ingroup ip_diffim
+ */
+
+#ifndef LSST_IP_DIFFIM_SPATIALKERNELIMAGECACHE_H
+#define LSST_IP_DIFFIM_SPATIALKERNELIMAGECACHE_H
+
+#include <map>
+#include <memory>
+#include <utility>
+#include <vector>
+
+#include "lsst/geom/Box.h"
+#include "lsst/geom/Point.h"
+#include "lsst/afw/math/Kernel.h"
+#include "lsst/afw/image/Image.h"
+
+namespace lsst {
+namespace ip {
+namespace diffim {
+
+    /**
+     * @brief Evaluations of a spatial kernel and background solution at fixed positions
+     *
+     * @note The spatial kernel is evaluated once per position, and kept as a FixedKernel
+     * together with its sum and the value of the spatial background there.  All the
+     * consumers of one solution (candidate assessment, QA, diagnostics, decorrelation)
+     * can then share the evaluations at the candidate positions.
+     *
+     * @note The spatial parameters of the kernel and the parameters of the background
+     * are compared with those of the cached evaluations on every lookup, and the cache
+     * is emptied if they have changed.
+     *
+     * @ingroup ip_diffim
+     */
+    class SpatialKernelImageCache {
+    public:
+        typedef std::shared_ptr<SpatialKernelImageCache> Ptr;
+
+        SpatialKernelImageCache(
+            std::shared_ptr<lsst::afw::math::LinearCombinationKernel> spatialKernel, ///< Spatially varying kernel
+            lsst::afw::math::Kernel::SpatialFunctionPtr spatialBackground  ///< Spatially varying background
+            );
+        virtual ~SpatialKernelImageCache() {};
+
+        std::shared_ptr<lsst::afw::math::Kernel> getKernel(double x, double y);
+        std::shared_ptr<lsst::afw::image::Image<double>> getKernelImage(double x, double y);
+        double getKernelSum(double x, double y);
+        double getBackground(double x, double y);
+
+        std::vector<lsst::geom::Point2D> fillGrid(lsst::geom::Box2I const& bbox, int nx, int ny);
+
+        void clear();
+        std::size_t size() const {return _entries.size();}
+
+        std::shared_ptr<lsst::afw::math::LinearCombinationKernel> getSpatialKernel() const {
+            return _spatialKernel;
+        }
+        lsst::afw::math::Kernel::SpatialFunctionPtr getSpatialBackground() const {
+            return _spatialBackground;
+        }
+
+    private:
+        struct Entry {
+            std::shared_ptr<lsst::afw::math::Kernel> kernel; ///< Kernel evaluated at the position
+            double kSum;                                     ///< Sum of the kernel image
+            double background;                               ///< Background at the position
+        };
+
+        Entry const& _getEntry(double x, double y);
+        void _checkSolution();
+
+        std::shared_ptr<lsst::afw::math::LinearCombinationKernel> _spatialKernel; ///< Spatial kernel function
+        lsst::afw::math::Kernel::SpatialFunctionPtr _spatialBackground; ///< Spatial background function
+        std::vector<std::vector<double>> _kernelParameters; ///< Spatial parameters of the cached entries
+        std::vector<double> _backgroundParameters;          ///< Background parameters of the cached entries
+        std::map<std::pair<double, double>, Entry> _entries; ///< Evaluations keyed by position
+    };
+
+}}} // end of namespace lsst::ip::diffim
+
+#endif
@@ -28,6 +28,7 @@ from .diffimLib import *
 from .dcrModel import *
 from .psfMatch import *
 from .imagePsfMatch import *
+from .psfCache import *
 from .modelPsfMatch import *
 from .snapPsfMatch import *
 from .diaSourceAnalysis import *
@@ -20,13 +20,17 @@
 # see <https://www.lsstcorp.org/LegalNotices/>.
 #
 
+from collections import OrderedDict
+import json
+import os
+
 import numpy as np
 from scipy import ndimage
-from lsst.afw.coord.refraction import differentialRefraction
+from lsst.afw.coord.refraction import refraction
 import lsst.afw.image as afwImage
 import lsst.geom as geom
 
-__all__ = ["DcrModel", "applyDcr", "calculateDcr", "calculateImageParallacticAngle"]
+__all__ = ["DcrModel", "applyDcr", "calculateDcr", "calculateDcrArray", "calculateImageParallacticAngle"]
 
 
 class DcrModel:
@@ -49,6 +53,13 @@ class DcrModel:
     iterations of forward modeling or between the subfilters of the model.
     """
 
+    cachedRegions = 2
+    """Number of regions for which the prefiltered and Fourier copies of all of
+    the model planes are cached (`int`).  A region is a bounding box together
+    with the spline order or Fourier padding; the least recently used
+    regions are discarded first.
+    """
+
     def __init__(self, modelImages, filterInfo=None, psf=None, mask=None, variance=None):
         self.dcrNumSubfilters = len(modelImages)
         self.modelImages = modelImages
@@ -56,6 +67,8 @@ class DcrModel:
         self._psf = psf
         self._mask = mask
         self._variance = variance
+        self._prefilterCache = _PlaneCache(self.cachedRegions*self.dcrNumSubfilters)
+        self._fourierCache = _PlaneCache(self.cachedRegions*self.dcrNumSubfilters)
 
     @classmethod
     def fromImage(cls, maskedImage, dcrNumSubfilters, filterInfo=None, psf=None):
@@ -143,6 +156,84 @@ class DcrModel:
             modelImages.append(dcrCoadd.image)
         return cls(modelImages, filterInfo, psf, mask, variance)
 
+    @classmethod
+    def fromArrays(cls, directory, bbox=None, filterInfo=None, psf=None):
+        """Load a DcrModel written by `writeArrays`, using memory-mapped planes.
+
+        Parameters
+        ----------
+        directory : `str`
+            Directory containing the model, as written by `writeArrays`.
+        bbox : `lsst.afw.geom.Box2I`, optional
+            Sub-region of the model to load. Loads the full model if `None`.
+        filterInfo : `lsst.afw.image.Filter`, optional
+            The filter definition, set in the current instruments' obs package.
+            Required for any calculation of DCR, including making matched templates.
+        psf : `lsst.afw.detection.Psf`, optional
+            Point spread function (PSF) of the model.
+
+        Returns
+        -------
+        dcrModel : `lsst.pipe.tasks.DcrModel`
+            Best fit model of the true sky after correcting chromatic effects.
+
+        Raises
+        ------
+        ValueError
+            If ``bbox`` is not contained in the bounding box of the stored model.
+
+        Notes
+        -----
+        The planes are memory-mapped copy-on-write, so pixels are only read
+        from disk when they are used, and modifying the returned model does not
+        change the files on disk. Building a matched template for a small
+        ``bbox`` therefore only reads the pixels within it.
+        """
+        with open(os.path.join(directory, "metadata.json")) as f:
+            metadata = json.load(f)
+        fullBBox = geom.Box2I(geom.Point2I(*metadata["xy0"]), geom.Extent2I(*metadata["dimensions"]))
+        bbox = bbox or fullBBox
+        if not fullBBox.contains(bbox):
+            raise ValueError("The requested bounding box %s is not contained in the model bounding box %s"
+                             % (bbox, fullBBox))
+        ySlice = slice(bbox.getMinY() - fullBBox.getMinY(), bbox.getMaxY() - fullBBox.getMinY() + 1)
+        xSlice = slice(bbox.getMinX() - fullBBox.getMinX(), bbox.getMaxX() - fullBBox.getMinX() + 1)
+        modelArrays = np.load(os.path.join(directory, "image.npy"), mmap_mode="c")
+        modelImages = [afwImage.ImageF(modelArray[ySlice, xSlice], deep=False, xy0=bbox.getBegin())
+                       for modelArray in modelArrays]
+        maskArray = np.load(os.path.join(directory, "mask.npy"), mmap_mode="c")
+        mask = afwImage.Mask(maskArray[ySlice, xSlice], deep=False, xy0=bbox.getBegin())
+        mask.conformMaskPlanes(metadata["maskPlanes"])
+        varianceArray = np.load(os.path.join(directory, "variance.npy"), mmap_mode="c")
+        variance = afwImage.ImageF(varianceArray[ySlice, xSlice], deep=False, xy0=bbox.getBegin())
+        return cls(modelImages, filterInfo, psf, mask, variance)
+
+    def writeArrays(self, directory):
+        """Write the model planes in a layout that can be memory-mapped.
+
+        The subfilter images are stored as a single
+        (``dcrNumSubfilters``, height, width) array, alongside the mask and
+        variance planes and a small metadata file.
+        The filter and PSF are not written, and must be supplied to
+        `fromArrays` if they are needed.
+
+        Parameters
+        ----------
+        directory : `str`
+            Directory to write the model to. Created if it does not exist.
+        """
+        os.makedirs(directory, exist_ok=True)
+        bbox = self.bbox
+        np.save(os.path.join(directory, "image.npy"),
+                np.array([model.array for model in self], dtype=np.float32))
+        np.save(os.path.join(directory, "mask.npy"), self.mask.array)
+        np.save(os.path.join(directory, "variance.npy"), self.variance.array.astype(np.float32))
+        metadata = dict(xy0=[bbox.getMinX(), bbox.getMinY()],
+                        dimensions=[bbox.getWidth(), bbox.getHeight()],
+                        maskPlanes=dict(self.mask.getMaskPlaneDict()))
+        with open(os.path.join(directory, "metadata.json"), "w") as f:
+            json.dump(metadata, f)
+
     def __len__(self):
         """Return the number of subfilters.
 
@@ -201,6 +292,7 @@ class DcrModel:
         if maskedImage.getBBox() != self.bbox:
             raise ValueError("The bounding box of a subfilter must not change.")
         self.modelImages[subfilter] = maskedImage
+        self.clearCache(subfilter)
 
     @property
     def filter(self):
@@ -295,10 +387,96 @@ class DcrModel:
         bbox = bbox or self.bbox
         for model, subModel in zip(self, dcrSubModel):
             model.assign(subModel[bbox], bbox)
+        self.clearCache()
+
+    def clearCache(self, subfilter=None):
+        """Discard cached prefiltered and Fourier copies of the model planes.
+
+        Parameters
+        ----------
+        subfilter : `int`, optional
+            Index of the subfilter to discard. Clears all subfilters if `None`.
+
+        Notes
+        -----
+        The cache is cleared automatically by ``__setitem__`` and ``assign``.
+        It must be cleared explicitly if a model plane is modified in place.
+        """
+        if subfilter is not None:
+            subfilter %= len(self)
+        self._prefilterCache.clear(subfilter)
+        self._fourierCache.clear(subfilter)
+
+    def getPrefilteredImage(self, subfilter, bbox=None, order=3):
+        """Return the spline-prefiltered model for one subfilter.
+
+        The spline coefficients are cached, so repeated calls with the same
+        ``subfilter``, ``bbox``, and ``order`` only filter the image once.
+        Only the most recently used ``cachedRegions`` regions of each
+        subfilter are kept.
+
+        Parameters
+        ----------
+        subfilter : `int`
+            Index of the current subfilter within the full band.
+        bbox : `lsst.afw.geom.Box2I`, optional
+            Sub-region of the coadd. Uses the entire image if `None`.
+        order : `int`, optional
+            The order of the spline interpolation, default is 3.
+
+        Returns
+        -------
+        prefilteredImage : `numpy.ndarray`
+            The spline coefficients of the model, suitable for passing to
+            `applyDcr` with ``doPrefilter=False``.
+            This array is shared with the cache, and is read-only.
+        """
+        bbox = bbox or self.bbox
+        subfilter %= len(self)
+        key = (subfilter, bbox.getMinX(), bbox.getMinY(), bbox.getMaxX(), bbox.getMaxY(), order)
+        return self._prefilterCache.get(
+            key, lambda: ndimage.spline_filter(self[subfilter][bbox].array, order=order))
+
+    def getFourierImage(self, subfilter, bbox=None, padding=0):
+        """Return the Fourier transform of the model for one subfilter.
+
+        The transforms are cached, so repeated calls with the same
+        ``subfilter``, ``bbox``, and ``padding`` only transform the image once.
+        Only the most recently used ``cachedRegions`` regions of each
+        subfilter are kept.
+
+        Parameters
+        ----------
+        subfilter : `int`
+            Index of the current subfilter within the full band.
+        bbox : `lsst.afw.geom.Box2I`, optional
+            Sub-region of the coadd. Uses the entire image if `None`.
+        padding : `int`, optional
+            Number of zero-valued pixels to add around each edge of the image
+            before transforming, to prevent shifted flux from wrapping around.
+
+        Returns
+        -------
+        fourierImage : `numpy.ndarray`
+            The real-input Fourier transform of the padded model.
+            This array is shared with the cache, and is read-only.
+        """
+        bbox = bbox or self.bbox
+        subfilter %= len(self)
+        key = (subfilter, bbox.getMinX(), bbox.getMinY(), bbox.getMaxX(), bbox.getMaxY(), padding)
+
+        def transform():
+            model = self[subfilter][bbox].array
+            if padding > 0:
+                model = np.pad(model, padding, mode='constant')
+            return np.fft.rfft2(model)
+
+        return self._fourierCache.get(key, transform)
 
     def buildMatchedTemplate(self, exposure=None, order=3,
                              visitInfo=None, bbox=None, wcs=None, mask=None,
-                             splitSubfilters=True, splitThreshold=0., amplifyModel=1.):
+                             splitSubfilters=True, splitThreshold=0., amplifyModel=1.,
+                             dcrShift=None, useFourier=False, fourierPadding=8):
         """Create a DCR-matched template image for an exposure.
 
         Parameters
@@ -325,37 +503,119 @@ class DcrModel:
         amplifyModel : `float`, optional
             Multiplication factor to amplify differences between model planes.
             Used to speed convergence of iterative forward modeling.
+        dcrShift : `list`, optional
+            Pre-computed shifts for each subfilter, as returned by
+            `calculateDcr` with the same ``splitSubfilters``.
+            Calculated from ``visitInfo`` and ``wcs`` if not supplied.
+        useFourier : `bool`, optional
+            Apply the shifts as phase ramps to the cached Fourier transforms of
+            the model planes, and inverse transform the sum once, instead of
+            shifting each plane with spline interpolation.
+            ``order`` and ``splitThreshold`` are ignored if set.
+        fourierPadding : `int`, optional
+            Number of pixels of zero padding to use with ``useFourier``.
+            Increased automatically if any shift is larger.
 
         Returns
         -------
         templateImage : `lsst.afw.image.ImageF`
             The DCR-matched template
 
+        Notes
+        -----
+        Unless ``amplifyModel`` is used, the spline-prefiltered model planes
+        are cached, so building templates for many exposures overlapping the
+        same ``bbox`` only requires the shifts to be calculated once each.
+        With ``useFourier`` each additional exposure costs one complex
+        multiply-add per subfilter and a single inverse transform.
+
         Raises
         ------
         ValueError
-            If neither ``exposure`` or all of ``visitInfo``, ``bbox``, and ``wcs`` are set.
+            If neither ``exposure`` or all of ``visitInfo``, ``bbox``, and ``wcs`` are set,
+            or only ``bbox`` if ``dcrShift`` is supplied.
         """
-        if self.filter is None:
+        if self.filter is None and dcrShift is None:
             raise ValueError("'filterInfo' must be set for the DcrModel in order to calculate DCR.")
         if exposure is not None:
             visitInfo = exposure.getInfo().getVisitInfo()
             bbox = exposure.getBBox()
             wcs = exposure.getInfo().getWcs()
-        elif visitInfo is None or bbox is None or wcs is None:
+        elif bbox is None or (dcrShift is None and (visitInfo is None or wcs is None)):
             raise ValueError("Either exposure or visitInfo, bbox, and wcs must be set.")
-        dcrShift = calculateDcr(visitInfo, wcs, self.filter, len(self), splitSubfilters=splitSubfilters)
+        if dcrShift is None:
+            dcrShift = calculateDcr(visitInfo, wcs, self.filter, len(self), splitSubfilters=splitSubfilters)
         templateImage = afwImage.ImageF(bbox)
-        refModel = self.getReferenceImage(bbox)
+        if useFourier:
+            templateImage.array[:] = self._buildFourierTemplate(dcrShift, bbox, splitSubfilters,
+                                                                amplifyModel, fourierPadding)
+            return templateImage
+        if amplifyModel > 1:
+            refModel = self.getReferenceImage(bbox)
         for subfilter, dcr in enumerate(dcrShift):
             if amplifyModel > 1:
                 model = (self[subfilter][bbox].array - refModel)*amplifyModel + refModel
+                templateImage.array += applyDcr(model, dcr, splitSubfilters=splitSubfilters,
+                                                splitThreshold=splitThreshold, order=order)
             else:
-                model = self[subfilter][bbox].array
-            templateImage.array += applyDcr(model, dcr, splitSubfilters=splitSubfilters,
-                                            splitThreshold=splitThreshold, order=order)
+                model = self.getPrefilteredImage(subfilter, bbox, order=order)
+                templateImage.array += applyDcr(model, dcr, splitSubfilters=splitSubfilters,
+                                                splitThreshold=splitThreshold, doPrefilter=False,
+                                                order=order)
         return templateImage
 
+    def _buildFourierTemplate(self, dcrShift, bbox, splitSubfilters, amplifyModel, padding):
+        """Sum the shifted subfilter models in Fourier space.
+
+        Parameters
+        ----------
+        dcrShift : `list`
+            Shifts for each subfilter, as returned by `calculateDcr`.
+        bbox : `lsst.afw.geom.Box2I`
+            Sub-region of the coadd.
+        splitSubfilters : `bool`
+            Whether each element of ``dcrShift`` contains the shifts at two
+            wavelengths, which are averaged.
+        amplifyModel : `float`
+            Multiplication factor to amplify differences between model planes.
+        padding : `int`
+            Minimum number of pixels of zero padding around the image.
+
+        Returns
+        -------
+        templateArray : `numpy.ndarray`
+            The DCR-matched template image.
+        """
+        if splitSubfilters:
+            shiftList = [list(dcr) for dcr in dcrShift]
+        else:
+            shiftList = [[dcr] for dcr in dcrShift]
+        maxShift = np.max(np.abs(shiftList))
+        if maxShift >= padding:
+            padding = int(np.ceil(maxShift)) + 1
+        ySize, xSize = bbox.getHeight(), bbox.getWidth()
+        fourierShape = (ySize + 2*padding, xSize + 2*padding)
+        freqY = np.fft.fftfreq(fourierShape[0])
+        freqX = np.fft.rfftfreq(fourierShape[1])
+        fourierImages = [self.getFourierImage(subfilter, bbox, padding=padding)
+                         for subfilter in range(len(self))]
+        if amplifyModel > 1:
+            # The transform is linear, so amplifying the difference from the
+            # reference image can be done directly on the cached transforms.
+            fourierRef = np.mean(fourierImages, axis=0)
+        fourierTemplate = np.zeros_like(fourierImages[0])
+        for fourierImage, shifts in zip(fourierImages, shiftList):
+            phaseRamp = np.zeros_like(fourierTemplate)
+            for shiftY, shiftX in shifts:
+                phaseRamp += np.outer(np.exp(-2j*np.pi*freqY*shiftY), np.exp(-2j*np.pi*freqX*shiftX))
+            phaseRamp /= len(shifts)
+            if amplifyModel > 1:
+                fourierTemplate += ((fourierImage - fourierRef)*amplifyModel + fourierRef)*phaseRamp
+            else:
+                fourierTemplate += fourierImage*phaseRamp
+        templateArray = np.fft.irfft2(fourierTemplate, s=fourierShape)
+        return templateArray[padding:padding + ySize, padding:padding + xSize]
+
     def buildMatchedExposure(self, exposure=None,
                              visitInfo=None, bbox=None, wcs=None, mask=None):
         """Wrapper to create an exposure from a template image.
@@ -581,6 +841,67 @@ class DcrModel:
             image[lowPixels] = lowThreshold[lowPixels]
 
 
+class _PlaneCache:
+    """A least-recently-used cache of read-only arrays derived from the
+    planes of a `DcrModel`.
+
+    Parameters
+    ----------
+    maxEntries : `int`
+        Maximum number of arrays to keep.
+
+    Notes
+    -----
+    Keys are tuples whose first element is the index of the subfilter.
+    """
+
+    def __init__(self, maxEntries):
+        self.maxEntries = maxEntries
+        self._arrays = OrderedDict()
+
+    def __len__(self):
+        return len(self._arrays)
+
+    def __contains__(self, key):
+        return key in self._arrays
+
+    def get(self, key, compute):
+        """Return a cached array, computing and caching it if it is missing.
+
+        Parameters
+        ----------
+        key : `tuple`
+            Key of the array; the first element is the subfilter.
+        compute : callable
+            Function returning the array, called if it is not cached.
+
+        Returns
+        -------
+        array : `numpy.ndarray`
+            The read-only cached array.
+        """
+        array = self._arrays.get(key)
+        if array is not None:
+            self._arrays.move_to_end(key)
+            return array
+        array = compute()
+        array.flags.writeable = False
+        if self.maxEntries > 0:
+            self._arrays[key] = array
+            while len(self._arrays) > self.maxEntries:
+                self._arrays.popitem(last=False)
+        return array
+
+    def clear(self, subfilter=None):
+        """Remove the arrays of one subfilter, or all arrays if `None`.
+        """
+        if subfilter is None:
+            self._arrays.clear()
+            return
+        for key in [key for key in self._arrays if key[0] == subfilter]:
+            del self._arrays[key]
+
+
 def applyDcr(image, dcr, useInverse=False, splitSubfilters=False, splitThreshold=0.,
              doPrefilter=True, order=3):
     """Shift an image along the X and Y directions.
@@ -665,39 +986,77 @@ def calculateDcr(visitInfo, wcs, filterInfo, dcrNumSubfilters, splitSubfilters=F
 
     Returns
     -------
-    dcrShift : `tuple` of two `float`
-        The 2D shift due to DCR, in pixels.
+    dcrShift : `numpy.ndarray`
+        The 2D shift due to DCR for each subfilter, in pixels.
         Uses numpy axes ordering (Y, X).
+        The shape is (``dcrNumSubfilters``, 2), or
+        (``dcrNumSubfilters``, 2, 2) if ``splitSubfilters`` is set.
+    """
+    return calculateDcrArray([visitInfo], [wcs], filterInfo, dcrNumSubfilters,
+                             splitSubfilters=splitSubfilters)[0]
+
+
+def calculateDcrArray(visitInfoList, wcsList, filterInfo, dcrNumSubfilters, splitSubfilters=False):
+    """Calculate the shifts in pixels due to DCR for many exposures at once.
+
+    Parameters
+    ----------
+    visitInfoList : `list` of `lsst.afw.image.VisitInfo`
+        Metadata for each exposure.
+    wcsList : `list` of `lsst.afw.geom.SkyWcs`
+        Coordinate system definition (wcs) for each exposure.
+    filterInfo : `lsst.afw.image.Filter`
+        The filter definition, set in the current instruments' obs package.
+    dcrNumSubfilters : `int`
+        Number of sub-filters used to model chromatic effects within a band.
+    splitSubfilters : `bool`, optional
+        Calculate DCR for two evenly-spaced wavelengths in each subfilter,
+        instead of at the midpoint. Default: False
+
+    Returns
+    -------
+    dcrShift : `numpy.ndarray`
+        The 2D shift due to DCR for each exposure and subfilter, in pixels.
+        Uses numpy axes ordering (Y, X) for the last axis.
+        The shape is (nVisit, ``dcrNumSubfilters``, 2), or
+        (nVisit, ``dcrNumSubfilters``, 2, 2) if ``splitSubfilters`` is set,
+        where the third axis selects the wavelength within the subfilter.
+
+    Notes
+    -----
+    The refraction is evaluated only once per exposure for each distinct
+    wavelength, since adjacent subfilters share their endpoints, and the
+    rotation of each exposure is calculated once.
+    The conversion to pixel shifts is done for all exposures and subfilters
+    in a single array operation.
     """
-    rotation = calculateImageParallacticAngle(visitInfo, wcs)
-    dcrShift = []
-    weight = [0.75, 0.25]
     lambdaEff = filterInfo.getFilterProperty().getLambdaEff()
-    for wl0, wl1 in wavelengthGenerator(filterInfo, dcrNumSubfilters):
-        # Note that diffRefractAmp can be negative, since it's relative to the midpoint of the full band
-        diffRefractAmp0 = differentialRefraction(wavelength=wl0, wavelengthRef=lambdaEff,
-                                                 elevation=visitInfo.getBoresightAzAlt().getLatitude(),
-                                                 observatory=visitInfo.getObservatory(),
-                                                 weather=visitInfo.getWeather())
-        diffRefractAmp1 = differentialRefraction(wavelength=wl1, wavelengthRef=lambdaEff,
-                                                 elevation=visitInfo.getBoresightAzAlt().getLatitude(),
-                                                 observatory=visitInfo.getObservatory(),
-                                                 weather=visitInfo.getWeather())
-        if splitSubfilters:
-            diffRefractPix0 = diffRefractAmp0.asArcseconds()/wcs.getPixelScale().asArcseconds()
-            diffRefractPix1 = diffRefractAmp1.asArcseconds()/wcs.getPixelScale().asArcseconds()
-            diffRefractArr = [diffRefractPix0*weight[0] + diffRefractPix1*weight[1],
-                              diffRefractPix0*weight[1] + diffRefractPix1*weight[0]]
-            shiftX = [diffRefractPix*np.sin(rotation.asRadians()) for diffRefractPix in diffRefractArr]
-            shiftY = [diffRefractPix*np.cos(rotation.asRadians()) for diffRefractPix in diffRefractArr]
-            dcrShift.append(((shiftY[0], shiftX[0]), (shiftY[1], shiftX[1])))
-        else:
-            diffRefractAmp = (diffRefractAmp0 + diffRefractAmp1)/2.
-            diffRefractPix = diffRefractAmp.asArcseconds()/wcs.getPixelScale().asArcseconds()
-            shiftX = diffRefractPix*np.sin(rotation.asRadians())
-            shiftY = diffRefractPix*np.cos(rotation.asRadians())
-            dcrShift.append((shiftY, shiftX))
-    return dcrShift
+    wavelengths = np.array(list(wavelengthGenerator(filterInfo, dcrNumSubfilters)))
+    uniqueWavelengths, wavelengthIndex = np.unique(wavelengths, return_inverse=True)
+    wavelengthIndex = wavelengthIndex.reshape(wavelengths.shape)
+    nVisit = len(visitInfoList)
+    diffRefractPix = np.zeros((nVisit,) + wavelengths.shape)
+    rotation = np.zeros(nVisit)
+    for visit, (visitInfo, wcs) in enumerate(zip(visitInfoList, wcsList)):
+        elevation = visitInfo.getBoresightAzAlt().getLatitude()
+        observatory = visitInfo.getObservatory()
+        weather = visitInfo.getWeather()
+        refractRef = refraction(lambdaEff, elevation, observatory, weather=weather)
+        # Note that diffRefract can be negative, since it's relative to the midpoint of the full band
+        diffRefract = np.array([(refraction(wl, elevation, observatory, weather=weather) -
+                                 refractRef).asArcseconds() for wl in uniqueWavelengths])
+        diffRefractPix[visit] = diffRefract[wavelengthIndex]/wcs.getPixelScale().asArcseconds()
+        rotation[visit] = calculateImageParallacticAngle(visitInfo, wcs).asRadians()
+    if splitSubfilters:
+        weight = np.array([[0.75, 0.25], [0.25, 0.75]])
+        diffRefractPix = diffRefractPix @ weight.T
+        rotation = rotation[:, np.newaxis, np.newaxis]
+    else:
+        diffRefractPix = np.mean(diffRefractPix, axis=-1)
+        rotation = rotation[:, np.newaxis]
+    shiftY = diffRefractPix*np.cos(rotation)
+    shiftX = diffRefractPix*np.sin(rotation)
+    return np.stack([shiftY, shiftX], axis=-1)
 
 
 def calculateImageParallacticAngle(visitInfo, wcs):
@@ -53,15 +53,27 @@ void declareAssessSpatialKernelVisitor(py::module& mod, std::string const& suffi
     cls.def(py::init<std::shared_ptr<afw::math::LinearCombinationKernel>,
                      afw::math::Kernel::SpatialFunctionPtr, daf::base::PropertySet const&>(),
             "spatialKernel"_a, "spatialBackground"_a, "ps"_a);
+    cls.def(py::init<std::shared_ptr<SpatialKernelImageCache>, daf::base::PropertySet const&>(),
+            "kernelImageCache"_a, "ps"_a);
 
     cls.def("reset", &AssessSpatialKernelVisitor<PixelT>::reset);
+    cls.def("setAssessUninitialized", &AssessSpatialKernelVisitor<PixelT>::setAssessUninitialized,
+            "assess"_a);
+    cls.def("getKernelImageCache", &AssessSpatialKernelVisitor<PixelT>::getKernelImageCache);
     cls.def("getNGood", &AssessSpatialKernelVisitor<PixelT>::getNGood);
     cls.def("getNRejected", &AssessSpatialKernelVisitor<PixelT>::getNRejected);
     cls.def("getNProcessed", &AssessSpatialKernelVisitor<PixelT>::getNProcessed);
     cls.def("processCandidate", &AssessSpatialKernelVisitor<PixelT>::processCandidate, "candidate"_a);
 
-    mod.def("makeAssessSpatialKernelVisitor", &makeAssessSpatialKernelVisitor<PixelT>, "spatialKernel"_a,
-            "spatialBackground"_a, "ps"_a);
+    mod.def("makeAssessSpatialKernelVisitor",
+            py::overload_cast<std::shared_ptr<afw::math::LinearCombinationKernel>,
+                              afw::math::Kernel::SpatialFunctionPtr, daf::base::PropertySet const&>(
+                    &makeAssessSpatialKernelVisitor<PixelT>),
+            "spatialKernel"_a, "spatialBackground"_a, "ps"_a);
+    mod.def("makeAssessSpatialKernelVisitor",
+            py::overload_cast<std::shared_ptr<SpatialKernelImageCache>, daf::base::PropertySet const&>(
+                    &makeAssessSpatialKernelVisitor<PixelT>),
+            "kernelImageCache"_a, "ps"_a);
 }
 
 }  // namespace lsst::ip::diffim::detail::<anonymous>
@@ -69,6 +81,7 @@ void declareAssessSpatialKernelVisitor(py::module& mod, std::string const& suffi
 PYBIND11_MODULE(assessSpatialKernelVisitor, mod) {
     py::module::import("lsst.afw.math");
     py::module::import("lsst.daf.base");
+    py::module::import("lsst.ip.diffim.spatialKernelImageCache");
 
     declareAssessSpatialKernelVisitor<float>(mod, "F");
 }
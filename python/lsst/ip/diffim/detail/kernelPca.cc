@@ -54,9 +54,11 @@ void declareKernelPca(py::module& mod, std::string const& suffix) {
     py::class_<KernelPca<ImageT>, std::shared_ptr<KernelPca<ImageT>>, afw::image::ImagePca<ImageT>> cls(
             mod, ("KernelPca" + suffix).c_str());
 
-    cls.def(py::init<bool>(), "constantWeight"_a = true);
+    cls.def(py::init<bool, int>(), "constantWeight"_a = true, "nComponents"_a = 0);
 
     cls.def("analyze", &KernelPca<ImageT>::analyze);
+    cls.def("getNComponents", &KernelPca<ImageT>::getNComponents);
+    cls.def("setMean", &KernelPca<ImageT>::setMean, "mean"_a);
 }
 
 /**
@@ -80,25 +80,6 @@ class DiaCatalogSourceSelectorConfig(measAlg.BaseStarSelectorConfig):
         ]
 
 
-class CheckSource(object):
-    """A functor to check whether a source has any flags set that should cause it to be labeled bad."""
-
-    def __init__(self, table, fluxLim, fluxMax, badFlags):
-        self.keys = [table.getSchema().find(name).key for name in badFlags]
-        self.fluxLim = fluxLim
-        self.fluxMax = fluxMax
-
-    def __call__(self, source):
-        for k in self.keys:
-            if source.get(k):
-                return False
-        if self.fluxLim is not None and source.getPsfInstFlux() < self.fluxLim:  # ignore faint objects
-            return False
-        if self.fluxMax != 0.0 and source.getPsfInstFlux() > self.fluxMax:  # ignore bright objects
-            return False
-        return True
-
-
 @pexConfig.registerConfigurable("diaCatalog", measAlg.sourceSelectorRegistry)
 class DiaCatalogSourceSelectorTask(measAlg.BaseSourceSelectorTask):
     """A task that selects sources for Kernel candidates.
@@ -174,54 +155,62 @@ class DiaCatalogSourceSelectorTask(measAlg.BaseSourceSelectorTask):
         if display and displayExposure:
             disp = afwDisplay.Display(frame=lsstDebug.frame)
             disp.mtv(mi, title="Kernel candidates")
+
+        # Positions of the matched sources in the contiguous sourceCat, to cut on its columns
+        sourceIds = sourceCat["id"]
+        matchIds = np.array([match.second.getId() for match in matches], dtype=sourceIds.dtype)
+        sorter = None if sourceCat.isSorted() else np.argsort(sourceIds, kind="stable")
+        matchIndex = np.searchsorted(sourceIds, matchIds, sorter=sorter)
+        if sorter is not None:
+            matchIndex = sorter[matchIndex]
+
         #
         # Look for flags in each Source
         #
-        isGoodSource = CheckSource(sourceCat, self.config.fluxLim, self.config.fluxMax, self.config.badFlags)
-
-        # Go through and find all the acceptable candidates in the catalogue
-        selected = np.zeros(len(sourceCat), dtype=bool)
+        isGoodSource = np.ones(len(matches), dtype=bool)
+        for flag in self.config.badFlags:
+            isGoodSource &= ~sourceCat[flag][matchIndex]
+        psfFlux = sourceCat.getPsfInstFlux()[matchIndex]
+        if self.config.fluxLim is not None:
+            isGoodSource &= ~(psfFlux < self.config.fluxLim)  # ignore faint objects
+        if self.config.fluxMax != 0.0:
+            isGoodSource &= ~(psfFlux > self.config.fluxMax)  # ignore bright objects
+
+        # The reference records are not in a contiguous catalog; read the few fields needed
+        refSchema = matches[0][0].schema
 
-        if display and displayExposure:
-            symbs = []
-            ctypes = []
+        def getRefColumn(name, dtype):
+            key = refSchema.find(name).key
+            return np.array([match.first.get(key) for match in matches], dtype=dtype)
 
-        doColorCut = True
+        isStar = ~getRefColumn("resolved", bool)
+        isVar = ~getRefColumn("photometric", bool)
+        isRightType = (self.config.selectStar & isStar) | (self.config.selectGalaxy & ~isStar)
+        isRightVar = self.config.includeVariable | ~isVar
 
-        refSchema = matches[0][0].schema
         rRefFluxField = measAlg.getRefFluxField(refSchema, "r")
         gRefFluxField = measAlg.getRefFluxField(refSchema, "g")
-        for i, (ref, source, d) in enumerate(matches):
-            if not isGoodSource(source):
-                if display and displayExposure:
-                    symbs.append("+")
-                    ctypes.append(afwDisplay.RED)
-            else:
-                isStar = not ref.get("resolved")
-                isVar = not ref.get("photometric")
-                gMag = None
-                rMag = None
-                if doColorCut:
-                    try:
-                        gMag = -2.5 * np.log10(ref.get(gRefFluxField))
-                        rMag = -2.5 * np.log10(ref.get(rRefFluxField))
-                    except KeyError:
-                        self.log.warn("Cannot cut on color info; fields 'g' and 'r' do not exist")
-                        doColorCut = False
-                        isRightColor = True
-                    else:
-                        isRightColor = (gMag-rMag) >= self.config.grMin and (gMag-rMag) <= self.config.grMax
-
-                isRightType = (self.config.selectStar and isStar) or (self.config.selectGalaxy and not isStar)
-                isRightVar = (self.config.includeVariable) or (self.config.includeVariable is isVar)
-                if isRightType and isRightVar and isRightColor:
-                    selected[i] = True
-                    if display and displayExposure:
-                        symbs.append("+")
-                        ctypes.append(afwDisplay.GREEN)
-                elif display and displayExposure:
-                    symbs.append("o")
-                    ctypes.append(afwDisplay.BLUE)
+        try:
+            gFlux = getRefColumn(gRefFluxField, float)
+            rFlux = getRefColumn(rRefFluxField, float)
+        except LookupError:
+            if np.any(isGoodSource):
+                self.log.warn("Cannot cut on color info; fields 'g' and 'r' do not exist")
+            isRightColor = True
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                gr = -2.5*np.log10(gFlux) + 2.5*np.log10(rFlux)
+            isRightColor = (gr >= self.config.grMin) & (gr <= self.config.grMax)
+
+        # Go through and find all the acceptable candidates in the catalogue
+        isSelected = isGoodSource & isRightType & isRightVar & isRightColor
+        selected = np.zeros(len(sourceCat), dtype=bool)
+        selected[:len(matches)] = isSelected
+
+        if display and displayExposure:
+            symbs = np.where(isSelected | ~isGoodSource, "+", "o")
+            ctypes = np.where(isGoodSource, np.where(isSelected, afwDisplay.GREEN, afwDisplay.BLUE),
+                              afwDisplay.RED)
 
         if display and displayExposure:
             disp = afwDisplay.Display(frame=lsstDebug.frame)
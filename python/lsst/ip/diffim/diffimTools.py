@@ -19,11 +19,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-__all__ = ["backgroundSubtract", "writeKernelCellSet", "sourceToFootprintList", "NbasisEvaluator"]
+__all__ = ["backgroundSubtract", "writeKernelCellSet", "saveKernelCellSet", "loadKernelCellSet",
+           "sourceToFootprintList", "NbasisEvaluator"]
 
 # python
 import time
 import os
+import itertools
 from collections import Counter
 import numpy as np
 
@@ -36,6 +38,7 @@ import lsst.afw.image as afwImage
 import lsst.afw.table as afwTable
 import lsst.afw.detection as afwDetect
 import lsst.afw.math.mathLib as afwMath
+import lsst.daf.base as dafBase
 import lsst.geom as geom
 from lsst.log import Log
 import lsst.pex.config as pexConfig
@@ -364,11 +367,211 @@ def writeKernelCellSet(kernelCellSet, psfMatchingKernel, backgroundModel, outdir
                 sdmi = cand.getDifferenceImage(sk, sbg)
                 sdmi.writeFits(os.path.join(outdir, 'sdiffim_c%d_x%d_y%d.fits' % (idCand, xCand, yCand)))
 
+
+def saveKernelCellSet(kernelCellSet, basisList, filename):
+    """Save the candidates of a kernel cell set, with their built normal
+    equations, to a compressed numpy archive.
+
+    Parameters
+    ----------
+    kernelCellSet : `lsst.afw.math.SpatialCellSet`
+        Cell set of `lsst.ip.diffim.KernelCandidateF`, e.g. as returned by
+        `lsst.ip.diffim.ImagePsfMatchTask.subtractMaskedImages`.
+    basisList : `list` of `lsst.afw.math.Kernel`
+        The basis that the candidates were built with.
+    filename : `str`
+        Name of the file to write; ``.npz`` is appended if it is missing.
+
+    Notes
+    -----
+    For each candidate the position, status, stamp bounding box and, if the
+    candidate has been built, the M and B matrices of its
+    `lsst.ip.diffim.StaticKernelSolutionF` are saved.  The pixels of the
+    stamps are not saved; `loadKernelCellSet` cuts them from the images
+    again.  The basis is saved as images, since a kernel basis is fully
+    described by its images.
+
+    Candidates built with a regularized solution are saved unbuilt, since
+    their solution needs the full design matrix and not only M and B.
+    """
+    xCenters, yCenters, statuses, stampBBoxes, hasSolutions = [], [], [], [], []
+    mMats, bVecs = [], []
+    fitForBackground = False
+    nParameters = len(basisList)
+    for cell in kernelCellSet.getCellList():
+        for cand in cell.begin(False):  # False = include bad candidates
+            bbox = cand.getTemplateMaskedImage().getBBox()
+            xCenters.append(cand.getXCenter())
+            yCenters.append(cand.getYCenter())
+            statuses.append(int(cand.getStatus()))
+            stampBBoxes.append((bbox.getMinX(), bbox.getMinY(), bbox.getWidth(), bbox.getHeight()))
+
+            solution = None
+            if cand.isInitialized():
+                solution = cand.getKernelSolution(diffimLib.KernelCandidateF.ORIG)
+                if isinstance(solution, diffimLib.RegularizedKernelSolutionF):
+                    solution = None
+            if solution is None:
+                hasSolutions.append(False)
+                mMats.append(None)
+                bVecs.append(None)
+                continue
+            mMat = solution.getM()
+            if len(mMat) > nParameters:
+                fitForBackground = True
+                nParameters = len(mMat)
+            hasSolutions.append(True)
+            mMats.append(mMat)
+            bVecs.append(solution.getB())
+
+    mMatArray = np.zeros((len(mMats), nParameters, nParameters))
+    bVecArray = np.zeros((len(bVecs), nParameters))
+    for i, (mMat, bVec) in enumerate(zip(mMats, bVecs)):
+        if mMat is not None:
+            mMatArray[i] = mMat
+            bVecArray[i] = bVec
+
+    basisImages = []
+    for kernel in basisList:
+        image = afwImage.ImageD(kernel.getDimensions())
+        kernel.computeImage(image, False)
+        basisImages.append(image.getArray())
+
+    cellBBox = kernelCellSet.getCellList()[0].getBBox()
+    bbox = kernelCellSet.getBBox()
+    np.savez_compressed(_getKernelCellSetFilename(filename),
+                        cellSetBBox=np.array([bbox.getMinX(), bbox.getMinY(),
+                                              bbox.getWidth(), bbox.getHeight()]),
+                        cellSize=np.array([cellBBox.getWidth(), cellBBox.getHeight()]),
+                        xCenter=np.array(xCenters, dtype=float),
+                        yCenter=np.array(yCenters, dtype=float),
+                        status=np.array(statuses, dtype=int),
+                        stampBBox=np.array(stampBBoxes, dtype=int).reshape(-1, 4),
+                        hasSolution=np.array(hasSolutions, dtype=bool),
+                        mMat=mMatArray,
+                        bVec=bVecArray,
+                        fitForBackground=np.array(fitForBackground),
+                        basisImages=np.array(basisImages))
+
+
+def loadKernelCellSet(filename, templateMaskedImage, scienceMaskedImage, ps, basisList=None):
+    """Restore a kernel cell set saved by `saveKernelCellSet`.
+
+    Parameters
+    ----------
+    filename : `str`
+        Name of the file written by `saveKernelCellSet`; ``.npz`` is appended
+        if it is missing.
+    templateMaskedImage : `lsst.afw.image.MaskedImageF`
+        Template image to cut the candidate stamps from.
+    scienceMaskedImage : `lsst.afw.image.MaskedImageF`
+        Science image to cut the candidate stamps from.
+    ps : `lsst.daf.base.PropertySet`
+        Kernel configuration for the new candidates, as made by
+        `lsst.pex.config.makePropertySet`.
+    basisList : `list` of `lsst.afw.math.Kernel`, optional
+        The basis the candidates were built with.  If not provided, the basis
+        is rebuilt from the saved images as `lsst.afw.math.FixedKernel`.
+
+    Returns
+    -------
+    kernelCellSet : `lsst.afw.math.SpatialCellSet`
+        Cell set of `lsst.ip.diffim.KernelCandidateF`, with the saved status.
+        Candidates that were built are initialized with a solved
+        `lsst.ip.diffim.StaticKernelSolutionF`, so that
+        `lsst.ip.diffim.BuildSingleKernelVisitorF` does not build them again.
+    basisList : `list` of `lsst.afw.math.Kernel`
+        The basis of the restored solutions.
+
+    Raises
+    ------
+    ValueError
+        Raised if ``basisList`` does not have the size of the saved basis.
+
+    Notes
+    -----
+    The restored candidates are made from their positions rather than from
+    sources, so `lsst.ip.diffim.KernelCandidateF.getSource` returns `None`.
+    """
+    with np.load(_getKernelCellSetFilename(filename)) as npzFile:
+        data = {key: npzFile[key] for key in npzFile.files}
+    if basisList is None:
+        basisList = [afwMath.FixedKernel(afwImage.ImageD(image)) for image in data["basisImages"]]
+    elif len(basisList) != len(data["basisImages"]):
+        raise ValueError("Basis of %d kernels does not match the %d saved kernels" %
+                         (len(basisList), len(data["basisImages"])))
+    fitForBackground = bool(data["fitForBackground"])
+
+    x0, y0, width, height = data["cellSetBBox"]
+    cellWidth, cellHeight = data["cellSize"]
+    kernelCellSet = afwMath.SpatialCellSet(geom.Box2I(geom.Point2I(int(x0), int(y0)),
+                                                      geom.Extent2I(int(width), int(height))),
+                                           int(cellWidth), int(cellHeight))
+    statusTypes = {int(status): status for status in (afwMath.SpatialCellCandidate.BAD,
+                                                      afwMath.SpatialCellCandidate.GOOD,
+                                                      afwMath.SpatialCellCandidate.UNKNOWN)}
+    for i in range(len(data["xCenter"])):
+        xMin, yMin, stampWidth, stampHeight = data["stampBBox"][i]
+        bbox = geom.Box2I(geom.Point2I(int(xMin), int(yMin)),
+                          geom.Extent2I(int(stampWidth), int(stampHeight)))
+        tsi = afwImage.MaskedImageF(templateMaskedImage, bbox, afwImage.PARENT)
+        ssi = afwImage.MaskedImageF(scienceMaskedImage, bbox, afwImage.PARENT)
+        cand = diffimLib.makeKernelCandidate(float(data["xCenter"][i]), float(data["yCenter"][i]),
+                                             tsi, ssi, ps)
+        if data["hasSolution"][i]:
+            solution = diffimLib.StaticKernelSolutionF(basisList, fitForBackground)
+            solution.setNormalEquations(data["mMat"][i], data["bVec"][i])
+            solution.solve()
+            cand.setKernelSolution(solution)
+        cand.setStatus(statusTypes[int(data["status"][i])])
+        kernelCellSet.insertCandidate(cand)
+
+    return kernelCellSet, basisList
+
+
+def _getKernelCellSetFilename(filename):
+    """Return the name of a saved kernel cell set, with the ``.npz`` suffix
+    that `numpy.savez_compressed` adds if it is missing.
+    """
+    filename = str(filename)
+    return filename if filename.endswith(".npz") else filename + ".npz"
+
 #######
 # Converting types
 #######
 
 
+def _clipGrownBoxes(center, growPix, minCoord, maxCoord):
+    """Grow boxes about their centers, shifting those that overlap an edge
+    back inside it.
+
+    Parameters
+    ----------
+    center : `numpy.ndarray` of `int`
+        Centers of the boxes along one axis.
+    growPix : `int`
+        Number of pixels to grow the boxes by on either side of the center.
+    minCoord, maxCoord : `int`
+        Inclusive limits of the enclosing box along the same axis.
+
+    Returns
+    -------
+    boxMin, boxMax : `numpy.ndarray` of `int`
+        Inclusive limits of the boxes.  The box is shrunk on the side
+        opposite to the edge by the amount it overlaps the edge, so that
+        the object stays centered.
+    """
+    boxMin = center - growPix
+    boxMax = center + growPix
+    offset = np.minimum(boxMin - minCoord, 0)
+    boxMax += offset
+    boxMin -= offset
+    offset = np.minimum(maxCoord - boxMax, 0)
+    boxMin -= offset
+    boxMax += offset
+    return boxMin, boxMax
+
+
 def sourceToFootprintList(candidateInList, templateExposure, scienceExposure, kernelSize, config, log):
     """Convert a list of sources for the PSF-matching Kernel to Footprints.
 
@@ -408,7 +611,6 @@ def sourceToFootprintList(candidateInList, templateExposure, scienceExposure, ke
     """
 
     candidateOutList = []
-    fsb = diffimLib.FindSetBitsU()
     badBitMask = 0
     for mp in config.badMaskPlanes:
         badBitMask |= afwImage.Mask.getPlaneBitMask(mp)
@@ -424,47 +626,50 @@ def sourceToFootprintList(candidateInList, templateExposure, scienceExposure, ke
     for kernelCandidate in candidateInList:
         if not type(kernelCandidate) == afwTable.SourceRecord:
             raise RuntimeError("Candiate not of type afwTable.SourceRecord")
-        bm1 = 0
-        bm2 = 0
-        center = geom.Point2I(scienceExposure.getWcs().skyToPixel(kernelCandidate.getCoord()))
-        if center[0] < bbox.getMinX() or center[0] > bbox.getMaxX():
-            continue
-        if center[1] < bbox.getMinY() or center[1] > bbox.getMaxY():
-            continue
-
-        xmin = center[0] - fpGrowPix
-        xmax = center[0] + fpGrowPix
-        ymin = center[1] - fpGrowPix
-        ymax = center[1] + fpGrowPix
-
-        # Keep object centered
-        if (xmin - bbox.getMinX()) < 0:
-            xmax += (xmin - bbox.getMinX())
-            xmin -= (xmin - bbox.getMinX())
-        if (ymin - bbox.getMinY()) < 0:
-            ymax += (ymin - bbox.getMinY())
-            ymin -= (ymin - bbox.getMinY())
-        if (bbox.getMaxX() - xmax) < 0:
-            xmin -= (bbox.getMaxX() - xmax)
-            xmax += (bbox.getMaxX() - xmax)
-        if (bbox.getMaxY() - ymax) < 0:
-            ymin -= (bbox.getMaxY() - ymax)
-            ymax += (bbox.getMaxY() - ymax)
-        if xmin > xmax or ymin > ymax:
-            continue
-
-        kbbox = geom.Box2I(geom.Point2I(xmin, ymin), geom.Point2I(xmax, ymax))
-        try:
-            fsb.apply(afwImage.MaskedImageF(templateExposure.getMaskedImage(), kbbox, deep=False).getMask())
-            bm1 = fsb.getBits()
-            fsb.apply(afwImage.MaskedImageF(scienceExposure.getMaskedImage(), kbbox, deep=False).getMask())
-            bm2 = fsb.getBits()
-        except Exception:
-            pass
-        else:
-            if not((bm1 & badBitMask) or (bm2 & badBitMask)):
-                candidateOutList.append({'source': kernelCandidate,
-                                         'footprint': afwDetect.Footprint(afwGeom.SpanSet(kbbox))})
+    if len(candidateInList) == 0:
+        return candidateOutList
+
+    # Pixel centers of all candidates, rounded as geom.Point2I does
+    points = scienceExposure.getWcs().skyToPixel([kernelCandidate.getCoord()
+                                                  for kernelCandidate in candidateInList])
+    xCenter = np.floor(np.array([point.getX() for point in points]) + 0.5).astype(int)
+    yCenter = np.floor(np.array([point.getY() for point in points]) + 0.5).astype(int)
+    isInside = ((xCenter >= bbox.getMinX()) & (xCenter <= bbox.getMaxX()) &
+                (yCenter >= bbox.getMinY()) & (yCenter <= bbox.getMaxY()))
+
+    # Grow the boxes and shift those that overlap the edge, to keep the object centered
+    xMin, xMax = _clipGrownBoxes(xCenter, fpGrowPix, bbox.getMinX(), bbox.getMaxX())
+    yMin, yMax = _clipGrownBoxes(yCenter, fpGrowPix, bbox.getMinY(), bbox.getMaxY())
+    isInside &= (xMin <= xMax) & (yMin <= yMax)
+
+    # Number of bad pixels in each box, from an integral image of the bad pixels in either
+    # image; pixels of the science bbox that are not in the template count as bad
+    isBad = (scienceExposure.getMaskedImage().getMask().getArray() & badBitMask) != 0
+    templateMask = templateExposure.getMaskedImage().getMask()
+    overlap = geom.Box2I(bbox)
+    overlap.clip(templateMask.getBBox())
+    isInTemplate = np.zeros(isBad.shape, dtype=bool)
+    if not overlap.isEmpty():
+        templateBad = (afwImage.Mask(templateMask, overlap, deep=False).getArray() & badBitMask) != 0
+        overlapSlices = (slice(overlap.getMinY() - bbox.getMinY(), overlap.getMaxY() - bbox.getMinY() + 1),
+                         slice(overlap.getMinX() - bbox.getMinX(), overlap.getMaxX() - bbox.getMinX() + 1))
+        isBad[overlapSlices] |= templateBad
+        isInTemplate[overlapSlices] = True
+    isBad |= ~isInTemplate
+    integral = np.zeros((isBad.shape[0] + 1, isBad.shape[1] + 1), dtype=np.int32)
+    np.cumsum(np.cumsum(isBad, axis=0, dtype=np.int32), axis=1, out=integral[1:, 1:])
+
+    good, = np.where(isInside)
+    x0 = xMin[good] - bbox.getMinX()
+    x1 = xMax[good] - bbox.getMinX() + 1
+    y0 = yMin[good] - bbox.getMinY()
+    y1 = yMax[good] - bbox.getMinY() + 1
+    nBad = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+
+    for i in good[nBad == 0]:
+        kbbox = geom.Box2I(geom.Point2I(int(xMin[i]), int(yMin[i])), geom.Point2I(int(xMax[i]), int(yMax[i])))
+        candidateOutList.append({'source': candidateInList[i],
+                                 'footprint': afwDetect.Footprint(afwGeom.SpanSet(kbbox))})
     log.info("Selected %d / %d sources for KernelCandidacy", len(candidateOutList), len(candidateInList))
     return candidateOutList
 
@@ -530,7 +735,19 @@ def sourceTableToCandidateList(sourceTable, templateExposure, scienceExposure, k
 
 class NbasisEvaluator(object):
     """A functor to evaluate the Bayesian Information Criterion for the number of basis sets
-    going into the kernel fitting"""
+    going into the kernel fitting
+
+    Notes
+    -----
+    The Alard-Lupton basis of lower polynomial degrees is a subset of the
+    full-degree basis: within the block of each Gaussian, the terms are
+    ordered by total degree, and each kernel is renormalized against the
+    first kernel only.  The candidates are therefore built once with the full
+    basis, and each degree combination is solved from the corresponding
+    sub-block of the normal equations ``M a = B``.  The chi^2 of each fit
+    follows algebraically as ``I^T W I - B_s^T a_s``, without re-convolving
+    the stamps or forming difference images.
+    """
 
     def __init__(self, psfMatchConfig, psfFwhmPixTc, psfFwhmPixTnc):
         self.psfMatchConfig = psfMatchConfig
@@ -539,35 +756,71 @@ class NbasisEvaluator(object):
         if not self.psfMatchConfig.kernelBasisSet == "alard-lupton":
             raise RuntimeError("BIC only implemnted for AL (alard lupton) basis")
 
+    @staticmethod
+    def _subBasisIndices(fullDegGauss, subDegGauss):
+        """Return the indices of a lower-degree basis within the full-degree basis.
+
+        Parameters
+        ----------
+        fullDegGauss : `list` of `int`
+            Polynomial degree of each Gaussian in the full basis.
+        subDegGauss : `list` of `int`
+            Polynomial degree of each Gaussian in the sub-basis; each must not
+            exceed the corresponding entry of ``fullDegGauss``.
+
+        Returns
+        -------
+        indices : `list` of `int`
+            Indices of the sub-basis kernels in the full basis list.
+        """
+        indices = []
+        start = 0
+        for fullDeg, subDeg in zip(fullDegGauss, subDegGauss):
+            indices.extend(range(start, start + (subDeg + 1)*(subDeg + 2)//2))
+            start += (fullDeg + 1)*(fullDeg + 2)//2
+        return indices
+
     def __call__(self, kernelCellSet, log):
         d1, d2, d3 = self.psfMatchConfig.alardDegGauss
+        metadata = dafBase.PropertySet()
+        kList = makeKernelBasisList(self.psfMatchConfig, self.psfFwhmPixTc, self.psfFwhmPixTnc,
+                                    metadata=metadata)
+        fullDegGauss = list(metadata.getArray("ALBasisDegGauss"))
+        # The deconvolution basis does not depend on alardDegGauss
+        isDeconvolution = metadata.getScalar("ALBasisMode") == "deconvolution"
+
+        visitor = diffimLib.BuildSingleKernelVisitorF(kList,
+                                                      pexConfig.makePropertySet(self.psfMatchConfig))
+        visitor.setSkipBuilt(False)
+        kernelCellSet.visitCandidates(visitor, self.psfMatchConfig.nStarPerCell)
+
+        subBases = {}
+        for dList in itertools.product(range(1, d1 + 1), range(1, d2 + 1), range(1, d3 + 1)):
+            subDegGauss = fullDegGauss if isDeconvolution else dList
+            subBases[dList] = self._subBasisIndices(fullDegGauss, subDegGauss)
+
         bicArray = {}
-        for d1i in range(1, d1 + 1):
-            for d2i in range(1, d2 + 1):
-                for d3i in range(1, d3 + 1):
-                    dList = [d1i, d2i, d3i]
-                    bicConfig = type(self.psfMatchConfig)(self.psfMatchConfig, alardDegGauss=dList)
-                    kList = makeKernelBasisList(bicConfig, self.psfFwhmPixTc, self.psfFwhmPixTnc)
-                    k = len(kList)
-                    visitor = diffimLib.BuildSingleKernelVisitorF(kList,
-                                                                  pexConfig.makePropertySet(bicConfig))
-                    visitor.setSkipBuilt(False)
-                    kernelCellSet.visitCandidates(visitor, bicConfig.nStarPerCell)
-
-                    for cell in kernelCellSet.getCellList():
-                        for cand in cell.begin(False):  # False = include bad candidates
-                            if cand.getStatus() != afwMath.SpatialCellCandidate.GOOD:
-                                continue
-                            diffIm = cand.getDifferenceImage(diffimLib.KernelCandidateF.RECENT)
-                            bbox = cand.getKernel(diffimLib.KernelCandidateF.RECENT).shrinkBBox(
-                                diffIm.getBBox(afwImage.LOCAL))
-                            diffIm = type(diffIm)(diffIm, bbox, True)
-                            chi2 = diffIm.getImage().getArray()**2/diffIm.getVariance().getArray()
-                            n = chi2.shape[0]*chi2.shape[1]
-                            bic = np.sum(chi2) + k*np.log(n)
-                            if cand.getId() not in bicArray:
-                                bicArray[cand.getId()] = {}
-                            bicArray[cand.getId()][(d1i, d2i, d3i)] = bic
+        for cell in kernelCellSet.getCellList():
+            for cand in cell.begin(False):  # False = include bad candidates
+                if cand.getStatus() != afwMath.SpatialCellCandidate.GOOD:
+                    continue
+                kernelSolution = cand.getKernelSolution(diffimLib.KernelCandidateF.RECENT)
+                mMat = kernelSolution.getM()
+                bVec = kernelSolution.getB()
+                iNorm = kernelSolution.getWeightedScienceNorm()
+                bbox = cand.getKernel(diffimLib.KernelCandidateF.RECENT).shrinkBBox(
+                    cand.getScienceMaskedImage().getBBox(afwImage.LOCAL))
+                logN = np.log(bbox.getArea())
+                # Background term, if fit, is the last parameter
+                bgIndices = list(range(len(kList), len(bVec)))
+
+                bicArray[cand.getId()] = {}
+                for dList, indices in subBases.items():
+                    idx = indices + bgIndices
+                    bSub = bVec[idx]
+                    aSub = np.linalg.lstsq(mMat[np.ix_(idx, idx)], bSub, rcond=None)[0]
+                    chi2 = iNorm - np.dot(bSub, aSub)
+                    bicArray[cand.getId()][dList] = chi2 + len(indices)*logN
 
         bestConfigs = []
         for candId in bicArray:
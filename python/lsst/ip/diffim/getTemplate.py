@@ -20,6 +20,10 @@
 # see <http://www.lsstcorp.org/LegalNotices/>.
 #
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
 import numpy as np
 
 import lsst.afw.image as afwImage
@@ -29,7 +33,105 @@ import lsst.pipe.base as pipeBase
 from lsst.ip.diffim.dcrModel import DcrModel
 
 __all__ = ["GetCoaddAsTemplateTask", "GetCoaddAsTemplateConfig",
-           "GetCalexpAsTemplateTask", "GetCalexpAsTemplateConfig"]
+           "GetCalexpAsTemplateTask", "GetCalexpAsTemplateConfig",
+           "TemplatePatchCache"]
+
+
+class TemplatePatchCache:
+    """A least-recently-used cache of coadd patches, limited by memory.
+
+    Parameters
+    ----------
+    maxBytes : `int`
+        Maximum total size of the pixel data to keep in the cache, in bytes.
+
+    Notes
+    -----
+    Patches are keyed by (tract, patch, datasetType, subfilter), with
+    ``subfilter`` set to `None` for coadds that are not DCR models.
+    Each entry is a full patch `lsst.afw.image.Exposure`, so its PSF and
+    filter are retained along with the pixels.
+    The cache may be shared between threads.
+    """
+
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.nBytes = 0
+        self._patches = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._patches)
+
+    def __contains__(self, key):
+        return key in self._patches
+
+    def get(self, key):
+        """Return a cached patch, and mark it as the most recently used.
+
+        Parameters
+        ----------
+        key : `tuple`
+            The (tract, patch, datasetType, subfilter) of the patch.
+
+        Returns
+        -------
+        exposure : `lsst.afw.image.Exposure` or `None`
+            The cached patch, or `None` if it is not in the cache.
+        """
+        with self._lock:
+            exposure = self._patches.get(key)
+            if exposure is not None:
+                self._patches.move_to_end(key)
+        return exposure
+
+    def put(self, key, exposure):
+        """Add a patch to the cache, evicting the least recently used patches.
+
+        Parameters
+        ----------
+        key : `tuple`
+            The (tract, patch, datasetType, subfilter) of the patch.
+        exposure : `lsst.afw.image.Exposure`
+            The full patch to cache.
+            Patches larger than ``maxBytes`` are not cached.
+        """
+        size = self.getExposureSize(exposure)
+        if size > self.maxBytes:
+            return
+        with self._lock:
+            if key in self._patches:
+                self.nBytes -= self.getExposureSize(self._patches.pop(key))
+            while self.nBytes + size > self.maxBytes:
+                _, evicted = self._patches.popitem(last=False)
+                self.nBytes -= self.getExposureSize(evicted)
+            self._patches[key] = exposure
+            self.nBytes += size
+
+    def clear(self):
+        """Remove all patches from the cache.
+        """
+        with self._lock:
+            self._patches.clear()
+            self.nBytes = 0
+
+    @staticmethod
+    def getExposureSize(exposure):
+        """Return the size of the pixel data of an exposure, in bytes.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            The exposure to measure.
+
+        Returns
+        -------
+        size : `int`
+            Total size of the image, mask, and variance planes.
+        """
+        maskedImage = exposure.maskedImage
+        return maskedImage.image.array.nbytes + maskedImage.mask.array.nbytes + \
+            maskedImage.variance.array.nbytes
 
 
 class GetCoaddAsTemplateConfig(pexConfig.Config):
@@ -53,6 +155,21 @@ class GetCoaddAsTemplateConfig(pexConfig.Config):
         dtype=str,
         default="direct",
     )
+    patchCacheSize = pexConfig.Field(
+        doc="Maximum memory, in MB, to use to cache full coadd patches between calls to ``run``, "
+            "so that neighboring CCDs and later visits do not read the same patches again. "
+            "Set to 0 to disable the cache and read only the overlapping region of each patch.",
+        dtype=float,
+        default=0.,
+    )
+    numPatchThreads = pexConfig.Field(
+        doc="Number of threads to use to read patches, and build DCR-matched templates, concurrently. "
+            "Patches are read one at a time if 1. If greater than 1, the butler of the data reference "
+            "passed to ``run`` is called from several threads at once, so it must be safe to use "
+            "concurrently.",
+        dtype=int,
+        default=1,
+    )
 
 
 class GetCoaddAsTemplateTask(pipeBase.Task):
@@ -66,7 +183,11 @@ class GetCoaddAsTemplateTask(pipeBase.Task):
     ConfigClass = GetCoaddAsTemplateConfig
     _DefaultName = "GetCoaddAsTemplateTask"
 
-    def run(self, exposure, sensorRef, templateIdList=None):
+    def __init__(self, *args, **kwargs):
+        pipeBase.Task.__init__(self, *args, **kwargs)
+        self.patchCache = TemplatePatchCache(int(self.config.patchCacheSize*1024**2))
+
+    def run(self, exposure, sensorRef, templateIdList=None, readPlan=None):
         """Retrieve and mosaic a template coadd exposure that overlaps the exposure
 
         Parameters
@@ -77,6 +198,10 @@ class GetCoaddAsTemplateTask(pipeBase.Task):
             a Butler data reference that can be used to obtain coadd data
         templateIdList : TYPE, optional
             list of data ids (unused)
+        readPlan : `lsst.pipe.base.Struct`, optional
+            Precomputed plan of the patch regions to read for ``exposure``,
+            as returned by `makeReadPlan` or `planVisitReads`.
+            Computed from the wcs and bounding box of ``exposure`` if `None`.
 
         Returns
         -------
@@ -86,19 +211,92 @@ class GetCoaddAsTemplateTask(pipeBase.Task):
             - ``exposure`` : a template coadd exposure assembled out of patches
             - ``sources`` :  None for this subtask
         """
-        skyMap = sensorRef.get(datasetType=self.config.coaddName + "Coadd_skyMap")
-        expWcs = exposure.getWcs()
-        expBoxD = geom.Box2D(exposure.getBBox())
+        if readPlan is None:
+            skyMap = sensorRef.get(datasetType=self.config.coaddName + "Coadd_skyMap")
+            readPlan = self.makeReadPlan(skyMap, exposure.getWcs(), exposure.getBBox())
+        tractInfo = readPlan.tractInfo
+        self.log.info("Using skyMap tract %s" % (tractInfo.getId(),))
+        self.log.info("Assembling %s coadd patches" % (len(readPlan.patchArgList),))
+        coaddWcs = readPlan.coaddWcs
+        coaddBBox = readPlan.coaddBBox
+        self.log.info("exposure dimensions=%s; coadd dimensions=%s" %
+                      (exposure.getDimensions(), coaddBBox.getDimensions()))
+
+        # assemble coadd exposure from subregions of patches
+        coaddExposure = afwImage.ExposureF(coaddBBox, coaddWcs)
+        coaddExposure.maskedImage.set(np.nan, afwImage.Mask.getPlaneBitMask("NO_DATA"), np.nan)
+        visitInfo = exposure.getInfo().getVisitInfo()
+        if self.config.numPatchThreads > 1 and len(readPlan.patchArgList) > 1:
+            with ThreadPoolExecutor(max_workers=self.config.numPatchThreads) as executor:
+                futures = [executor.submit(self._getPatchExposure, sensorRef, patchInfo, patchArgDict,
+                                           readPlan, visitInfo)
+                           for patchInfo, patchArgDict in readPlan.patchArgList]
+                # Patches overlap, so they are assigned in the order of ``patchList``
+                # to keep the result deterministic; each is assigned as soon as it
+                # and the patches before it have finished.
+                coaddFilter, coaddPsf, nPatchesFound = self._assemblePatches(
+                    coaddExposure, (future.result() for future in futures))
+        else:
+            coaddFilter, coaddPsf, nPatchesFound = self._assemblePatches(
+                coaddExposure, (self._getPatchExposure(sensorRef, patchInfo, patchArgDict,
+                                                       readPlan, visitInfo)
+                                for patchInfo, patchArgDict in readPlan.patchArgList))
+
+        if nPatchesFound == 0:
+            raise RuntimeError("No patches found!")
+
+        if coaddPsf is None:
+            raise RuntimeError("No coadd Psf found!")
+
+        coaddExposure.setPsf(coaddPsf)
+        coaddExposure.setFilter(coaddFilter)
+        return pipeBase.Struct(exposure=coaddExposure,
+                               sources=None)
+
+    def makeReadPlan(self, skyMap, wcs, bbox):
+        """Compute the patch regions to read to build the template for one CCD.
+
+        Parameters
+        ----------
+        skyMap : `lsst.skymap.BaseSkyMap`
+            The sky map of the coadds.
+        wcs : `lsst.afw.geom.SkyWcs`
+            Coordinate system definition (wcs) of the exposure.
+        bbox : `lsst.geom.Box2I`
+            Bounding box of the exposure.
+
+        Returns
+        -------
+        readPlan : `lsst.pipe.base.Struct`
+            The read plan, with attributes:
+
+            - ``tractInfo`` : the tract containing the exposure
+              (`lsst.skymap.TractInfo`)
+            - ``coaddWcs`` : the wcs of the tract (`lsst.afw.geom.SkyWcs`)
+            - ``coaddBBox`` : the bounding box of the template, in tract
+              coordinates (`lsst.geom.Box2I`)
+            - ``patchArgList`` : the patches overlapping the template, as a
+              `list` of (`lsst.skymap.PatchInfo`, `dict`), where the `dict`
+              holds the butler arguments of the patch cut-out.
+            - ``patchExists`` : `dict` of `bool`, keyed by (tract, patch),
+              for patches whose existence has already been checked.
+            - ``patchReadBBoxes`` : `dict` of `lsst.geom.Box2I`, keyed by
+              (tract, patch), of the regions to read into the patch cache.
+
+        Raises
+        ------
+        RuntimeError
+            If no patches overlap the exposure.
+        """
+        expBoxD = geom.Box2D(bbox)
         expBoxD.grow(self.config.templateBorderSize)
-        ctrSkyPos = expWcs.pixelToSky(expBoxD.getCenter())
+        ctrSkyPos = wcs.pixelToSky(expBoxD.getCenter())
         tractInfo = skyMap.findTract(ctrSkyPos)
-        self.log.info("Using skyMap tract %s" % (tractInfo.getId(),))
-        skyCorners = [expWcs.pixelToSky(pixPos) for pixPos in expBoxD.getCorners()]
+        skyCorners = [wcs.pixelToSky(pixPos) for pixPos in expBoxD.getCorners()]
         patchList = tractInfo.findPatchList(skyCorners)
 
         if not patchList:
             raise RuntimeError("No suitable tract found")
-        self.log.info("Assembling %s coadd patches" % (len(patchList),))
 
         # compute coadd bbox
         coaddWcs = tractInfo.getWcs()
@@ -106,15 +304,8 @@ class GetCoaddAsTemplateTask(pipeBase.Task):
         for skyPos in skyCorners:
             coaddBBox.include(coaddWcs.skyToPixel(skyPos))
         coaddBBox = geom.Box2I(coaddBBox)
-        self.log.info("exposure dimensions=%s; coadd dimensions=%s" %
-                      (exposure.getDimensions(), coaddBBox.getDimensions()))
 
-        # assemble coadd exposure from subregions of patches
-        coaddExposure = afwImage.ExposureF(coaddBBox, coaddWcs)
-        coaddExposure.maskedImage.set(np.nan, afwImage.Mask.getPlaneBitMask("NO_DATA"), np.nan)
-        nPatchesFound = 0
-        coaddFilter = None
-        coaddPsf = None
+        patchArgList = []
         for patchInfo in patchList:
             patchSubBBox = patchInfo.getOuterBBox()
             patchSubBBox.clip(coaddBBox)
@@ -128,40 +319,81 @@ class GetCoaddAsTemplateTask(pipeBase.Task):
             if patchSubBBox.isEmpty():
                 self.log.info("skip tract=%(tract)s, patch=%(patch)s; no overlapping pixels" % patchArgDict)
                 continue
+            patchArgList.append((patchInfo, patchArgDict))
+        return pipeBase.Struct(tractInfo=tractInfo, coaddWcs=coaddWcs, coaddBBox=coaddBBox,
+                               patchArgList=patchArgList, patchExists={}, patchReadBBoxes={})
 
-            if self.config.coaddName == 'dcr':
-                if not sensorRef.datasetExists(subfilter=0, **patchArgDict):
-                    self.log.warn("%(datasetType)s, tract=%(tract)s, patch=%(patch)s,"
-                                  " numSubfilters=%(numSubfilters)s, subfilter=0 does not exist"
-                                  % patchArgDict)
-                    continue
-                patchInnerBBox = patchInfo.getInnerBBox()
-                patchInnerBBox.clip(coaddBBox)
-                if np.min(patchInnerBBox.getDimensions()) <= 2*self.config.templateBorderSize:
-                    self.log.info("skip tract=%(tract)s, patch=%(patch)s; too few pixels." % patchArgDict)
-                    continue
-                self.log.info("Constructing DCR-matched template for patch %s" % patchArgDict)
-
-                dcrModel = DcrModel.fromDataRef(sensorRef, **patchArgDict)
-                # The edge pixels of the DcrCoadd may contain artifacts due to missing data.
-                # Each patch has significant overlap, and the contaminated edge pixels in
-                # a new patch will overwrite good pixels in the overlap region from
-                # previous patches.
-                # Shrink the BBox to remove the contaminated pixels,
-                # but make sure it is only the overlap region that is reduced.
-                dcrBBox = geom.Box2I(patchSubBBox)
-                dcrBBox.grow(-self.config.templateBorderSize)
-                dcrBBox.include(patchInnerBBox)
-                coaddPatch = dcrModel.buildMatchedExposure(bbox=dcrBBox,
-                                                           wcs=coaddWcs,
-                                                           visitInfo=exposure.getInfo().getVisitInfo())
-            else:
-                if not sensorRef.datasetExists(**patchArgDict):
-                    self.log.warn("%(datasetType)s, tract=%(tract)s, patch=%(patch)s does not exist"
-                                  % patchArgDict)
-                    continue
-                self.log.info("Reading patch %s" % patchArgDict)
-                coaddPatch = sensorRef.get(**patchArgDict)
+    def planVisitReads(self, sensorRef, wcsList, bboxList):
+        """Compute the template read plans for all of the CCDs of a visit.
+
+        Parameters
+        ----------
+        sensorRef : `lsst.daf.persistence.ButlerDataRef`
+            A Butler data reference that can be used to obtain coadd data.
+        wcsList : `list` of `lsst.afw.geom.SkyWcs`
+            Coordinate system definition (wcs) of each CCD.
+        bboxList : `list` of `lsst.geom.Box2I`
+            Bounding box of each CCD.
+
+        Returns
+        -------
+        readPlans : `list` of `lsst.pipe.base.Struct`
+            The read plan of each CCD, in the same order as ``wcsList``,
+            to pass to `run`. See `makeReadPlan` for the attributes.
+
+        Notes
+        -----
+        The existence of each patch is checked only once for the whole visit,
+        rather than once per CCD. The union of the regions needed by all
+        CCDs is also recorded for each patch, so that if the patch cache is
+        enabled each patch is read only once, and only the needed region.
+        """
+        skyMap = sensorRef.get(datasetType=self.config.coaddName + "Coadd_skyMap")
+        readPlans = [self.makeReadPlan(skyMap, wcs, bbox) for wcs, bbox in zip(wcsList, bboxList)]
+        patchReadBBoxes = {}
+        patchArgDicts = {}
+        for readPlan in readPlans:
+            for patchInfo, patchArgDict in readPlan.patchArgList:
+                key = (patchArgDict["tract"], patchArgDict["patch"])
+                patchReadBBoxes.setdefault(key, geom.Box2I()).include(patchArgDict["bbox"])
+                patchArgDicts[key] = patchArgDict
+        subfilter = 0 if self.config.coaddName == 'dcr' else None
+        patchExists = {}
+        for key, readBBox in patchReadBBoxes.items():
+            patchArgDict = dict(patchArgDicts[key], bbox=readBBox)
+            patchExists[key] = self._patchExists(sensorRef, patchArgDict, subfilter=subfilter)
+        for readPlan in readPlans:
+            readPlan.patchExists = patchExists
+            readPlan.patchReadBBoxes = patchReadBBoxes
+        return readPlans
+
+    @staticmethod
+    def _assemblePatches(coaddExposure, coaddPatches):
+        """Assign patch cut-outs into the template exposure.
+
+        Parameters
+        ----------
+        coaddExposure : `lsst.afw.image.Exposure`
+            The template exposure to fill. Modified in place.
+        coaddPatches : iterable of `lsst.afw.image.Exposure` or `None`
+            The patch cut-outs, in the order they should be assigned.
+            `None` entries are skipped.
+
+        Returns
+        -------
+        coaddFilter : `lsst.afw.image.Filter` or `None`
+            The filter of the first patch.
+        coaddPsf : `lsst.afw.detection.Psf` or `None`
+            The PSF of the first patch that has one.
+        nPatchesFound : `int`
+            The number of patches assigned.
+        """
+        nPatchesFound = 0
+        coaddFilter = None
+        coaddPsf = None
+        for coaddPatch in coaddPatches:
+            if coaddPatch is None:
+                continue
             nPatchesFound += 1
             coaddExposure.maskedImage.assign(coaddPatch.maskedImage, coaddPatch.getBBox())
             if coaddFilter is None:
@@ -170,17 +402,159 @@ class GetCoaddAsTemplateTask(pipeBase.Task):
             # Retrieve the PSF for this coadd tract, if not already retrieved
             if coaddPsf is None and coaddPatch.hasPsf():
                 coaddPsf = coaddPatch.getPsf()
+        return coaddFilter, coaddPsf, nPatchesFound
 
-        if nPatchesFound == 0:
-            raise RuntimeError("No patches found!")
+    def _getPatchExposure(self, sensorRef, patchInfo, patchArgDict, readPlan, visitInfo):
+        """Read, or build the DCR-matched template of, the cut-out of one patch.
 
-        if coaddPsf is None:
-            raise RuntimeError("No coadd Psf found!")
+        Parameters
+        ----------
+        sensorRef : `lsst.daf.persistence.ButlerDataRef`
+            Butler data reference used to read the patch.
+        patchInfo : `lsst.skymap.PatchInfo`
+            Description of the patch.
+        patchArgDict : `dict`
+            Arguments identifying the patch cut-out, from ``readPlan``.
+        readPlan : `lsst.pipe.base.Struct`
+            The read plan of the template, as returned by `makeReadPlan`.
+        visitInfo : `lsst.afw.image.VisitInfo`
+            Metadata of the exposure, used to build DCR-matched templates.
 
-        coaddExposure.setPsf(coaddPsf)
-        coaddExposure.setFilter(coaddFilter)
-        return pipeBase.Struct(exposure=coaddExposure,
-                               sources=None)
+        Returns
+        -------
+        coaddPatch : `lsst.afw.image.Exposure` or `None`
+            The template for the overlapping region of the patch,
+            or `None` if the patch does not exist or should be skipped.
+        """
+        key = (patchArgDict["tract"], patchArgDict["patch"])
+        exists = readPlan.patchExists.get(key)
+        readBBox = readPlan.patchReadBBoxes.get(key)
+        if self.config.coaddName == 'dcr':
+            if exists is None:
+                exists = self._patchExists(sensorRef, patchArgDict, subfilter=0)
+            if not exists:
+                self.log.warn("%(datasetType)s, tract=%(tract)s, patch=%(patch)s,"
+                              " numSubfilters=%(numSubfilters)s, subfilter=0 does not exist"
+                              % patchArgDict)
+                return None
+            patchInnerBBox = patchInfo.getInnerBBox()
+            patchInnerBBox.clip(readPlan.coaddBBox)
+            if np.min(patchInnerBBox.getDimensions()) <= 2*self.config.templateBorderSize:
+                self.log.info("skip tract=%(tract)s, patch=%(patch)s; too few pixels." % patchArgDict)
+                return None
+            self.log.info("Constructing DCR-matched template for patch %s" % patchArgDict)
+
+            dcrModel = self._readDcrModel(sensorRef, patchArgDict, readBBox=readBBox)
+            # The edge pixels of the DcrCoadd may contain artifacts due to missing data.
+            # Each patch has significant overlap, and the contaminated edge pixels in
+            # a new patch will overwrite good pixels in the overlap region from
+            # previous patches.
+            # Shrink the BBox to remove the contaminated pixels,
+            # but make sure it is only the overlap region that is reduced.
+            dcrBBox = geom.Box2I(patchArgDict["bbox"])
+            dcrBBox.grow(-self.config.templateBorderSize)
+            dcrBBox.include(patchInnerBBox)
+            return dcrModel.buildMatchedExposure(bbox=dcrBBox, wcs=readPlan.coaddWcs, visitInfo=visitInfo)
+        if exists is None:
+            exists = self._patchExists(sensorRef, patchArgDict)
+        if not exists:
+            self.log.warn("%(datasetType)s, tract=%(tract)s, patch=%(patch)s does not exist"
+                          % patchArgDict)
+            return None
+        self.log.info("Reading patch %s" % patchArgDict)
+        return self._readPatch(sensorRef, patchArgDict, readBBox=readBBox)
+
+    def _patchExists(self, sensorRef, patchArgDict, subfilter=None):
+        """Check whether a patch is cached or exists in the repository.
+
+        Parameters
+        ----------
+        sensorRef : `lsst.daf.persistence.ButlerDataRef`
+            Butler data reference used to look up the patch.
+        patchArgDict : `dict`
+            Arguments identifying the patch cut-out, as assembled by `makeReadPlan`.
+        subfilter : `int`, optional
+            Subfilter of a DCR model to check.
+
+        Returns
+        -------
+        exists : `bool`
+            True if the patch can be read.
+        """
+        if self._getPatchCacheKey(patchArgDict, subfilter) in self.patchCache:
+            return True
+        if subfilter is None:
+            return sensorRef.datasetExists(**patchArgDict)
+        return sensorRef.datasetExists(subfilter=subfilter, **patchArgDict)
+
+    def _readPatch(self, sensorRef, patchArgDict, subfilter=None, readBBox=None):
+        """Read the cut-out of a patch, using the patch cache if enabled.
+
+        Parameters
+        ----------
+        sensorRef : `lsst.daf.persistence.ButlerDataRef`
+            Butler data reference used to read the patch.
+        patchArgDict : `dict`
+            Arguments identifying the patch cut-out, as assembled by `makeReadPlan`.
+        subfilter : `int`, optional
+            Subfilter of a DCR model to read.
+        readBBox : `lsst.geom.Box2I`, optional
+            Region of the patch to read into the cache, if it is not already
+            cached. The full patch is read if `None`.
+
+        Returns
+        -------
+        coaddPatch : `lsst.afw.image.Exposure`
+            The region ``patchArgDict["bbox"]`` of the patch.
+        """
+        subfilterArgs = {} if subfilter is None else dict(subfilter=subfilter)
+        if self.patchCache.maxBytes <= 0:
+            return sensorRef.get(**patchArgDict, **subfilterArgs)
+        key = self._getPatchCacheKey(patchArgDict, subfilter)
+        patch = self.patchCache.get(key)
+        if patch is None or not patch.getBBox().contains(patchArgDict["bbox"]):
+            if readBBox is not None and readBBox.contains(patchArgDict["bbox"]):
+                patch = sensorRef.get(**dict(patchArgDict, bbox=readBBox), **subfilterArgs)
+            else:
+                # Read the full patch, rather than the ``_sub`` cut-out,
+                # so that later requests for other regions can use it.
+                fullPatchArgs = {k: v for k, v in patchArgDict.items() if k not in ("datasetType", "bbox")}
+                datasetType = patchArgDict["datasetType"][:-len("_sub")]
+                patch = sensorRef.get(datasetType, **fullPatchArgs, **subfilterArgs)
+            self.patchCache.put(key, patch)
+        return patch[patchArgDict["bbox"]]
+
+    def _readDcrModel(self, sensorRef, patchArgDict, readBBox=None):
+        """Read the cut-out of a DCR model patch, using the patch cache if enabled.
+
+        Parameters
+        ----------
+        sensorRef : `lsst.daf.persistence.ButlerDataRef`
+            Butler data reference used to read the patch.
+        patchArgDict : `dict`
+            Arguments identifying the patch cut-out, as assembled by `makeReadPlan`.
+        readBBox : `lsst.geom.Box2I`, optional
+            Region of the patch to read into the cache, if it is not already
+            cached. The full patch is read if `None`.
+
+        Returns
+        -------
+        dcrModel : `lsst.ip.diffim.DcrModel`
+            The DCR model for the region ``patchArgDict["bbox"]`` of the patch.
+        """
+        if self.patchCache.maxBytes <= 0:
+            return DcrModel.fromDataRef(sensorRef, **patchArgDict)
+        subfilterPatches = [self._readPatch(sensorRef, patchArgDict, subfilter=subfilter, readBBox=readBBox)
+                            for subfilter in range(self.config.numSubfilters)]
+        coaddPatch = subfilterPatches[0]
+        return DcrModel([patch.image for patch in subfilterPatches], coaddPatch.getFilter(),
+                        coaddPatch.getPsf(), coaddPatch.mask, coaddPatch.variance)
+
+    @staticmethod
+    def _getPatchCacheKey(patchArgDict, subfilter=None):
+        """Return the key of a patch in the patch cache.
+        """
+        return (patchArgDict["tract"], patchArgDict["patch"], patchArgDict["datasetType"], subfilter)
 
     def getCoaddDatasetName(self):
         """Return coadd name for given task config
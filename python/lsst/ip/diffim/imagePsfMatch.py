@@ -19,6 +19,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import weakref
+
 import numpy as np
 
 import lsst.daf.base as dafBase
@@ -33,17 +35,119 @@ import lsst.pipe.base as pipeBase
 from lsst.meas.algorithms import SourceDetectionTask, SubtractBackgroundTask, WarpedPsf
 from lsst.meas.base import SingleFrameMeasurementTask
 from .makeKernelBasisList import makeKernelBasisList
-from .psfMatch import PsfMatchTask, PsfMatchConfigDF, PsfMatchConfigAL
+from .psfMatch import PsfMatchTask, PsfMatchConfigDF, PsfMatchConfigAL, PsfMatchSolution
 from . import utils as diffimUtils
 from . import diffimLib
 from . import diffimTools
 import lsst.afw.display as afwDisplay
 
-__all__ = ["ImagePsfMatchConfig", "ImagePsfMatchTask", "subtractAlgorithmRegistry"]
+__all__ = ["ImagePsfMatchConfig", "ImagePsfMatchTask", "subtractAlgorithmRegistry", "WarpedTemplateCache"]
 
 sigma2fwhm = 2.*np.sqrt(2.*np.log(2.))
 
 
+class WarpedTemplateCache:
+    """A cache of templates warped to the frame of a science exposure.
+
+    Parameters
+    ----------
+    maxSize : `int`, optional
+        Maximum number of warped templates to keep.
+        The least recently used template is discarded first.
+
+    Notes
+    -----
+    Templates are keyed by the identity of the input template exposure, the
+    destination wcs and bounding box, and the warping configuration.
+    The cache holds only a weak reference to each input template, so it does
+    not keep the template alive, and an entry is dropped once its template
+    has been deleted. An entry can only match the same object it was computed
+    from; the input template must not be modified in place while it is cached.
+    Each call to `get` returns a new copy of the warped exposure, which may be
+    modified freely. The warped `~lsst.meas.algorithms.WarpedPsf` is shared.
+    """
+
+    def __init__(self, maxSize=2):
+        self.maxSize = maxSize
+        self._entries = []
+
+    def __len__(self):
+        self._removeDeadEntries()
+        return len(self._entries)
+
+    def get(self, templateExposure, wcs, bbox, warpingConfig):
+        """Return a copy of a cached warped template.
+
+        Parameters
+        ----------
+        templateExposure : `lsst.afw.image.Exposure`
+            The template exposure before warping.
+        wcs : `lsst.afw.geom.SkyWcs`
+            The wcs the template was warped to.
+        bbox : `lsst.geom.Box2I`
+            The bounding box the template was warped to.
+        warpingConfig : `lsst.afw.math.WarperConfig`
+            The configuration used to warp the template.
+
+        Returns
+        -------
+        warpedExposure : `lsst.afw.image.Exposure` or `None`
+            A copy of the warped template, including its warped PSF,
+            or `None` if it is not in the cache.
+        """
+        self._removeDeadEntries()
+        warpingKey = self._getWarpingKey(warpingConfig)
+        for i, entry in enumerate(self._entries):
+            if (entry.templateRef() is templateExposure and entry.warpingKey == warpingKey and
+                    entry.bbox == bbox and entry.wcs == wcs):
+                self._entries.append(self._entries.pop(i))
+                return entry.warpedExposure.clone()
+        return None
+
+    def put(self, templateExposure, wcs, bbox, warpingConfig, warpedExposure):
+        """Add a warped template to the cache.
+
+        Parameters
+        ----------
+        templateExposure : `lsst.afw.image.Exposure`
+            The template exposure before warping.
+        wcs : `lsst.afw.geom.SkyWcs`
+            The wcs the template was warped to.
+        bbox : `lsst.geom.Box2I`
+            The bounding box the template was warped to.
+        warpingConfig : `lsst.afw.math.WarperConfig`
+            The configuration used to warp the template.
+        warpedExposure : `lsst.afw.image.Exposure`
+            The warped template, with its warped PSF attached.
+            A copy is stored, so the caller may modify ``warpedExposure``.
+        """
+        if self.maxSize <= 0:
+            return
+        self._removeDeadEntries()
+        entry = pipeBase.Struct(templateRef=weakref.ref(templateExposure), wcs=wcs, bbox=geom.Box2I(bbox),
+                                warpingKey=self._getWarpingKey(warpingConfig),
+                                warpedExposure=warpedExposure.clone())
+        self._entries.append(entry)
+        while len(self._entries) > self.maxSize:
+            self._entries.pop(0)
+
+    def clear(self):
+        """Remove all warped templates from the cache.
+        """
+        self._entries = []
+
+    def _removeDeadEntries(self):
+        """Remove the entries whose input template has been deleted.
+        """
+        self._entries = [entry for entry in self._entries if entry.templateRef() is not None]
+
+    @staticmethod
+    def _getWarpingKey(warpingConfig):
+        """Return a hashable summary of a warping configuration.
+        """
+        return tuple(sorted(warpingConfig.toDict().items()))
+
+
 class ImagePsfMatchConfig(pexConfig.Config):
     """Configuration for image-to-image Psf matching.
     """
@@ -63,6 +167,13 @@ class ImagePsfMatchConfig(pexConfig.Config):
         target=SingleFrameMeasurementTask,
         doc="Initial measurements used to feed stars to kernel fitting",
     )
+    doCacheWarpedTemplate = pexConfig.Field(
+        dtype=bool,
+        default=False,
+        doc="Keep the most recently warped templates in a cache owned by the task, so that a second "
+            "subtraction of the same template and science exposure does not warp again. "
+            "The template exposure must not be modified between subtractions.",
+    )
 
     def setDefaults(self):
         # High sigma detections only
@@ -321,6 +432,7 @@ class ImagePsfMatchTask(PsfMatchTask):
         PsfMatchTask.__init__(self, *args, **kwargs)
         self.kConfig = self.config.kernel.active
         self._warper = afwMath.Warper.fromConfig(self.kConfig.warpingConfig)
+        self.warpedTemplateCache = WarpedTemplateCache() if self.config.doCacheWarpedTemplate else None
         # the background subtraction task uses a config from an unusual location,
         # so cannot easily be constructed with makeSubtask
         self.background = SubtractBackgroundTask(config=self.kConfig.afwBackgroundConfig, name="background",
@@ -339,7 +451,7 @@ class ImagePsfMatchTask(PsfMatchTask):
     @pipeBase.timeMethod
     def matchExposures(self, templateExposure, scienceExposure,
                        templateFwhmPix=None, scienceFwhmPix=None,
-                       candidateList=None, doWarping=True, convolveTemplate=True):
+                       candidateList=None, doWarping=True, convolveTemplate=True, initialSolution=None):
         """Warp and PSF-match an exposure to the reference.
 
         Do the following, in order:
@@ -380,6 +492,11 @@ class ImagePsfMatchTask(PsfMatchTask):
             - if `False`, ``templateExposure`` is warped if doWarping,
               ``scienceExposure`` is convolved
 
+        initialSolution : `lsst.ip.diffim.PsfMatchSolution`, optional
+            Solution for a similar pair of exposures, e.g. the previous snap pair.
+            If provided, its kernel basis is reused, and, if ``candidateList`` is `None`
+            and the bounding boxes match, so are its candidate sources.
+
         Returns
         -------
         results : `lsst.pipe.base.Struct`
@@ -395,6 +512,7 @@ class ImagePsfMatchTask(PsfMatchTask):
             - ``psfMatchingKernel`` : the PSF matching kernel
             - ``backgroundModel`` : differential background model
             - ``kernelCellSet`` : SpatialCellSet used to solve for the PSF matching kernel
+            - ``solution`` : `lsst.ip.diffim.PsfMatchSolution` that may seed the next match
 
         Raises
         ------
@@ -404,16 +522,7 @@ class ImagePsfMatchTask(PsfMatchTask):
         """
         if not self._validateWcs(templateExposure, scienceExposure):
             if doWarping:
-                self.log.info("Astrometrically registering template to science image")
-                templatePsf = templateExposure.getPsf()
-                # Warp PSF before overwriting exposure
-                xyTransform = afwGeom.makeWcsPairTransform(templateExposure.getWcs(),
-                                                           scienceExposure.getWcs())
-                psfWarped = WarpedPsf(templatePsf, xyTransform)
-                templateExposure = self._warper.warpExposure(scienceExposure.getWcs(),
-                                                             templateExposure,
-                                                             destBBox=scienceExposure.getBBox())
-                templateExposure.setPsf(psfWarped)
+                templateExposure = self._warpTemplate(templateExposure, scienceExposure)
             else:
                 self.log.error("ERROR: Input images not registered")
                 raise RuntimeError("Input images not registered")
@@ -432,20 +541,34 @@ class ImagePsfMatchTask(PsfMatchTask):
                 scienceFwhmPix = self.getFwhmPix(scienceExposure.getPsf())
                 self.log.info("scienceFwhmPix: {}".format(scienceFwhmPix))
 
+        if initialSolution is not None and candidateList is None:
+            # Re-examine the previous candidates on these images, rather than detecting anew
+            previousCandidates = initialSolution.getCandidateList(scienceExposure.getBBox()) or []
+            candidateList = [cand['source'] for cand in previousCandidates
+                             if not isinstance(cand, afwDetect.Footprint) and 'source' in cand] or None
+
         if convolveTemplate:
-            kernelSize = makeKernelBasisList(self.kConfig, templateFwhmPix, scienceFwhmPix)[0].getWidth()
+            if initialSolution is not None and initialSolution.basisList is not None:
+                kernelSize = initialSolution.basisList[0].getWidth()
+            else:
+                kernelSize = makeKernelBasisList(self.kConfig, templateFwhmPix, scienceFwhmPix)[0].getWidth()
             candidateList = self.makeCandidateList(
                 templateExposure, scienceExposure, kernelSize, candidateList)
             results = self.matchMaskedImages(
                 templateExposure.getMaskedImage(), scienceExposure.getMaskedImage(), candidateList,
-                templateFwhmPix=templateFwhmPix, scienceFwhmPix=scienceFwhmPix)
+                templateFwhmPix=templateFwhmPix, scienceFwhmPix=scienceFwhmPix,
+                initialSolution=initialSolution)
         else:
-            kernelSize = makeKernelBasisList(self.kConfig, scienceFwhmPix, templateFwhmPix)[0].getWidth()
+            if initialSolution is not None and initialSolution.basisList is not None:
+                kernelSize = initialSolution.basisList[0].getWidth()
+            else:
+                kernelSize = makeKernelBasisList(self.kConfig, scienceFwhmPix, templateFwhmPix)[0].getWidth()
             candidateList = self.makeCandidateList(
                 templateExposure, scienceExposure, kernelSize, candidateList)
             results = self.matchMaskedImages(
                 scienceExposure.getMaskedImage(), templateExposure.getMaskedImage(), candidateList,
-                templateFwhmPix=scienceFwhmPix, scienceFwhmPix=templateFwhmPix)
+                templateFwhmPix=scienceFwhmPix, scienceFwhmPix=templateFwhmPix,
+                initialSolution=initialSolution)
 
         psfMatchedExposure = afwImage.makeExposure(results.matchedImage, scienceExposure.getWcs())
         psfMatchedExposure.setFilter(templateExposure.getFilter())
@@ -456,7 +579,7 @@ class ImagePsfMatchTask(PsfMatchTask):
 
     @pipeBase.timeMethod
     def matchMaskedImages(self, templateMaskedImage, scienceMaskedImage, candidateList,
-                          templateFwhmPix=None, scienceFwhmPix=None):
+                          templateFwhmPix=None, scienceFwhmPix=None, initialSolution=None):
         """PSF-match a MaskedImage (templateMaskedImage) to a reference MaskedImage (scienceMaskedImage).
 
         Do the following, in order:
@@ -481,6 +604,11 @@ class ImagePsfMatchTask(PsfMatchTask):
             if `None` then source detection is run.
 
             - Currently supported: list of Footprints or measAlg.PsfCandidateF
+        initialSolution : `lsst.ip.diffim.PsfMatchSolution`, optional
+            Solution for a similar pair of images, e.g. the previous snap pair or
+            `lsst.ip.diffim.PsfMatchSolution.fromKernel` of the previous visit.
+            If provided, it is used to screen the candidates, and its kernel basis
+            is reused where possible so that only the spatial model is refit.
 
         Returns
         -------
@@ -493,6 +621,7 @@ class ImagePsfMatchTask(PsfMatchTask):
         - psfMatchingKernel: the PSF matching kernel
         - backgroundModel: differential background model
         - kernelCellSet: SpatialCellSet used to solve for the PSF matching kernel
+        - solution: `lsst.ip.diffim.PsfMatchSolution` that may seed the next match
 
         Raises
         ------
@@ -541,7 +670,9 @@ class ImagePsfMatchTask(PsfMatchTask):
         if templateFwhmPix and scienceFwhmPix:
             self.log.info("Matching Psf FWHM %.2f -> %.2f pix", templateFwhmPix, scienceFwhmPix)
 
-        if self.kConfig.useBicForKernelBasis:
+        if initialSolution is not None and initialSolution.basisList is not None:
+            basisList = initialSolution.basisList
+        elif self.kConfig.useBicForKernelBasis:
             tmpKernelCellSet = self._buildCellSet(templateMaskedImage,
                                                   scienceMaskedImage,
                                                   candidateList)
@@ -554,7 +685,17 @@ class ImagePsfMatchTask(PsfMatchTask):
             basisList = makeKernelBasisList(self.kConfig, templateFwhmPix, scienceFwhmPix,
                                             metadata=self.metadata)
 
-        spatialSolution, psfMatchingKernel, backgroundModel = self._solve(kernelCellSet, basisList)
+        spatialSolution, psfMatchingKernel, backgroundModel = self._solve(kernelCellSet, basisList,
+                                                                          initialSolution=initialSolution)
+        if initialSolution is not None and \
+                initialSolution.spatialBasisList[0].getDimensions() == basisList[0].getDimensions():
+            isPcaBasis = initialSolution.isPcaBasis
+        else:
+            isPcaBasis = self.kConfig.usePcaForSpatialKernel
+        solution = PsfMatchSolution(basisList, psfMatchingKernel.getKernelList(), psfMatchingKernel,
+                                    backgroundModel, isPcaBasis=isPcaBasis, candidateList=candidateList,
+                                    bbox=templateMaskedImage.getBBox(),
+                                    kernelImageCache=self.kernelImageCache)
 
         psfMatchedMaskedImage = afwImage.MaskedImageF(templateMaskedImage.getBBox())
         doNormalize = False
@@ -564,12 +705,13 @@ class ImagePsfMatchTask(PsfMatchTask):
             psfMatchingKernel=psfMatchingKernel,
             backgroundModel=backgroundModel,
             kernelCellSet=kernelCellSet,
+            solution=solution,
         )
 
     @pipeBase.timeMethod
     def subtractExposures(self, templateExposure, scienceExposure,
                           templateFwhmPix=None, scienceFwhmPix=None,
-                          candidateList=None, doWarping=True, convolveTemplate=True):
+                          candidateList=None, doWarping=True, convolveTemplate=True, initialSolution=None):
         """Register, Psf-match and subtract two Exposures.
 
         Do the following, in order:
@@ -611,6 +753,9 @@ class ImagePsfMatchTask(PsfMatchTask):
             - if `False`, ``templateExposure`` is warped if doWarping,
               ``scienceExposure is`` convolved
 
+        initialSolution : `lsst.ip.diffim.PsfMatchSolution`, optional
+            Solution for a similar pair of exposures; see `matchExposures`.
+
         Returns
         -------
         result : `lsst.pipe.base.Struct`
@@ -624,6 +769,7 @@ class ImagePsfMatchTask(PsfMatchTask):
             - ``psfMatchingKernel`` : PSF matching kernel
             - ``backgroundModel`` : differential background model
             - ``kernelCellSet`` : SpatialCellSet used to determine PSF matching kernel
+            - ``solution`` : `lsst.ip.diffim.PsfMatchSolution` that may seed the next subtraction
         """
         results = self.matchExposures(
             templateExposure=templateExposure,
@@ -632,7 +778,8 @@ class ImagePsfMatchTask(PsfMatchTask):
             scienceFwhmPix=scienceFwhmPix,
             candidateList=candidateList,
             doWarping=doWarping,
-            convolveTemplate=convolveTemplate
+            convolveTemplate=convolveTemplate,
+            initialSolution=initialSolution,
         )
 
         subtractedExposure = afwImage.ExposureF(scienceExposure, True)
@@ -680,7 +827,7 @@ class ImagePsfMatchTask(PsfMatchTask):
 
     @pipeBase.timeMethod
     def subtractMaskedImages(self, templateMaskedImage, scienceMaskedImage, candidateList,
-                             templateFwhmPix=None, scienceFwhmPix=None):
+                             templateFwhmPix=None, scienceFwhmPix=None, initialSolution=None):
         """Psf-match and subtract two MaskedImages.
 
         Do the following, in order:
@@ -706,6 +853,9 @@ class ImagePsfMatchTask(PsfMatchTask):
 
             - Currently supported: list of Footprints or measAlg.PsfCandidateF
 
+        initialSolution : `lsst.ip.diffim.PsfMatchSolution`, optional
+            Solution for a similar pair of images; see `matchMaskedImages`.
+
         Returns
         -------
         results : `lsst.pipe.base.Struct`
@@ -716,6 +866,7 @@ class ImagePsfMatchTask(PsfMatchTask):
             - `psfMatchingKernel`` : PSF matching kernel
             - ``backgroundModel`` : differential background model
             - ``kernelCellSet`` : SpatialCellSet used to determine PSF matching kernel
+            - ``solution`` : `lsst.ip.diffim.PsfMatchSolution` that may seed the next subtraction
 
         """
         if not candidateList:
@@ -727,6 +878,7 @@ class ImagePsfMatchTask(PsfMatchTask):
             candidateList=candidateList,
             templateFwhmPix=templateFwhmPix,
             scienceFwhmPix=scienceFwhmPix,
+            initialSolution=initialSolution,
         )
 
         subtractedMaskedImage = afwImage.MaskedImageF(scienceMaskedImage, True)
@@ -916,6 +1068,44 @@ class ImagePsfMatchTask(PsfMatchTask):
 
         return kernelCellSet
 
+    def _warpTemplate(self, templateExposure, scienceExposure):
+        """Warp a template exposure, and its PSF, to the frame of a science exposure.
+
+        Parameters
+        ----------
+        templateExposure : `lsst.afw.image.Exposure`
+            Exposure to warp.
+        scienceExposure : `lsst.afw.image.Exposure`
+            Exposure whose WCS and bounding box are to be matched.
+
+        Returns
+        -------
+        warpedExposure : `lsst.afw.image.Exposure`
+            The warped template, with a `~lsst.meas.algorithms.WarpedPsf`.
+            Taken from ``self.warpedTemplateCache`` if the same template has
+            already been warped to the same frame.
+        """
+        scienceWcs = scienceExposure.getWcs()
+        scienceBBox = scienceExposure.getBBox()
+        warpingConfig = self.kConfig.warpingConfig
+        if self.warpedTemplateCache is not None:
+            warpedExposure = self.warpedTemplateCache.get(templateExposure, scienceWcs, scienceBBox,
+                                                          warpingConfig)
+            if warpedExposure is not None:
+                self.log.info("Using cached registration of template to science image")
+                return warpedExposure
+        self.log.info("Astrometrically registering template to science image")
+        templatePsf = templateExposure.getPsf()
+        # Warp PSF before overwriting exposure
+        xyTransform = afwGeom.makeWcsPairTransform(templateExposure.getWcs(), scienceWcs)
+        psfWarped = WarpedPsf(templatePsf, xyTransform)
+        warpedExposure = self._warper.warpExposure(scienceWcs, templateExposure, destBBox=scienceBBox)
+        warpedExposure.setPsf(psfWarped)
+        if self.warpedTemplateCache is not None:
+            self.warpedTemplateCache.put(templateExposure, scienceWcs, scienceBBox, warpingConfig,
+                                         warpedExposure)
+        return warpedExposure
+
     def _validateSize(self, templateMaskedImage, scienceMaskedImage):
         """Return True if two image-like objects are the same size.
         """
@@ -61,9 +61,13 @@ void declareImageStatistics(py::module &mod, std::string const &suffix) {
             "image"_a, "core"_a);
     cls.def("setBpMask", &ImageStatistics<PixelT>::setBpMask, "bpMask"_a);
     cls.def("getBpMask", &ImageStatistics<PixelT>::getBpMask);
+    cls.def("setRobustStats", &ImageStatistics<PixelT>::setRobustStats, "doRobust"_a);
+    cls.def("getRobustStats", &ImageStatistics<PixelT>::getRobustStats);
     cls.def("getMean", &ImageStatistics<PixelT>::getMean);
     cls.def("getVariance", &ImageStatistics<PixelT>::getVariance);
     cls.def("getRms", &ImageStatistics<PixelT>::getRms);
+    cls.def("getMedian", &ImageStatistics<PixelT>::getMedian);
+    cls.def("getIqr", &ImageStatistics<PixelT>::getIqr);
     cls.def("getNpix", &ImageStatistics<PixelT>::getNpix);
     cls.def("evaluateQuality", &ImageStatistics<PixelT>::evaluateQuality, "ps"_a);
 }
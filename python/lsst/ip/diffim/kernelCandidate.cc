@@ -42,7 +42,8 @@ namespace diffim {
 namespace {
 
 /**
- * Wrap `KernelCandidate` and factory function `makeKernelCandidate` for one pixel type
+ * Wrap `KernelCandidate` and factory functions `makeKernelCandidate` and `insertKernelCandidates`
+ * for one pixel type
  *
  * @tparam PixelT  Pixel type of image plane of MaskedImage, e.g. `float`
  * @param mod  pybind11 module
@@ -80,6 +81,7 @@ void declareKernelCandidate(py::module &mod, std::string const &suffix) {
     cls.def("getKernelImage", &KernelCandidate<PixelT>::getKernelImage, "cand"_a);
     cls.def("getImage", &KernelCandidate<PixelT>::getImage);
     cls.def("getKernelSolution", &KernelCandidate<PixelT>::getKernelSolution, "cand"_a);
+    cls.def("setKernelSolution", &KernelCandidate<PixelT>::setKernelSolution, "kernelSolution"_a);
     cls.def("getDifferenceImage",
             (afw::image::MaskedImage<PixelT> (KernelCandidate<PixelT>::*)(CandidateSwitch)) &
                     KernelCandidate<PixelT>::getDifferenceImage,
@@ -88,6 +90,15 @@ void declareKernelCandidate(py::module &mod, std::string const &suffix) {
                                           std::shared_ptr<afw::math::Kernel>, double)) &
                                           KernelCandidate<PixelT>::getDifferenceImage,
             "kernel"_a, "background"_a);
+    cls.def("getDifferenceImage",
+            (void (KernelCandidate<PixelT>::*)(afw::image::MaskedImage<PixelT> &, CandidateSwitch)) &
+                    KernelCandidate<PixelT>::getDifferenceImage,
+            "diffim"_a, "cand"_a);
+    cls.def("getDifferenceImage",
+            (void (KernelCandidate<PixelT>::*)(afw::image::MaskedImage<PixelT> &,
+                                               std::shared_ptr<afw::math::Kernel>, double)) &
+                    KernelCandidate<PixelT>::getDifferenceImage,
+            "diffim"_a, "kernel"_a, "background"_a);
     cls.def("isInitialized", &KernelCandidate<PixelT>::isInitialized);
     cls.def("build", (void (KernelCandidate<PixelT>::*)(afw::math::KernelList const &)) &
                              KernelCandidate<PixelT>::build,
@@ -109,6 +120,8 @@ void declareKernelCandidate(py::module &mod, std::string const &suffix) {
                     std::shared_ptr<afw::image::MaskedImage<PixelT>> const &, daf::base::PropertySet const &)) &
                     makeKernelCandidate,
             "source"_a, "templateMaskedImage"_a, "scienceMaskedImage"_a, "ps"_a);
+    mod.def("insertKernelCandidates", &insertKernelCandidates<PixelT>, "kernelCellSet"_a, "xCenters"_a,
+            "yCenters"_a, "templateStamps"_a, "scienceStamps"_a, "ps"_a);
 }
 
 }  // namespace lsst::ip::diffim::<anonymous>
@@ -22,15 +22,20 @@
 
 __all__ = ["KernelCandidateQa"]
 
+import warnings
+
 import numpy as np
-import numpy.ma as ma
 
 import lsst.afw.image as afwImage
 import lsst.afw.table as afwTable
 import lsst.afw.math as afwMath
 import lsst.geom as geom
 from . import diffimLib
-from .utils import calcCentroid, calcWidth
+
+# Anderson-Darling critical values at the significance levels (percent) of
+# the Normal distribution, with the mean and variance estimated from the data
+_AD_NORM_CRITICAL = np.array([0.561, 0.631, 0.752, 0.873, 1.035])
+_AD_NORM_SIGNIFICANCE = np.array([15., 10., 5., 2.5, 1.])
 
 
 class KernelCandidateQa(object):
@@ -140,157 +145,362 @@ class KernelCandidateQa(object):
     @staticmethod
     def _calculateStats(di, dof=0.):
         """Calculate the core QA statistics on a difference image"""
-        mask = di.getMask()
-        maskArr = di.getMask().getArray()
-
-        # Create a mask using BAD, SAT, NO_DATA, EDGE bits.  Keep detections
-        maskArr &= mask.getPlaneBitMask(["BAD", "SAT", "NO_DATA", "EDGE"])
-
-        # Mask out values based on maskArr
-        diArr = ma.array(di.getImage().getArray(), mask=maskArr)
-        varArr = ma.array(di.getVariance().getArray(), mask=maskArr)
-
-        # Normalize by sqrt variance, units are in sigma
-        diArr /= np.sqrt(varArr)
-        mean = diArr.mean()
-
-        # This is the maximum-likelihood extimate of the variance stdev**2
-        stdev = diArr.std()
-        median = ma.extras.median(diArr)
-
-        # Compute IQR of just un-masked data
-        data = ma.getdata(diArr[~diArr.mask])
-        iqr = np.percentile(data, 75.) - np.percentile(data, 25.)
-
-        # Calculte chisquare of the residual
-        chisq = np.sum(np.power(data, 2.))
-
-        # Mean squared error: variance + bias**2
-        # Bias = |data - model| = mean of diffim
-        # Variance = |(data - model)**2| = mean of diffim**2
-        bias = mean
-        variance = np.power(data, 2.).mean()
-        mseResids = bias**2 + variance
-
-        # If scipy is not set up, return zero for the stats
-        try:
-            # In try block because of risk of divide by zero
-            rchisq = chisq/(len(data) - 1 - dof)
+        results = KernelCandidateQa._calculateBatchStats([di], dof=dof)
+        return {k: v[0] for k, v in results.items()}
+
+    @staticmethod
+    def _calculateBatchStats(diList, dof=0.):
+        """Calculate the core QA statistics on a list of difference images.
+
+        Parameters
+        ----------
+        diList : `list` of `lsst.afw.image.MaskedImage`
+            Difference images of the KernelCandidates.
+        dof : `float`, optional
+            Number of degrees of freedom of the fit, for the reduced chi^2.
+
+        Returns
+        -------
+        results : `dict` [`str`, `numpy.ndarray`]
+            Statistics of the residuals in units of sigma, one entry per
+            difference image; see `_calculateResidualStats`.
+        """
+        residList = []
+        for di in diList:
+            # Create a mask using BAD, SAT, NO_DATA, EDGE bits.  Keep detections
+            badBits = di.getMask().getPlaneBitMask(["BAD", "SAT", "NO_DATA", "EDGE"])
+            # Normalize by sqrt variance, units are in sigma
+            with np.errstate(divide="ignore", invalid="ignore"):
+                resid = di.getImage().getArray()/np.sqrt(di.getVariance().getArray())
+            isGood = ((di.getMask().getArray() & badBits) == 0) & np.isfinite(resid)
+            residList.append(resid[isGood])
+        return KernelCandidateQa._calculateResidualStats(residList, dof=dof)
+
+    @staticmethod
+    def _calculateResidualStats(residList, dof=0.):
+        """Calculate the core QA statistics on sets of normalized residuals.
+
+        The residuals are padded into a single array, so that every
+        statistic is computed for all sets at once.
+
+        Parameters
+        ----------
+        residList : `list` of `numpy.ndarray`
+            Unmasked residuals of each difference image, in units of sigma.
+        dof : `float`, optional
+            Number of degrees of freedom of the fit, for the reduced chi^2.
+
+        Returns
+        -------
+        results : `dict` [`str`, `numpy.ndarray`]
+            Mean, maximum-likelihood standard deviation, median and
+            inner quartile range ("mean", "stdev", "median", "iqr"); K-S
+            statistic and probability relative to a Normal ("D", "prob");
+            Anderson-Darling statistic, critical values and significance
+            levels ("A2", "crit", "sig"); reduced chi^2 ("rchisq"), and
+            mean squared error ("mseResids"), one entry per set.
+        """
+        import scipy.special
+        import scipy.stats
+
+        nData = np.array([len(resid) for resid in residList])
+        nSet = len(residList)
+        data = np.full((nSet, max(nData.max(initial=0), 1)), np.nan)
+        for i, resid in enumerate(residList):
+            data[i, :nData[i]] = resid
+        # Sorting moves the padding to the end of each row
+        data.sort(axis=1)
+        index = np.arange(1, data.shape[1] + 1)
+        isValid = index <= nData[:, np.newaxis]
+        n = nData[:, np.newaxis]
+
+        with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            mean = np.nanmean(data, axis=1)
+            # This is the maximum-likelihood extimate of the variance stdev**2
+            stdev = np.nanstd(data, axis=1)
+            # The rows are sorted, so the quantiles are read off directly
+            median = KernelCandidateQa._sortedQuantile(data, nData, 0.50)
+            iqr = (KernelCandidateQa._sortedQuantile(data, nData, 0.75) -
+                   KernelCandidateQa._sortedQuantile(data, nData, 0.25))
+
+            # Calculte chisquare of the residual
+            chisq = np.nansum(data**2, axis=1)
+            rchisq = chisq/(nData - 1 - dof)
+
+            # Mean squared error: variance + bias**2
+            # Bias = |data - model| = mean of diffim
+            # Variance = |(data - model)**2| = mean of diffim**2
+            mseResids = mean**2 + np.nanmean(data**2, axis=1)
+
             # K-S test on the diffim to a Normal distribution
-            import scipy.stats
-            D, prob = scipy.stats.kstest(data, 'norm')
-
-            A2, crit, sig = scipy.stats.anderson(data, 'norm')
-            # Anderson Darling statistic cand be inf for really non-Gaussian distributions.
-            if np.isinf(A2) or np.isnan(A2):
-                A2 = 9999.
-        except ZeroDivisionError:
-            D = 0.
-            prob = 0.
-            A2 = 0.
-            crit = np.zeros(5)
-            sig = np.zeros(5)
-            rchisq = 0
+            cdf = scipy.special.ndtr(data)
+            dPlus = np.max(np.where(isValid, index/n - cdf, -np.inf), axis=1)
+            dMinus = np.max(np.where(isValid, cdf - (index - 1)/n, -np.inf), axis=1)
+            D = np.maximum(dPlus, dMinus)
+            prob = np.clip(scipy.stats.kstwo.sf(D, nData), 0., 1.)
+
+            # Anderson-Darling test on the diffim to a Normal distribution,
+            # with the mean and variance estimated from the data
+            w = (data - mean[:, np.newaxis])/np.nanstd(data, axis=1, ddof=1)[:, np.newaxis]
+            logCdf = scipy.special.log_ndtr(w)
+            logSf = np.take_along_axis(scipy.special.log_ndtr(-w), np.clip(n - index, 0, None), axis=1)
+            A2 = -nData - np.sum(np.where(isValid, (2*index - 1.)/n*(logCdf + logSf), 0.), axis=1)
+            crit = np.round(_AD_NORM_CRITICAL/(1. + 0.75/n + 2.25/n**2), 3)
+        # Anderson Darling statistic cand be inf for really non-Gaussian distributions.
+        A2[~np.isfinite(A2)] = 9999.
+        sig = np.tile(_AD_NORM_SIGNIFICANCE, (nSet, 1))
 
         return {"mean": mean, "stdev": stdev, "median": median, "iqr": iqr,
                 "D": D, "prob": prob, "A2": A2, "crit": crit, "sig": sig,
                 "rchisq": rchisq, "mseResids": mseResids}
 
+    @staticmethod
+    def _sortedQuantile(data, nData, q):
+        """Quantile of each row of sorted data, as `numpy.percentile`.
+
+        Parameters
+        ----------
+        data : `numpy.ndarray`
+            Sorted rows, each padded after its ``nData`` values.
+        nData : `numpy.ndarray`
+            Number of values in each row.
+        q : `float`
+            Quantile, between 0 and 1.
+
+        Returns
+        -------
+        quantile : `numpy.ndarray`
+            The quantile of each row, interpolated linearly between the
+            order statistics; NaN for empty rows.
+        """
+        pos = q*(nData - 1)
+        lo = np.clip(np.floor(pos).astype(int), 0, None)
+        hi = np.minimum(lo + 1, np.clip(nData - 1, 0, None))
+        low = np.take_along_axis(data, lo[:, np.newaxis], axis=1)[:, 0]
+        high = np.take_along_axis(data, hi[:, np.newaxis], axis=1)[:, 0]
+        return low + (pos - lo)*(high - low)
+
+    @staticmethod
+    def _computeKernelImages(spatialKernel, xCenter, yCenter):
+        """Evaluate the spatial kernel images, not normalized, at many positions.
+
+        Parameters
+        ----------
+        spatialKernel : `lsst.afw.math.Kernel`
+            Spatially varying Psf-matching kernel.
+        xCenter, yCenter : `numpy.ndarray`
+            Positions at which to evaluate the kernel.
+
+        Returns
+        -------
+        images : `numpy.ndarray`
+            Kernel images, with shape (len(xCenter), height, width).
+
+        Notes
+        -----
+        The images of a `lsst.afw.math.LinearCombinationKernel` are formed
+        as a single product of the spatial coefficients at each position with
+        the stack of basis images.
+        """
+        if isinstance(spatialKernel, afwMath.LinearCombinationKernel) and \
+                spatialKernel.isSpatiallyVarying():
+            basisImages = []
+            for kernel in spatialKernel.getKernelList():
+                image = afwImage.ImageD(kernel.getDimensions())
+                kernel.computeImage(image, False)
+                basisImages.append(image.getArray())
+            spatialFunctions = spatialKernel.getSpatialFunctionList()
+            coeffs = np.array([[function(x, y) for function in spatialFunctions]
+                               for x, y in zip(xCenter, yCenter)]).reshape(len(xCenter), len(basisImages))
+            return np.tensordot(coeffs, np.array(basisImages), axes=1)
+
+        dims = spatialKernel.getDimensions()
+        images = np.empty((len(xCenter), dims.getY(), dims.getX()))
+        image = afwImage.ImageD(dims)
+        for i, (x, y) in enumerate(zip(xCenter, yCenter)):
+            spatialKernel.computeImage(image, False, x, y)
+            images[i] = image.getArray()
+        return images
+
+    @staticmethod
+    def _calcMoments(images):
+        """Calculate the centroids and widths of a stack of kernel images.
+
+        Vectorized form of `lsst.ip.diffim.utils.calcCentroid` and
+        `lsst.ip.diffim.utils.calcWidth`.
+
+        Parameters
+        ----------
+        images : `numpy.ndarray`
+            Kernel images, with shape (nImage, height, width).
+
+        Returns
+        -------
+        centx, centy, stdx, stdy : `numpy.ndarray`
+            First and second moments of the squared images.
+        """
+        sarr = images**2
+        sarrSum = sarr.sum(axis=(1, 2))
+        xProfile = sarr.sum(axis=1)
+        yProfile = sarr.sum(axis=2)
+        x = np.arange(images.shape[2])
+        y = np.arange(images.shape[1])
+        centx = xProfile.dot(x)/sarrSum
+        centy = yProfile.dot(y)/sarrSum
+        stdx = np.sqrt(np.sum(xProfile*(x - centx[:, np.newaxis])**2, axis=1)/sarrSum)
+        stdy = np.sqrt(np.sum(yProfile*(y - centy[:, np.newaxis])**2, axis=1)/sarrSum)
+        return centx, centy, stdx, stdy
+
+    @staticmethod
+    def _setMetrics(sources, metrics, sourceCatalog=None):
+        """Set the values of QA metrics in Sources.
+
+        Parameters
+        ----------
+        sources : `list` of `lsst.afw.table.SourceRecord`
+            Sources to set the metrics of.
+        metrics : `dict` [`str`, `numpy.ndarray`]
+            Values of each metric, one entry per source.
+        sourceCatalog : `lsst.afw.table.SourceCatalog`, optional
+            Contiguous catalog containing ``sources``; if given, each
+            metric is written as a single column assignment.
+        """
+        if len(sources) == 0:
+            return
+        if sourceCatalog is not None and sourceCatalog.isContiguous():
+            ids = sourceCatalog["id"]
+            sourceIds = np.array([source.getId() for source in sources])
+            order = np.argsort(ids)
+            rows = order[np.clip(np.searchsorted(ids, sourceIds, sorter=order), 0, len(ids) - 1)]
+            if not np.all(ids[rows] == sourceIds):
+                raise RuntimeError("Not all KernelCandidate sources are in the source catalog")
+            for name, values in metrics.items():
+                sourceCatalog[name][rows] = values
+            return
+
+        schema = sources[0].schema
+        keys = {name: schema[name].asKey() for name in metrics}
+        for i, source in enumerate(sources):
+            for name, key in keys.items():
+                source.set(key, metrics[name][i])
+
     @classmethod
-    def apply(cls, candidateList, spatialKernel, spatialBackground, dof=0):
+    def apply(cls, candidateList, spatialKernel, spatialBackground, dof=0, sourceCatalog=None):
         """Evaluate the QA metrics for all KernelCandidates in the
         candidateList; set the values of the metrics in their
-        associated Sources"""
-        for kernelCandidate in candidateList:
-            source = kernelCandidate.getSource()
-            schema = source.schema
+        associated Sources
 
-            # Calculate ORIG stats (original basis fit)
+        Parameters
+        ----------
+        candidateList : `list` of `lsst.ip.diffim.KernelCandidateF`
+            Candidates to evaluate.
+        spatialKernel : `lsst.afw.math.Kernel`
+            Spatially varying Psf-matching kernel.
+        spatialBackground : `lsst.afw.math.Function2D`
+            Spatial model of the differential background.
+        dof : `int`, optional
+            Number of degrees of freedom of the fit, for the reduced chi^2.
+        sourceCatalog : `lsst.afw.table.SourceCatalog`, optional
+            Contiguous catalog, e.g. from `addToSchema`, containing the
+            sources of the candidates.  If given, the metrics are written as
+            whole columns instead of record by record.
+
+        Notes
+        -----
+        The spatial kernel is evaluated at all candidate positions at once,
+        and the statistics of all difference images are computed together.
+        Only the difference images themselves are made per candidate.
+        """
+        candidateList = list(candidateList)
+        if len(candidateList) == 0:
+            return
+        kType = diffimLib.KernelCandidateF.ORIG
+
+        # Calculate spatial model evaluated at each position, for
+        # all candidates
+        xCenter = np.array([kernelCandidate.getXCenter() for kernelCandidate in candidateList])
+        yCenter = np.array([kernelCandidate.getYCenter() for kernelCandidate in candidateList])
+        spatialImages = cls._computeKernelImages(spatialKernel, xCenter, yCenter)
+
+        localIndices = []
+        localDiList = []
+        localKernelValues = []
+        localImages = np.full(spatialImages.shape, np.nan)
+        hasLocalImage = np.zeros(len(candidateList), dtype=bool)
+        spatialDiList = []
+        for i, kernelCandidate in enumerate(candidateList):
+            # ORIG difference images for the original basis fit
             if kernelCandidate.getStatus() != afwMath.SpatialCellCandidate.UNKNOWN:
-                kType = getattr(diffimLib.KernelCandidateF, "ORIG")
-                di = kernelCandidate.getDifferenceImage(kType)
-                kernelValues = kernelCandidate.getKernel(kType).getKernelParameters()
-                kernelValues = np.asarray(kernelValues)
-
-                lkim = kernelCandidate.getKernelImage(kType)
-                centx, centy = calcCentroid(lkim.getArray())
-                stdx, stdy = calcWidth(lkim.getArray(), centx, centy)
-                # NOTE
-                # What is the difference between kernelValues and solution?
-
-                localResults = cls._calculateStats(di, dof=dof)
-
-                metrics = {"KCDiffimMean_LOCAL": localResults["mean"],
-                           "KCDiffimMedian_LOCAL": localResults["median"],
-                           "KCDiffimIQR_LOCAL": localResults["iqr"],
-                           "KCDiffimStDev_LOCAL": localResults["stdev"],
-                           "KCDiffimKSD_LOCAL": localResults["D"],
-                           "KCDiffimKSProb_LOCAL": localResults["prob"],
-                           "KCDiffimADA2_LOCAL": localResults["A2"],
-                           "KCDiffimADCrit_LOCAL": localResults["crit"],
-                           "KCDiffimADSig_LOCAL": localResults["sig"],
-                           "KCDiffimChiSq_LOCAL": localResults["rchisq"],
-                           "KCDiffimMseResids_LOCAL": localResults["mseResids"],
-                           "KCKernelCentX_LOCAL": centx,
-                           "KCKernelCentY_LOCAL": centy,
-                           "KCKernelStdX_LOCAL": stdx,
-                           "KCKernelStdY_LOCAL": stdy,
-                           "KernelCandidateId_LOCAL": kernelCandidate.getId(),
-                           "KernelCoeffValues_LOCAL": kernelValues}
-                for k in metrics:
-                    key = schema[k].asKey()
-                    setter = getattr(source, "set"+key.getTypeString())
-                    setter(key, metrics[k])
-            else:
-                try:
-                    kType = getattr(diffimLib.KernelCandidateF, "ORIG")
-                    lkim = kernelCandidate.getKernelImage(kType)
-                except Exception:
-                    lkim = None
-
-            # Calculate spatial model evaluated at each position, for
-            # all candidates
-            skim = afwImage.ImageD(spatialKernel.getDimensions())
-            spatialKernel.computeImage(skim, False, kernelCandidate.getXCenter(),
-                                       kernelCandidate.getYCenter())
-            centx, centy = calcCentroid(skim.getArray())
-            stdx, stdy = calcWidth(skim.getArray(), centx, centy)
-
-            sk = afwMath.FixedKernel(skim)
-            sbg = spatialBackground(kernelCandidate.getXCenter(), kernelCandidate.getYCenter())
-            di = kernelCandidate.getDifferenceImage(sk, sbg)
-            spatialResults = cls._calculateStats(di, dof=dof)
-
-            # Kernel mse
-            if lkim is not None:
-                skim -= lkim
-                bias = np.mean(skim.getArray())
-                variance = np.mean(np.power(skim.getArray(), 2.))
-                mseKernel = bias**2 + variance
-            else:
-                mseKernel = -99.999
-
-            metrics = {"KCDiffimMean_SPATIAL": spatialResults["mean"],
-                       "KCDiffimMedian_SPATIAL": spatialResults["median"],
-                       "KCDiffimIQR_SPATIAL": spatialResults["iqr"],
-                       "KCDiffimStDev_SPATIAL": spatialResults["stdev"],
-                       "KCDiffimKSD_SPATIAL": spatialResults["D"],
-                       "KCDiffimKSProb_SPATIAL": spatialResults["prob"],
-                       "KCDiffimADA2_SPATIAL": spatialResults["A2"],
-                       "KCDiffimADCrit_SPATIAL": spatialResults["crit"],
-                       "KCDiffimADSig_SPATIAL": spatialResults["sig"],
-                       "KCDiffimChiSq_SPATIAL": spatialResults["rchisq"],
-                       "KCDiffimMseResids_SPATIAL": spatialResults["mseResids"],
-                       "KCDiffimMseKernel_SPATIAL": mseKernel,
-                       "KCKernelCentX_SPATIAL": centx,
-                       "KCKernelCentY_SPATIAL": centy,
-                       "KCKernelStdX_SPATIAL": stdx,
-                       "KCKernelStdY_SPATIAL": stdy,
-                       "KernelCandidateId_SPATIAL": kernelCandidate.getId()}
-            for k in metrics:
-                key = schema[k].asKey()
-                setter = getattr(source, "set"+key.getTypeString())
-                setter(key, metrics[k])
+                localIndices.append(i)
+                localDiList.append(kernelCandidate.getDifferenceImage(kType))
+                localKernelValues.append(np.asarray(kernelCandidate.getKernel(kType).getKernelParameters()))
+            try:
+                localImages[i] = kernelCandidate.getKernelImage(kType).getArray()
+                hasLocalImage[i] = True
+            except Exception:
+                if kernelCandidate.getStatus() != afwMath.SpatialCellCandidate.UNKNOWN:
+                    raise
+
+            sk = afwMath.FixedKernel(afwImage.ImageD(spatialImages[i]))
+            sbg = spatialBackground(xCenter[i], yCenter[i])
+            spatialDiList.append(kernelCandidate.getDifferenceImage(sk, sbg))
+
+        sources = [kernelCandidate.getSource() for kernelCandidate in candidateList]
+        candidateIds = np.array([kernelCandidate.getId() for kernelCandidate in candidateList])
+
+        if localIndices:
+            localIndices = np.array(localIndices)
+            localResults = cls._calculateBatchStats(localDiList, dof=dof)
+            centx, centy, stdx, stdy = cls._calcMoments(localImages[localIndices])
+            # NOTE
+            # What is the difference between kernelValues and solution?
+            metrics = {"KCDiffimMean_LOCAL": localResults["mean"],
+                       "KCDiffimMedian_LOCAL": localResults["median"],
+                       "KCDiffimIQR_LOCAL": localResults["iqr"],
+                       "KCDiffimStDev_LOCAL": localResults["stdev"],
+                       "KCDiffimKSD_LOCAL": localResults["D"],
+                       "KCDiffimKSProb_LOCAL": localResults["prob"],
+                       "KCDiffimADA2_LOCAL": localResults["A2"],
+                       "KCDiffimADCrit_LOCAL": localResults["crit"],
+                       "KCDiffimADSig_LOCAL": localResults["sig"],
+                       "KCDiffimChiSq_LOCAL": localResults["rchisq"],
+                       "KCDiffimMseResids_LOCAL": localResults["mseResids"],
+                       "KCKernelCentX_LOCAL": centx,
+                       "KCKernelCentY_LOCAL": centy,
+                       "KCKernelStdX_LOCAL": stdx,
+                       "KCKernelStdY_LOCAL": stdy,
+                       "KernelCandidateId_LOCAL": candidateIds[localIndices],
+                       "KernelCoeffValues_LOCAL": np.array(localKernelValues)}
+            cls._setMetrics([sources[i] for i in localIndices], metrics, sourceCatalog)
+
+        spatialResults = cls._calculateBatchStats(spatialDiList, dof=dof)
+        centx, centy, stdx, stdy = cls._calcMoments(spatialImages)
+
+        # Kernel mse
+        kernelResids = spatialImages - localImages
+        bias = np.mean(kernelResids, axis=(1, 2))
+        variance = np.mean(kernelResids**2, axis=(1, 2))
+        mseKernel = np.where(hasLocalImage, bias**2 + variance, -99.999)
+
+        metrics = {"KCDiffimMean_SPATIAL": spatialResults["mean"],
+                   "KCDiffimMedian_SPATIAL": spatialResults["median"],
+                   "KCDiffimIQR_SPATIAL": spatialResults["iqr"],
+                   "KCDiffimStDev_SPATIAL": spatialResults["stdev"],
+                   "KCDiffimKSD_SPATIAL": spatialResults["D"],
+                   "KCDiffimKSProb_SPATIAL": spatialResults["prob"],
+                   "KCDiffimADA2_SPATIAL": spatialResults["A2"],
+                   "KCDiffimADCrit_SPATIAL": spatialResults["crit"],
+                   "KCDiffimADSig_SPATIAL": spatialResults["sig"],
+                   "KCDiffimChiSq_SPATIAL": spatialResults["rchisq"],
+                   "KCDiffimMseResids_SPATIAL": spatialResults["mseResids"],
+                   "KCDiffimMseKernel_SPATIAL": mseKernel,
+                   "KCKernelCentX_SPATIAL": centx,
+                   "KCKernelCentY_SPATIAL": centy,
+                   "KCKernelStdX_SPATIAL": stdx,
+                   "KCKernelStdY_SPATIAL": stdy,
+                   "KernelCandidateId_SPATIAL": candidateIds}
+        cls._setMetrics(sources, metrics, sourceCatalog)
 
     @staticmethod
     def aggregate(sourceCatalog, metadata, wcsresids, diaSources=None):
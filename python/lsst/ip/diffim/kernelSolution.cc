@@ -60,6 +60,7 @@ void declareKernelSolution(py::module &mod) {
     py::enum_<KernelSolution::ConditionNumberType>(cls, "ConditionNumberType")
             .value("EIGENVALUE", KernelSolution::ConditionNumberType::EIGENVALUE)
             .value("SVD", KernelSolution::ConditionNumberType::SVD)
+            .value("LDLT", KernelSolution::ConditionNumberType::LDLT)
             .export_values();
 
     cls.def("solve", (void (KernelSolution::*)()) & KernelSolution::solve);
@@ -104,6 +105,8 @@ void declareStaticKernelSolution(py::module &mod, std::string const &suffix) {
     cls.def("getBackground", &StaticKernelSolution<InputT>::getBackground);
     cls.def("getKsum", &StaticKernelSolution<InputT>::getKsum);
     cls.def("getSolutionPair", &StaticKernelSolution<InputT>::getSolutionPair);
+    cls.def("setNormalEquations", &StaticKernelSolution<InputT>::setNormalEquations, "mMat"_a, "bVec"_a);
+    cls.def("getWeightedScienceNorm", &StaticKernelSolution<InputT>::getWeightedScienceNorm);
 }
 
 /**
@@ -31,6 +31,7 @@ import lsst.pex.config as pexConfig
 import lsst.pipe.base as pipeBase
 from .makeKernelBasisList import makeKernelBasisList
 from .psfMatch import PsfMatchTask, PsfMatchConfigAL
+from .psfCache import CachedPsf
 from . import utils as dituils
 
 __all__ = ("ModelPsfMatchTask", "ModelPsfMatchConfig")
@@ -426,17 +427,22 @@ class ModelPsfMatchTask(PsfMatchTask):
             raise ValueError("Exposure dimensions=%s and sizeCell=(%s, %s). Insufficient area to match" %
                              (scienceBBox.getDimensions(), sizeCellX, sizeCellY))
 
+        # Evaluate each Psf once per cell; the cached kernel images are used both
+        # to survey the Psf dimensions and to populate the candidates.
+        cellCenters = [geom.Point2D(sizeCellX*col + sizeCellX//2 + scienceX0,
+                                    sizeCellY*row + sizeCellY//2 + scienceY0)
+                       for row in range(nCellY) for col in range(nCellX)]
+        sciencePsfCache = CachedPsf(sciencePsfModel)
+        sciencePsfCache.prefill(cellCenters)
+
         # Survey the PSF dimensions of the Spatial Cell Set
         # to identify the minimum enclosed or maximum bounding square BBox.
         widthList = []
         heightList = []
-        for row in range(nCellY):
-            posY = sizeCellY*row + sizeCellY//2 + scienceY0
-            for col in range(nCellX):
-                posX = sizeCellX*col + sizeCellX//2 + scienceX0
-                widthS, heightS = sciencePsfModel.computeBBox(geom.Point2D(posX, posY)).getDimensions()
-                widthList.append(widthS)
-                heightList.append(heightS)
+        for center in cellCenters:
+            widthS, heightS = sciencePsfCache.computeBBox(center).getDimensions()
+            widthList.append(widthS)
+            heightList.append(heightS)
 
         psfSize = max(max(heightList), max(widthList))
 
@@ -481,27 +487,21 @@ class ModelPsfMatchTask(PsfMatchTask):
                               referencePsfModel.__class__.__name__, dimenR, dimenS, e)
             dimenR = dimenS
 
-        ps = pexConfig.makePropertySet(self.kConfig)
-        for row in range(nCellY):
-            # place at center of cell
-            posY = sizeCellY*row + sizeCellY//2 + scienceY0
-
-            for col in range(nCellX):
-                # place at center of cell
-                posX = sizeCellX*col + sizeCellX//2 + scienceX0
-
-                log.log("TRACE4." + self.log.getName(), log.DEBUG,
-                        "Creating Psf candidate at %.1f %.1f", posX, posY)
+        referencePsfCache = CachedPsf(referencePsfModel)
+        referencePsfCache.prefill(cellCenters)
 
-                # reference kernel image, at location of science subimage
-                referenceMI = self._makePsfMaskedImage(referencePsfModel, posX, posY, dimensions=dimenR)
-
-                # kernel image we are going to convolve
-                scienceMI = self._makePsfMaskedImage(sciencePsfModel, posX, posY, dimensions=dimenR)
-
-                # The image to convolve is the science image, to the reference Psf.
-                kc = diffimLib.makeKernelCandidate(posX, posY, scienceMI, referenceMI, ps)
-                kernelCellSet.insertCandidate(kc)
+        ps = pexConfig.makePropertySet(self.kConfig)
+        xCenters = np.array([center.getX() for center in cellCenters], dtype=np.float32)
+        yCenters = np.array([center.getY() for center in cellCenters], dtype=np.float32)
+        # reference kernel images, at location of science subimages
+        referenceStamps = self._makePsfStamps(referencePsfCache, cellCenters, dimenR)
+        # kernel images we are going to convolve
+        scienceStamps = self._makePsfStamps(sciencePsfCache, cellCenters, dimenR)
+
+        # The image to convolve is the science image, to the reference Psf.
+        nCandidates = diffimLib.insertKernelCandidates(kernelCellSet, xCenters, yCenters,
+                                                       scienceStamps, referenceStamps, ps)
+        log.log("TRACE4." + self.log.getName(), log.DEBUG, "Created %d Psf candidates", nCandidates)
 
         import lsstDebug
         display = lsstDebug.Info(__name__).display
@@ -521,22 +521,33 @@ class ModelPsfMatchTask(PsfMatchTask):
                                referencePsfModel=referencePsfModel,
                                )
 
-    def _makePsfMaskedImage(self, psfModel, posX, posY, dimensions=None):
-        """Return a MaskedImage of the a PSF Model of specified dimensions
+    def _makePsfStamps(self, psfModel, positions, dimensions):
+        """Return a stack of kernel images of a Psf model, with common dimensions
+
+        Parameters
+        ----------
+        psfModel : `lsst.afw.detection.Psf` or `lsst.ip.diffim.CachedPsf`
+            The Psf model to evaluate.
+        positions : `list` of `lsst.geom.Point2D`
+            Positions at which to evaluate the Psf model.
+        dimensions : `lsst.geom.Extent2I`
+            Dimensions of the stamps. Kernel images of other dimensions are
+            zero padded or clipped about their centers.
+
+        Returns
+        -------
+        stamps : `numpy.ndarray`
+            Array of shape (len(positions), height, width) containing the
+            kernel images.
         """
-        rawKernel = psfModel.computeKernelImage(geom.Point2D(posX, posY)).convertF()
-        if dimensions is None:
-            dimensions = rawKernel.getDimensions()
-        if rawKernel.getDimensions() == dimensions:
-            kernelIm = rawKernel
-        else:
-            # make image of proper size
-            kernelIm = afwImage.ImageF(dimensions)
-            bboxToPlace = geom.Box2I(geom.Point2I((dimensions.getX() - rawKernel.getWidth())//2,
-                                                  (dimensions.getY() - rawKernel.getHeight())//2),
-                                     rawKernel.getDimensions())
-            kernelIm.assign(rawKernel, bboxToPlace)
-
-        kernelMask = afwImage.Mask(dimensions, 0x0)
-        kernelVar = afwImage.ImageF(dimensions, 1.0)
-        return afwImage.MaskedImageF(kernelIm, kernelMask, kernelVar)
+        width, height = dimensions
+        stamps = np.zeros((len(positions), height, width), dtype=np.float32)
+        for stamp, position in zip(stamps, positions):
+            rawKernel = psfModel.computeKernelImage(position).getArray()
+            rawHeight, rawWidth = rawKernel.shape
+            # Offsets of the raw kernel image within the stamp; negative if it must be clipped
+            x0 = (width - rawWidth)//2
+            y0 = (height - rawHeight)//2
+            stamp[max(y0, 0):y0 + rawHeight, max(x0, 0):x0 + rawWidth] = \
+                rawKernel[max(-y0, 0):height - y0, max(-x0, 0):width - x0]
+        return stamps
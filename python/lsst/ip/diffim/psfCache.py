@@ -0,0 +1,206 @@
+# This file is part of ip_diffim.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import lsst.afw.image as afwImage
+import lsst.geom as geom
+
+__all__ = ["CachedPsf"]
+
+
+class CachedPsf:
+    """Memoize evaluations of a PSF model on a grid of positions.
+
+    Parameters
+    ----------
+    psf : `lsst.afw.detection.Psf`
+        The PSF model to evaluate.
+    gridSpacing : `float`, optional
+        Spacing, in pixels, of the grid that positions are snapped to before
+        evaluating the kernel image, bounding box and shape of the PSF.
+        A spacing of zero disables the quantization, so that only identical
+        positions share an evaluation.
+
+    Notes
+    -----
+    Evaluating a `lsst.meas.algorithms.CoaddPsf` or a
+    `lsst.meas.algorithms.WarpedPsf` combines or warps the input PSFs on every
+    call, and the afw PSF classes only remember the most recent position, so
+    code that loops over the same set of positions more than once pays for
+    every evaluation again.
+    This class keeps every evaluation instead.
+
+    `computeKernelImage`, `computeBBox` and `computeShape` depend on the
+    position only through the spatial variation of the PSF, and are evaluated
+    at the nearest grid point.
+    `computeImage` also depends on the sub-pixel offset of the position, so it
+    is only shared between identical positions.
+    The bounding box is derived from a cached kernel image when one exists,
+    so filling the cache with `prefill` also answers the bounding box queries.
+
+    The returned images are copies, and may be modified by the caller.
+    """
+
+    def __init__(self, psf, gridSpacing=0.):
+        self.psf = psf
+        self.gridSpacing = gridSpacing
+        self._kernelImages = {}
+        self._images = {}
+        self._bboxes = {}
+        self._shapes = {}
+
+    def __len__(self):
+        return len(self._kernelImages) + len(self._images)
+
+    def getPsf(self):
+        """Return the PSF model being cached.
+        """
+        return self.psf
+
+    def getGridPosition(self, position):
+        """Return the grid point that a position is evaluated at.
+
+        Parameters
+        ----------
+        position : `lsst.geom.Point2D`
+            Position at which to evaluate the PSF.
+
+        Returns
+        -------
+        gridPosition : `lsst.geom.Point2D`
+            The nearest point of the evaluation grid.
+        """
+        if self.gridSpacing <= 0:
+            return geom.Point2D(position)
+        return geom.Point2D(round(position.getX()/self.gridSpacing)*self.gridSpacing,
+                            round(position.getY()/self.gridSpacing)*self.gridSpacing)
+
+    def computeKernelImage(self, position):
+        """Return the kernel image of the PSF at the nearest grid point.
+
+        Parameters
+        ----------
+        position : `lsst.geom.Point2D`
+            Position at which to evaluate the PSF.
+
+        Returns
+        -------
+        image : `lsst.afw.image.ImageD`
+            A copy of the cached kernel image, centered on (0, 0).
+        """
+        key = self._getKey(self.getGridPosition(position))
+        image = self._getOrCompute(self._kernelImages, key,
+                                   lambda: self.psf.computeKernelImage(geom.Point2D(*key)))
+        return afwImage.ImageD(image, True)
+
+    def computeImage(self, position):
+        """Return the image of the PSF at a position.
+
+        Parameters
+        ----------
+        position : `lsst.geom.Point2D`
+            Position at which to evaluate the PSF.
+
+        Returns
+        -------
+        image : `lsst.afw.image.ImageD`
+            A copy of the cached image, centered on ``position``.
+        """
+        key = self._getKey(position)
+        image = self._getOrCompute(self._images, key,
+                                   lambda: self.psf.computeImage(geom.Point2D(*key)))
+        return afwImage.ImageD(image, True)
+
+    def computeBBox(self, position):
+        """Return the bounding box of the kernel image at the nearest grid point.
+
+        Parameters
+        ----------
+        position : `lsst.geom.Point2D`
+            Position at which to evaluate the PSF.
+
+        Returns
+        -------
+        bbox : `lsst.geom.Box2I`
+            Bounding box of the kernel image.
+        """
+        key = self._getKey(self.getGridPosition(position))
+        image = self._kernelImages.get(key)
+        if image is not None:
+            return image.getBBox()
+        return geom.Box2I(self._getOrCompute(self._bboxes, key,
+                                             lambda: self.psf.computeBBox(geom.Point2D(*key))))
+
+    def computeShape(self, position=None):
+        """Return the shape of the PSF at the nearest grid point.
+
+        Parameters
+        ----------
+        position : `lsst.geom.Point2D`, optional
+            Position at which to evaluate the PSF.
+            Defaults to the average position of the PSF.
+
+        Returns
+        -------
+        shape : `lsst.afw.geom.ellipses.Quadrupole`
+            Second moments of the PSF.
+        """
+        if position is None:
+            position = self.psf.getAveragePosition()
+        key = self._getKey(self.getGridPosition(position))
+        return self._getOrCompute(self._shapes, key, lambda: self.psf.computeShape(geom.Point2D(*key)))
+
+    def prefill(self, positions, doImage=False):
+        """Evaluate the kernel images of the PSF at many positions.
+
+        Parameters
+        ----------
+        positions : iterable of `lsst.geom.Point2D`
+            Positions at which to evaluate the PSF.
+        doImage : `bool`, optional
+            Also evaluate the images centered on each position?
+        """
+        for position in positions:
+            key = self._getKey(self.getGridPosition(position))
+            self._getOrCompute(self._kernelImages, key,
+                               lambda: self.psf.computeKernelImage(geom.Point2D(*key)))
+            if doImage:
+                key = self._getKey(position)
+                self._getOrCompute(self._images, key, lambda: self.psf.computeImage(geom.Point2D(*key)))
+
+    def clear(self):
+        """Remove all evaluations from the cache.
+        """
+        self._kernelImages.clear()
+        self._images.clear()
+        self._bboxes.clear()
+        self._shapes.clear()
+
+    @staticmethod
+    def _getKey(position):
+        return (float(position.getX()), float(position.getY()))
+
+    @staticmethod
+    def _getOrCompute(cache, key, compute):
+        result = cache.get(key)
+        if result is None:
+            result = compute()
+            cache[key] = result
+        return result
@@ -19,13 +19,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-__all__ = ["DetectionConfig", "PsfMatchConfig", "PsfMatchConfigAL", "PsfMatchConfigDF", "PsfMatchTask"]
+__all__ = ["DetectionConfig", "PsfMatchConfig", "PsfMatchConfigAL", "PsfMatchConfigDF", "PsfMatchSolution",
+           "PsfMatchTask"]
 
+import functools
 import time
 
 import numpy as np
 
 import lsst.afw.image as afwImage
+import lsst.daf.base as dafBase
 import lsst.pex.config as pexConfig
 import lsst.afw.math as afwMath
 import lsst.afw.display as afwDisplay
@@ -251,6 +254,13 @@ class PsfMatchConfig(pexConfig.Config):
         default=5,
         check=lambda x: x >= 3
     )
+    useTruncatedPca = pexConfig.Field(
+        dtype=bool,
+        doc="""Compute only the numPrincipalComponents leading components of the Pca,
+                 with a randomized decomposition, rather than all of them.
+                 Faster for many candidates or large kernels.""",
+        default=False,
+    )
     singleKernelClipping = pexConfig.Field(
         dtype=bool,
         doc="Do sigma clipping on each raw kernel candidate",
@@ -312,6 +322,14 @@ class PsfMatchConfig(pexConfig.Config):
         default=3,
         check=lambda x: x >= 1
     )
+    kernelImageGridSize = pexConfig.Field(
+        dtype=int,
+        doc="""Number of cells per side of a grid covering the kernel cell set, at whose centers the
+                 final spatial kernel and background are evaluated and kept with the solution, in
+                 addition to the candidate positions.  Set to 0 to only keep the candidate positions.""",
+        default=0,
+        check=lambda x: x >= 0
+    )
     maxKsumSigma = pexConfig.Field(
         dtype=float,
         doc="""Maximum allowed sigma for outliers from kernel sum distribution.
@@ -327,11 +345,13 @@ class PsfMatchConfig(pexConfig.Config):
     )
     conditionNumberType = pexConfig.ChoiceField(
         dtype=str,
-        doc="Use singular values (SVD) or eigen values (EIGENVALUE) to determine condition number",
+        doc="""Use singular values (SVD), eigen values (EIGENVALUE) or an estimate from the
+                 factorization used to solve (LDLT) to determine condition number""",
         default="EIGENVALUE",
         allowed={
             "SVD": "Use singular values",
             "EIGENVALUE": "Use eigen values (faster)",
+            "LDLT": "Use the 1-norm estimate from the LDLt factorization that the solution reuses (fastest)",
         }
     )
     maxSpatialConditionNumber = pexConfig.Field(
@@ -522,6 +542,139 @@ class PsfMatchConfigDF(PsfMatchConfig):
                  step in these increments.  If lambdaStepType = log:linear, suggest 0.1:0.1""",
         default=0.1,
     )
+    lambdaRefine = pexConfig.Field(
+        dtype=bool,
+        doc="""If scan through lambda needed (minimizeBiasedRisk, minimizeUnbiasedRisk),
+                 refine the best lambda of the scan by minimizing the risk between its neighbouring steps""",
+        default=False,
+    )
+
+
+class PsfMatchSolution:
+    """A Psf-matching solution that can seed the solve for a similar pair of images.
+
+    Parameters
+    ----------
+    basisList : `list` of `lsst.afw.math.Kernel` or `None`
+        The basis used to fit the single kernels of the candidates;
+        `None` if unknown, in which case a new basis is made for each match.
+    spatialBasisList : `list` of `lsst.afw.math.Kernel`
+        The basis of the spatial model; the principal components of the
+        single kernels if a Pca was used, else ``basisList``.
+    psfMatchingKernel : `lsst.afw.math.LinearCombinationKernel`
+        Spatially varying Psf-matching kernel.
+    backgroundModel : `lsst.afw.math.Function2D`
+        Spatially varying background-matching function.
+    isPcaBasis : `bool`
+        Is ``spatialBasisList`` a Pca basis?
+    candidateList : `list`, optional
+        The footprints/maskedImages used as kernel candidates.
+    bbox : `lsst.geom.Box2I`, optional
+        Bounding box of the images the solution was computed on; the
+        candidates are only reused for images with the same bounding box.
+    kernelImageCache : `lsst.ip.diffim.SpatialKernelImageCache`, optional
+        Evaluations of ``psfMatchingKernel`` and ``backgroundModel`` at the
+        candidate positions, shared with the consumers of the solution.
+
+    Notes
+    -----
+    Images that are taken very closely in time through the same optics,
+    such as the snaps of a visit, have nearly identical matching kernels.
+    Handing the solution of one pair to the solve of the next lets the
+    next solve skip source detection and the Pca, and only refit the
+    coefficients of the spatial model on the already-known basis.
+    """
+
+    def __init__(self, basisList, spatialBasisList, psfMatchingKernel, backgroundModel,
+                 isPcaBasis=False, candidateList=None, bbox=None, kernelImageCache=None):
+        self.basisList = basisList
+        self.spatialBasisList = spatialBasisList
+        self.psfMatchingKernel = psfMatchingKernel
+        self.backgroundModel = backgroundModel
+        self.isPcaBasis = isPcaBasis
+        self.candidateList = candidateList
+        self.bbox = bbox
+        self.kernelImageCache = kernelImageCache
+
+    @classmethod
+    def fromKernel(cls, psfMatchingKernel, backgroundModel, isPcaBasis=False):
+        """Make a solution from the kernel and background of a previous match.
+
+        Parameters
+        ----------
+        psfMatchingKernel : `lsst.afw.math.LinearCombinationKernel`
+            Spatially varying Psf-matching kernel, e.g. from the previous visit
+            of the same field and detector.
+        backgroundModel : `lsst.afw.math.Function2D`
+            Spatially varying background-matching function.
+        isPcaBasis : `bool`, optional
+            Is the basis of ``psfMatchingKernel`` a Pca basis?  If so it is not
+            regularized when reused.
+
+        Returns
+        -------
+        solution : `lsst.ip.diffim.PsfMatchSolution`
+            A solution without candidates, whose spatial basis is the basis
+            of ``psfMatchingKernel``.
+        """
+        return cls(None, psfMatchingKernel.getKernelList(), psfMatchingKernel, backgroundModel,
+                   isPcaBasis=isPcaBasis)
+
+    def getCandidateList(self, bbox):
+        """Return the candidates, if they may be reused for images with a given bounding box.
+
+        Parameters
+        ----------
+        bbox : `lsst.geom.Box2I`
+            Bounding box of the images to be matched.
+
+        Returns
+        -------
+        candidateList : `list` or `None`
+            The candidates of this solution, or `None` if there are none or
+            they were selected on images with a different bounding box.
+        """
+        if self.candidateList is None or self.bbox is None or self.bbox != bbox:
+            return None
+        return self.candidateList
+
+
+@functools.lru_cache(maxsize=8)
+def _makeRegularizationMatrix(kernelSize, regularizationType, centralRegularizationStencil,
+                              forwardRegularizationOrders, regularizationBorderPenalty, fitForBackground):
+    """Build a regularization matrix, once per process for each set of parameters.
+
+    Parameters
+    ----------
+    kernelSize : `int`
+        Number of rows/columns in the convolution kernel.
+    regularizationType : `str`
+        Type of finite difference, "centralDifference" or "forwardDifference".
+    centralRegularizationStencil : `int`
+        Number of points in the central difference stencil.
+    forwardRegularizationOrders : `tuple` of `int`
+        Orders of the forward differences.
+    regularizationBorderPenalty : `float`
+        Penalty on the border pixels of the kernel.
+    fitForBackground : `bool`
+        Is a background term fit along with the kernel?
+
+    Returns
+    -------
+    hMat : `numpy.ndarray`
+        The regularization matrix, shared between all callers and so not
+        writeable.
+    """
+    ps = dafBase.PropertySet()
+    ps.set("kernelSize", kernelSize)
+    ps.set("regularizationType", regularizationType)
+    ps.set("centralRegularizationStencil", centralRegularizationStencil)
+    ps.set("forwardRegularizationOrders", list(forwardRegularizationOrders))
+    ps.set("regularizationBorderPenalty", regularizationBorderPenalty)
+    ps.set("fitForBackground", fitForBackground)
+    hMat = diffimLib.makeRegularizationMatrix(ps)
+    hMat.flags.writeable = False
+    return hMat
 
 
 class PsfMatchTask(pipeBase.Task):
@@ -648,10 +801,12 @@ class PsfMatchTask(pipeBase.Task):
         self.config.kernel.active.  If the kernel is requested with regularization to moderate
         the bias/variance tradeoff, currently only used when a delta function kernel basis
         is provided, it creates a regularization matrix stored as member variable
-        self.hMat.
+        self.hMat.  The matrix only depends on a few kernel parameters and is
+        built once per process for each set of them, and shared between tasks.
         """
         pipeBase.Task.__init__(self, *args, **kwargs)
         self.kConfig = self.config.kernel.active
+        self.kernelImageCache = None
 
         if 'useRegularization' in self.kConfig:
             self.useRegularization = self.kConfig.useRegularization
@@ -659,9 +814,14 @@ class PsfMatchTask(pipeBase.Task):
             self.useRegularization = False
 
         if self.useRegularization:
-            self.hMat = diffimLib.makeRegularizationMatrix(pexConfig.makePropertySet(self.kConfig))
-
-    def _diagnostic(self, kernelCellSet, spatialSolution, spatialKernel, spatialBg):
+            self.hMat = _makeRegularizationMatrix(self.kConfig.kernelSize,
+                                                  self.kConfig.regularizationType,
+                                                  self.kConfig.centralRegularizationStencil,
+                                                  tuple(self.kConfig.forwardRegularizationOrders),
+                                                  self.kConfig.regularizationBorderPenalty,
+                                                  self.kConfig.fitForBackground)
+
+    def _diagnostic(self, kernelCellSet, spatialSolution, spatialKernel, spatialBg, kernelImageCache=None):
         """Provide logging diagnostics on quality of spatial kernel fit
 
         Parameters
@@ -674,10 +834,15 @@ class PsfMatchTask(pipeBase.Task):
             Best-fit spatial Kernel model
         spatialBg : `lsst.afw.math.Function2D`
             Best-fit spatial background model
+        kernelImageCache : `lsst.ip.diffim.SpatialKernelImageCache`, optional
+            Evaluations of ``spatialKernel`` to reuse.
         """
         # What is the final kernel sum
-        kImage = afwImage.ImageD(spatialKernel.getDimensions())
-        kSum = spatialKernel.computeImage(kImage, False)
+        if kernelImageCache is not None:
+            kSum = kernelImageCache.getKernelSum(0., 0.)
+        else:
+            kImage = afwImage.ImageD(spatialKernel.getDimensions())
+            kSum = spatialKernel.computeImage(kImage, False)
         self.log.info("Final spatial kernel sum %.3f" % (kSum))
 
         # Look at how well conditioned the matrix is
@@ -833,7 +998,10 @@ class PsfMatchTask(pipeBase.Task):
             If the Eigenvalues sum to zero.
         """
         nComponents = self.kConfig.numPrincipalComponents
-        imagePca = diffimLib.KernelPcaD()
+        if self.kConfig.useTruncatedPca:
+            imagePca = diffimLib.KernelPcaD(nComponents=nComponents)
+        else:
+            imagePca = diffimLib.KernelPcaD()
         importStarVisitor = diffimLib.KernelPcaVisitorF(imagePca)
         kernelCellSet.visitCandidates(importStarVisitor, nStarPerCell)
         if self.kConfig.subtractMeanForPca:
@@ -871,13 +1039,65 @@ class PsfMatchTask(pipeBase.Task):
 
         return nRejectedPca, spatialBasisList
 
+    def _screenCandidates(self, kernelCellSet, initialSolution, nStarPerCell, ps):
+        """Reject candidates that are poorly subtracted by a previous solution
+
+        Parameters
+        ----------
+        kernelCellSet : `lsst.afw.math.SpatialCellSet`
+            a SpatialCellSet containing KernelCandidates whose kernels have not yet been built
+        initialSolution : `lsst.ip.diffim.PsfMatchSolution`
+            a solution for a similar pair of images
+        nStarPerCell : `int`
+            the number of stars per cell to visit
+        ps : `lsst.daf.base.PropertySet`
+            input property set controlling the spatial kernel assessment
+
+        Returns
+        -------
+        nRejected : `int`
+            number of KernelCandidates rejected
+
+        Notes
+        -----
+        The previous spatial kernel and background are evaluated at each
+        candidate, and the residuals are clipped as in the spatial fit, so that
+        outliers are rejected before their single kernels are built.  If no
+        candidate survives, the previous solution is assumed not to apply, and
+        all candidates are restored.
+        """
+        kernelImageCache = initialSolution.kernelImageCache
+        if kernelImageCache is None:
+            kernelImageCache = diffimLib.SpatialKernelImageCache(initialSolution.psfMatchingKernel,
+                                                                 initialSolution.backgroundModel)
+        assesskv = diffimLib.AssessSpatialKernelVisitorF(kernelImageCache, ps)
+        assesskv.setAssessUninitialized(True)
+        nRejected = 0
+        while True:
+            assesskv.reset()
+            kernelCellSet.visitCandidates(assesskv, nStarPerCell)
+            nRejected += assesskv.getNRejected()
+            if assesskv.getNRejected() == 0:
+                break
+
+        if assesskv.getNGood() == 0:
+            self.log.warn("No candidates are well subtracted by the initial solution; ignoring it")
+            for cell in kernelCellSet.getCellList():
+                for cand in cell.begin(False):
+                    cand.setStatus(afwMath.SpatialCellCandidate.UNKNOWN)
+            return 0
+
+        log.log("TRACE1." + self.log.getName() + "._solve", log.DEBUG,
+                "Rejected %d candidates using the initial solution", nRejected)
+        return nRejected
+
     def _buildCellSet(self, *args):
         """Fill a SpatialCellSet with KernelCandidates for the Psf-matching process;
         override in derived classes"""
         return
 
     @pipeBase.timeMethod
-    def _solve(self, kernelCellSet, basisList, returnOnExcept=False):
+    def _solve(self, kernelCellSet, basisList, returnOnExcept=False, initialSolution=None):
         """Solve for the PSF matching kernel
 
         Parameters
@@ -890,6 +1110,12 @@ class PsfMatchTask(pipeBase.Task):
             (typically as provided by makeKernelBasisList)
         returnOnExcept : `bool`, optional
             if True then return (None, None) if an error occurs, else raise the exception
+        initialSolution : `lsst.ip.diffim.PsfMatchSolution`, optional
+            A solution for a similar pair of images.  If provided, candidates that it
+            subtracts poorly are rejected before any kernels are built.  If its spatial
+            basis has the dimensions of ``basisList``, the single kernels are also fit
+            directly on that basis and no Pca is run, so that only the coefficients of
+            the spatial model are refit.
 
         Returns
         -------
@@ -902,6 +1128,12 @@ class PsfMatchTask(pipeBase.Task):
         ------
         RuntimeError :
             If unable to determine PSF matching kernel and ``returnOnExcept==False``.
+
+        Notes
+        -----
+        The evaluations of the final spatial kernel and background at the
+        candidate positions, and on the grid set by ``kernelImageGridSize``,
+        are kept as ``self.kernelImageCache`` for the consumers of the solution.
         """
 
         import lsstDebug
@@ -910,10 +1142,21 @@ class PsfMatchTask(pipeBase.Task):
         maxSpatialIterations = self.kConfig.maxSpatialIterations
         nStarPerCell = self.kConfig.nStarPerCell
         usePcaForSpatialKernel = self.kConfig.usePcaForSpatialKernel
-
+        useRegularization = self.useRegularization
         # Visitor for the single kernel fit
         ps = pexConfig.makePropertySet(self.kConfig)
-        if self.useRegularization:
+
+        if initialSolution is not None:
+            self._screenCandidates(kernelCellSet, initialSolution, nStarPerCell, ps)
+            spatialBasisList = initialSolution.spatialBasisList
+            if spatialBasisList[0].getDimensions() == basisList[0].getDimensions():
+                log.log("TRACE0." + self.log.getName() + "._solve", log.DEBUG,
+                        "Refitting the spatial model of a previous solution")
+                basisList = spatialBasisList
+                usePcaForSpatialKernel = False
+                # The regularization matrix is only defined for the original basis
+                useRegularization = useRegularization and not initialSolution.isPcaBasis
+        if useRegularization:
             singlekv = diffimLib.BuildSingleKernelVisitorF(basisList, ps, self.hMat)
         else:
             singlekv = diffimLib.BuildSingleKernelVisitorF(basisList, ps)
@@ -996,7 +1239,8 @@ class PsfMatchTask(pipeBase.Task):
                 spatialKernel, spatialBackground = spatialkv.getSolutionPair()
 
                 # Check the quality of the spatial fit (look at residuals)
-                assesskv = diffimLib.AssessSpatialKernelVisitorF(spatialKernel, spatialBackground, ps)
+                kernelImageCache = diffimLib.SpatialKernelImageCache(spatialKernel, spatialBackground)
+                assesskv = diffimLib.AssessSpatialKernelVisitorF(kernelImageCache, ps)
                 kernelCellSet.visitCandidates(assesskv, nStarPerCell)
                 nRejectedSpatial = assesskv.getNRejected()
                 nGoodSpatial = assesskv.getNGood()
@@ -1029,6 +1273,7 @@ class PsfMatchTask(pipeBase.Task):
                 log.log("TRACE2." + self.log.getName() + "._solve", log.DEBUG,
                         "Spatial kernel built with %d candidates", spatialkv.getNCandidates())
                 spatialKernel, spatialBackground = spatialkv.getSolutionPair()
+                kernelImageCache = diffimLib.SpatialKernelImageCache(spatialKernel, spatialBackground)
 
             spatialSolution = spatialkv.getKernelSolution()
 
@@ -1045,7 +1290,13 @@ class PsfMatchTask(pipeBase.Task):
         if display:
             self._displayDebug(kernelCellSet, spatialKernel, spatialBackground)
 
-        self._diagnostic(kernelCellSet, spatialSolution, spatialKernel, spatialBackground)
+        if self.kConfig.kernelImageGridSize > 0:
+            kernelImageCache.fillGrid(kernelCellSet.getBBox(), self.kConfig.kernelImageGridSize,
+                                      self.kConfig.kernelImageGridSize)
+        self.kernelImageCache = kernelImageCache
+
+        self._diagnostic(kernelCellSet, spatialSolution, spatialKernel, spatialBackground,
+                         kernelImageCache=kernelImageCache)
 
         return spatialSolution, spatialKernel, spatialBackground
 
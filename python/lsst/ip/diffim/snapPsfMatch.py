@@ -68,6 +68,13 @@ class SnapPsfMatchConfig(ImagePsfMatchConfig):
         doc="Warp the snaps?",
         default=False
     )
+    doReuseSolution = pexConfig.Field(
+        dtype=bool,
+        doc="Seed each subtraction with the Psf-matching solution of the previous one, "
+            "reusing its kernel basis and, for images of the same bounding box, its candidates, "
+            "unless an initialSolution is passed explicitly?",
+        default=False
+    )
 
     def setDefaults(self):
         ImagePsfMatchConfig.setDefaults(self)
@@ -298,15 +305,48 @@ class SnapPsfMatchTask(ImagePsfMatchTask):
 
     ConfigClass = SnapPsfMatchConfig
 
+    def __init__(self, *args, **kwargs):
+        ImagePsfMatchTask.__init__(self, *args, **kwargs)
+        self.solution = None
+
     # Override ImagePsfMatchTask.subtractExposures to set doWarping on config.doWarping
     def subtractExposures(self, templateExposure, scienceExposure,
                           templateFwhmPix=None, scienceFwhmPix=None,
-                          candidateList=None):
-        return ImagePsfMatchTask.subtractExposures(self,
-                                                   templateExposure=templateExposure,
-                                                   scienceExposure=scienceExposure,
-                                                   templateFwhmPix=templateFwhmPix,
-                                                   scienceFwhmPix=scienceFwhmPix,
-                                                   candidateList=candidateList,
-                                                   doWarping=self.config.doWarping,
-                                                   )
+                          candidateList=None, initialSolution=None):
+        """Psf-match and subtract two snaps.
+
+        Parameters
+        ----------
+        templateExposure : `lsst.afw.image.Exposure`
+            Snap to PSF-match to ``scienceExposure``
+        scienceExposure : `lsst.afw.image.Exposure`
+            Reference snap
+        templateFwhmPix : `float`, optional
+            FWHM (in pixels) of the Psf in the template image (image to convolve)
+        scienceFwhmPix : `float`, optional
+            FWHM (in pixels) of the Psf in the science image
+        candidateList : `list`, optional
+            A list of footprints/maskedImages for kernel candidates;
+            if `None` then source detection is run.
+        initialSolution : `lsst.ip.diffim.PsfMatchSolution`, optional
+            Solution of a previous snap pair to refine.  If `None` and
+            ``config.doReuseSolution`` is set, the solution of the previous call is used.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct`
+            As for `lsst.ip.diffim.ImagePsfMatchTask.subtractExposures`.
+        """
+        if initialSolution is None and self.config.doReuseSolution:
+            initialSolution = self.solution
+        results = ImagePsfMatchTask.subtractExposures(self,
+                                                      templateExposure=templateExposure,
+                                                      scienceExposure=scienceExposure,
+                                                      templateFwhmPix=templateFwhmPix,
+                                                      scienceFwhmPix=scienceFwhmPix,
+                                                      candidateList=candidateList,
+                                                      doWarping=self.config.doWarping,
+                                                      initialSolution=initialSolution,
+                                                      )
+        self.solution = results.solution
+        return results
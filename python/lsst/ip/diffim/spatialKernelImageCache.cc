@@ -0,0 +1,62 @@
+/*
+ * LSST Data Management System
+ *
+ * This product includes software developed by the
+ * LSST Project (http://www.lsst.org/).
+ * See the COPYRIGHT file
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the LSST License Statement and
+ * the GNU General Public License along with this program.  If not,
+ * see <https://www.lsstcorp.org/LegalNotices/>.
+ */
+#include "pybind11/pybind11.h"
+#include "pybind11/stl.h"
+
+#include <memory>
+
+#include "lsst/ip/diffim/SpatialKernelImageCache.h"
+
+namespace py = pybind11;
+using namespace pybind11::literals;
+
+namespace lsst {
+namespace ip {
+namespace diffim {
+
+PYBIND11_MODULE(spatialKernelImageCache, mod) {
+    py::module::import("lsst.geom");
+    py::module::import("lsst.afw.image");
+    py::module::import("lsst.afw.math");
+
+    py::class_<SpatialKernelImageCache, std::shared_ptr<SpatialKernelImageCache>> cls(
+            mod, "SpatialKernelImageCache");
+
+    cls.def(py::init<std::shared_ptr<afw::math::LinearCombinationKernel>,
+                     afw::math::Kernel::SpatialFunctionPtr>(),
+            "spatialKernel"_a, "spatialBackground"_a);
+
+    cls.def("getKernel", &SpatialKernelImageCache::getKernel, "x"_a, "y"_a);
+    cls.def("getKernelImage", &SpatialKernelImageCache::getKernelImage, "x"_a, "y"_a);
+    cls.def("getKernelSum", &SpatialKernelImageCache::getKernelSum, "x"_a, "y"_a);
+    cls.def("getBackground", &SpatialKernelImageCache::getBackground, "x"_a, "y"_a);
+    cls.def("fillGrid", &SpatialKernelImageCache::fillGrid, "bbox"_a, "nx"_a, "ny"_a);
+    cls.def("clear", &SpatialKernelImageCache::clear);
+    cls.def("size", &SpatialKernelImageCache::size);
+    cls.def("__len__", &SpatialKernelImageCache::size);
+    cls.def("getSpatialKernel", &SpatialKernelImageCache::getSpatialKernel);
+    cls.def("getSpatialBackground", &SpatialKernelImageCache::getSpatialBackground);
+}
+
+}  // diffim
+}  // ip
+}  // lsst
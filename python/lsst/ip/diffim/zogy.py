@@ -24,7 +24,6 @@ import numpy as np
 
 import lsst.geom as geom
 import lsst.afw.image as afwImage
-import lsst.afw.geom as afwGeom
 import lsst.meas.algorithms as measAlg
 import lsst.afw.math as afwMath
 import lsst.pex.config as pexConfig
@@ -1109,7 +1108,9 @@ class ZogyImagePsfMatchTask(ImagePsfMatchTask):
         ----------
         templateExposure : `lsst.afw.image.Exposure`
             exposure to PSF-match to scienceExposure. The exposure's mean value is subtracted
-            in-place.
+            in-place if its WCS already matches that of scienceExposure. If it is warped, the
+            mean is subtracted from the warped copy instead, and ``templateExposure`` itself is
+            not modified; use the returned ``warpedExposure`` for the mean-subtracted template.
         scienceExposure : `lsst.afw.image.Exposure`
             reference Exposure. The exposure's mean value is subtracted in-place.
         doWarping : `bool`
@@ -1135,9 +1136,6 @@ class ZogyImagePsfMatchTask(ImagePsfMatchTask):
         mn1 = self._computeImageMean(templateExposure)
         mn2 = self._computeImageMean(scienceExposure)
         self.log.info("Exposure means=%f, %f; median=%f, %f:" % (mn1[0], mn2[0], mn1[1], mn2[1]))
-        if not np.isnan(mn1[0]) and np.abs(mn1[0]) > 1:
-            mi = templateExposure.getMaskedImage()
-            mi -= mn1[0]
         if not np.isnan(mn2[0]) and np.abs(mn2[0]) > 1:
             mi = scienceExposure.getMaskedImage()
             mi -= mn2[0]
@@ -1146,20 +1144,17 @@ class ZogyImagePsfMatchTask(ImagePsfMatchTask):
 
         if not self._validateWcs(templateExposure, scienceExposure):
             if doWarping:
-                self.log.info("Astrometrically registering template to science image")
-                # Also warp the PSF
-                xyTransform = afwGeom.makeWcsPairTransform(templateExposure.getWcs(),
-                                                           scienceExposure.getWcs())
-                psfWarped = measAlg.WarpedPsf(templateExposure.getPsf(), xyTransform)
-                templateExposure = self._warper.warpExposure(scienceExposure.getWcs(),
-                                                             templateExposure,
-                                                             destBBox=scienceExposure.getBBox())
-
-                templateExposure.setPsf(psfWarped)
+                templateExposure = self._warpTemplate(templateExposure, scienceExposure)
             else:
                 self.log.error("ERROR: Input images not registered")
                 raise RuntimeError("Input images not registered")
 
+        # Subtract the template mean after warping, so that a warped template
+        # shared with other subtractions is not affected.
+        if not np.isnan(mn1[0]) and np.abs(mn1[0]) > 1:
+            mi = templateExposure.getMaskedImage()
+            mi -= mn1[0]
+
         def gm(exp):
             return exp.getMaskedImage().getMask()
 
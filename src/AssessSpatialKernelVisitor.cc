@@ -49,6 +49,11 @@ namespace detail {
      * each candidate, and computes the resulting difference image.  Sets candidate
      * as afwMath::SpatialCellCandidate::GOOD/BAD if requested by the PropertySet configuration.
      *
+     * @note The evaluations are kept in a SpatialKernelImageCache, so that visiting the
+     * candidates again with the same solution does not evaluate the spatial kernel again.
+     * A cache shared with the other consumers of the solution may be given instead of
+     * the solution itself.
+     *
      */
     template<typename PixelT>
     AssessSpatialKernelVisitor<PixelT>::AssessSpatialKernelVisitor(
@@ -57,17 +62,38 @@ namespace detail {
         lsst::daf::base::PropertySet const& ps                        ///< ps file directing behavior
         ) :
         afwMath::CandidateVisitor(),
-        _spatialKernel(spatialKernel),
-        _spatialBackground(spatialBackground),
+        _kernelImageCache(std::make_shared<SpatialKernelImageCache>(spatialKernel, spatialBackground)),
         _ps(ps.deepCopy()),
         _imstats(ImageStatistics<PixelT>(ps)),
         _nGood(0),
         _nRejected(0),
         _nProcessed(0),
         _useCoreStats(ps.getAsBool("useCoreStats")),
-        _coreRadius(ps.getAsInt("candidateCoreRadius"))
+        _coreRadius(ps.getAsInt("candidateCoreRadius")),
+        _assessUninitialized(false)
     {};
 
+    template<typename PixelT>
+    AssessSpatialKernelVisitor<PixelT>::AssessSpatialKernelVisitor(
+        std::shared_ptr<SpatialKernelImageCache> kernelImageCache, ///< Evaluations of the spatial solution
+        lsst::daf::base::PropertySet const& ps                    ///< ps file directing behavior
+        ) :
+        afwMath::CandidateVisitor(),
+        _kernelImageCache(kernelImageCache),
+        _ps(ps.deepCopy()),
+        _imstats(ImageStatistics<PixelT>(ps)),
+        _nGood(0),
+        _nRejected(0),
+        _nProcessed(0),
+        _useCoreStats(ps.getAsBool("useCoreStats")),
+        _coreRadius(ps.getAsInt("candidateCoreRadius")),
+        _assessUninitialized(false)
+    {
+        if (!_kernelImageCache) {
+            throw LSST_EXCEPT(pexExcept::InvalidParameterError, "No kernel image cache");
+        }
+    };
+
     template<typename PixelT>
     void AssessSpatialKernelVisitor<PixelT>::processCandidate(
         lsst::afw::math::SpatialCellCandidate *candidate
@@ -78,7 +104,7 @@ namespace detail {
             throw LSST_EXCEPT(pexExcept::LogicError,
                               "Failed to cast SpatialCellCandidate to KernelCandidate");
         }
-        if (!(kCandidate->isInitialized())) {
+        if (!(kCandidate->isInitialized()) && !(_assessUninitialized)) {
             kCandidate->setStatus(afwMath::SpatialCellCandidate::BAD);
             LOGL_DEBUG("TRACE2.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                        "Cannot process candidate %d, continuing", kCandidate->getId());
@@ -88,24 +114,19 @@ namespace detail {
         LOGL_DEBUG("TRACE1.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                    "Processing candidate %d", kCandidate->getId());
 
-        /*
-           Note - this is a hack until the Kernel API is upgraded by the
-           Davis crew.  I need a "local" version of the spatially varying
-           Kernel
-        */
-        afwImage::Image<double> kImage(_spatialKernel->getDimensions());
-        double kSum = _spatialKernel->computeImage(kImage, false,
-                                                   kCandidate->getXCenter(), kCandidate->getYCenter());
-        std::shared_ptr<afwMath::Kernel>
-            kernelPtr(new afwMath::FixedKernel(kImage));
-        /* </hack> */
-
-        double background = (*_spatialBackground)(kCandidate->getXCenter(), kCandidate->getYCenter());
+        /* The "local" version of the spatially varying Kernel */
+        double xCenter = kCandidate->getXCenter();
+        double yCenter = kCandidate->getYCenter();
+        std::shared_ptr<afwMath::Kernel> kernelPtr = _kernelImageCache->getKernel(xCenter, yCenter);
+        double kSum = _kernelImageCache->getKernelSum(xCenter, yCenter);
+        double background = _kernelImageCache->getBackground(xCenter, yCenter);
 
-        MaskedImageT diffim = kCandidate->getDifferenceImage(kernelPtr, background);
+        MaskedImageT& diffim = _diffimPool.get(kCandidate->getTemplateMaskedImage()->getDimensions());
+        kCandidate->getDifferenceImage(diffim, kernelPtr, background);
 
         if (DEBUG_IMAGES) {
-            kImage.writeFits(str(boost::format("askv_k%d.fits") % kCandidate->getId()));
+            _kernelImageCache->getKernelImage(xCenter, yCenter)->writeFits(
+                str(boost::format("askv_k%d.fits") % kCandidate->getId()));
             diffim.writeFits(str(boost::format("askv_d%d.fits") % kCandidate->getId()));
         }
 
@@ -10,8 +10,10 @@
  */
 #include <cmath>
 #include <limits>
+#include <vector>
 
 #include "boost/timer.hpp"
+#include "Eigen/Sparse"
 
 #include "lsst/pex/exceptions/Exception.h"
 #include "lsst/daf/base/PropertySet.h"
@@ -146,67 +148,12 @@ namespace diffim {
     }
 
 
-    Eigen::MatrixXd makeRegularizationMatrix(
-        lsst::daf::base::PropertySet const& ps
-        ) {
-
-        /* NOTES
-         *
-         * The 3-point first derivative central difference (Laplacian) yields
-         * diagonal stripes and should not be used.
-
-         coeffs[0][1] = -1. / 2.;
-         coeffs[1][0] = -1. / 2.;
-         coeffs[1][2] =  1. / 2.;
-         coeffs[2][1] =  1. / 2.;
-
-         * The 5-point second derivative central difference (Laplacian) looks great.
-         * For smaller lambdas you need a higher border penalty.  In general, if you
-         * decrease the regularization strength you should increase the border
-         * penalty to avoid noise in the border pixels.  This has been used to value
-         * 10 and things still look OK.
-
-         * The 9-point second derivative central difference (Laplacian with off
-         * diagonal terms) also looks great.  Seems to have slightly higher-valued
-         * border pixels so make boundary larger if using this.  E.g. 1.5.
-
-         * The forward finite difference, first derivative term works good
-         *
-         * The forward finite difference, second derivative term is slightly banded
-         * in LLC
-         *
-         * The forward finite difference, third derivative term is highly banded in
-         * LLC and should not be used.
-         *
-         */
-
-        std::string regularizationType = ps.getAsString("regularizationType");
-        int width   = ps.getAsInt("kernelSize");
-        int height  = ps.getAsInt("kernelSize");
-        float borderPenalty  = ps.getAsDouble("regularizationBorderPenalty");
-        bool fitForBackground = ps.getAsBool("fitForBackground");
-
-        Eigen::MatrixXd bMat;
-        if (regularizationType == "centralDifference") {
-            int stencil = ps.getAsInt("centralRegularizationStencil");
-            bMat = makeCentralDifferenceMatrix(width, height, stencil, borderPenalty, fitForBackground);
-        }
-        else if (regularizationType == "forwardDifference") {
-            std::vector<int> orders = ps.getArray<int>("forwardRegularizationOrders");
-            bMat = makeForwardDifferenceMatrix(width, height, orders, borderPenalty, fitForBackground);
-        }
-        else {
-            throw LSST_EXCEPT(pexExcept::Exception, "regularizationType not recognized");
-        }
+namespace {
 
-        Eigen::MatrixXd hMat = bMat.transpose() * bMat;
-        return hMat;
-    }
+    typedef Eigen::SparseMatrix<double> SparseMatrixT;
 
-   /**
-    * @brief Generate regularization matrix for delta function kernels
-    */
-    Eigen::MatrixXd makeCentralDifferenceMatrix(
+    /* Sparse versions of the difference matrices; these have at most 9 entries per row */
+    SparseMatrixT makeSparseCentralDifferenceMatrix(
         int width,
         int height,
         int stencil,
@@ -272,7 +219,8 @@ namespace diffim {
         }
 
         int nBgTerms = fitForBackground ? 1 : 0;
-        Eigen::MatrixXd bMat = Eigen::MatrixXd::Zero(width * height + nBgTerms, width * height + nBgTerms);
+        std::vector<Eigen::Triplet<double> > triplets;
+        triplets.reserve(9 * width * height);
 
         for (int i = 0; i < width*height; i++) {
             int const x0    = i % width;       // the x coord in the kernel image
@@ -283,14 +231,18 @@ namespace diffim {
             if ( (x0 > 0) && (y0 > 0) && (distX > 0) && (distY > 0) ) {
                 for (int dx = -1; dx < 2; dx += 1) {
                     for (int dy = -1; dy < 2; dy += 1) {
-                        bMat(i, i + dx + dy * width) += coeffs[dx+1][dy+1];
+                        triplets.push_back(Eigen::Triplet<double>(i, i + dx + dy * width,
+                                                                  coeffs[dx+1][dy+1]));
                     }
                 }
             }
             else {
-                bMat(i, i) = borderPenalty;
+                triplets.push_back(Eigen::Triplet<double>(i, i, borderPenalty));
             }
         }
+        /* Duplicate entries are summed */
+        SparseMatrixT bMat(width * height + nBgTerms, width * height + nBgTerms);
+        bMat.setFromTriplets(triplets.begin(), triplets.end());
 
         if (fitForBackground) {
             /* Last row / col should have no regularization since its the background term */
@@ -305,10 +257,7 @@ namespace diffim {
         return bMat;
     }
 
-   /**
-    * @brief Generate regularization matrix for delta function kernels
-    */
-    Eigen::MatrixXd makeForwardDifferenceMatrix(
+    SparseMatrixT makeSparseForwardDifferenceMatrix(
         int width,
         int height,
         std::vector<int> const& orders,
@@ -357,18 +306,13 @@ namespace diffim {
         coeffs[3][3] = +1.;
 
         int nBgTerms = fitForBackground ? 1 : 0;
-        Eigen::MatrixXd bTot  = Eigen::MatrixXd::Zero(width * height + nBgTerms, width * height + nBgTerms);
+        std::vector<Eigen::Triplet<double> > triplets;
 
         std::vector<int>::const_iterator order;
         for (order = orders.begin(); order != orders.end(); order++) {
             if ((*order < 1) || (*order > 3))
                 throw LSST_EXCEPT(pexExcept::Exception, "Only orders 1..3 allowed");
 
-            Eigen::MatrixXd bMatX = Eigen::MatrixXd::Zero(width * height + nBgTerms,
-                                                          width * height + nBgTerms);
-            Eigen::MatrixXd bMatY = Eigen::MatrixXd::Zero(width * height + nBgTerms,
-                                                          width * height + nBgTerms);
-
             for (int i = 0; i < width*height; i++) {
                 int const x0 = i % width;         // the x coord in the kernel image
                 int const y0 = i / width;         // the y coord in the kernel image
@@ -376,18 +320,19 @@ namespace diffim {
                 int distX       = width - x0 - 1; // distance from edge of image
                 int orderToUseX = std::min(distX, *order);
                 for (int j = 0; j < orderToUseX+1; j++) {
-                    bMatX(i, i + j) = coeffs[orderToUseX][j];
+                    triplets.push_back(Eigen::Triplet<double>(i, i + j, coeffs[orderToUseX][j]));
                 }
 
                 int distY       = height - y0 - 1; // distance from edge of image
                 int orderToUseY = std::min(distY, *order);
                 for (int j = 0; j < orderToUseY+1; j++) {
-                    bMatY(i, i + j * width) = coeffs[orderToUseY][j];
+                    triplets.push_back(Eigen::Triplet<double>(i, i + j * width, coeffs[orderToUseY][j]));
                 }
             }
-            bTot += bMatX;
-            bTot += bMatY;
         }
+        /* Duplicate entries, from the x and y terms and from each order, are summed */
+        SparseMatrixT bTot(width * height + nBgTerms, width * height + nBgTerms);
+        bTot.setFromTriplets(triplets.begin(), triplets.end());
 
         if (fitForBackground) {
             /* Last row / col should have no regularization since its the background term */
@@ -402,6 +347,96 @@ namespace diffim {
         return bTot;
     }
 
+}  // anonymous namespace
+
+
+    Eigen::MatrixXd makeRegularizationMatrix(
+        lsst::daf::base::PropertySet const& ps
+        ) {
+
+        /* NOTES
+         *
+         * The 3-point first derivative central difference (Laplacian) yields
+         * diagonal stripes and should not be used.
+
+         coeffs[0][1] = -1. / 2.;
+         coeffs[1][0] = -1. / 2.;
+         coeffs[1][2] =  1. / 2.;
+         coeffs[2][1] =  1. / 2.;
+
+         * The 5-point second derivative central difference (Laplacian) looks great.
+         * For smaller lambdas you need a higher border penalty.  In general, if you
+         * decrease the regularization strength you should increase the border
+         * penalty to avoid noise in the border pixels.  This has been used to value
+         * 10 and things still look OK.
+
+         * The 9-point second derivative central difference (Laplacian with off
+         * diagonal terms) also looks great.  Seems to have slightly higher-valued
+         * border pixels so make boundary larger if using this.  E.g. 1.5.
+
+         * The forward finite difference, first derivative term works good
+         *
+         * The forward finite difference, second derivative term is slightly banded
+         * in LLC
+         *
+         * The forward finite difference, third derivative term is highly banded in
+         * LLC and should not be used.
+         *
+         */
+
+        std::string regularizationType = ps.getAsString("regularizationType");
+        int width   = ps.getAsInt("kernelSize");
+        int height  = ps.getAsInt("kernelSize");
+        float borderPenalty  = ps.getAsDouble("regularizationBorderPenalty");
+        bool fitForBackground = ps.getAsBool("fitForBackground");
+
+        SparseMatrixT bMat;
+        if (regularizationType == "centralDifference") {
+            int stencil = ps.getAsInt("centralRegularizationStencil");
+            bMat = makeSparseCentralDifferenceMatrix(width, height, stencil, borderPenalty, fitForBackground);
+        }
+        else if (regularizationType == "forwardDifference") {
+            std::vector<int> orders = ps.getArray<int>("forwardRegularizationOrders");
+            bMat = makeSparseForwardDifferenceMatrix(width, height, orders, borderPenalty, fitForBackground);
+        }
+        else {
+            throw LSST_EXCEPT(pexExcept::Exception, "regularizationType not recognized");
+        }
+
+        /* B is banded, so B^T B is formed sparse and only the result is made dense */
+        SparseMatrixT hMat = SparseMatrixT(bMat.transpose()) * bMat;
+        return Eigen::MatrixXd(hMat);
+    }
+
+
+   /**
+    * @brief Generate regularization matrix for delta function kernels
+    */
+    Eigen::MatrixXd makeCentralDifferenceMatrix(
+        int width,
+        int height,
+        int stencil,
+        float borderPenalty,
+        bool fitForBackground
+        ) {
+        return Eigen::MatrixXd(
+            makeSparseCentralDifferenceMatrix(width, height, stencil, borderPenalty, fitForBackground));
+    }
+
+   /**
+    * @brief Generate regularization matrix for delta function kernels
+    */
+    Eigen::MatrixXd makeForwardDifferenceMatrix(
+        int width,
+        int height,
+        std::vector<int> const& orders,
+        float borderPenalty,
+        bool fitForBackground
+        ) {
+        return Eigen::MatrixXd(
+            makeSparseForwardDifferenceMatrix(width, height, orders, borderPenalty, fitForBackground));
+    }
+
 
    /**
     * @brief Rescale an input set of kernels
@@ -180,7 +180,8 @@ namespace detail {
          * Make diffim and set chi2 from result.  Note that you need to use the
          * most recent kernel
          */
-        MaskedImageT diffim = kCandidate->getDifferenceImage(ipDiffim::KernelCandidate<PixelT>::RECENT);
+        MaskedImageT& diffim = _diffimPool.get(kCandidate->getTemplateMaskedImage()->getDimensions());
+        kCandidate->getDifferenceImage(diffim, ipDiffim::KernelCandidate<PixelT>::RECENT);
         try {
             if (_useCoreStats)
                 _imstats.apply(diffim, _coreRadius);
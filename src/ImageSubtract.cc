@@ -119,11 +119,40 @@ afwImage::MaskedImage<PixelT> convolveAndSubtract(
     BackgroundT background,                                  ///< Differential background
     bool invert                                              ///< Invert the output difference image
     ) {
+    afwImage::MaskedImage<PixelT> convolvedMaskedImage(templateImage.getDimensions());
+    convolveAndSubtract<PixelT, BackgroundT>(convolvedMaskedImage, templateImage, scienceMaskedImage,
+                                             convolutionKernel, background, invert);
+    return convolvedMaskedImage;
+}
+
+/**
+ * @brief Implement fundamental difference imaging step of convolution and
+ * subtraction into an existing image : D = I - (K*T + bg) where * denotes convolution
+ *
+ * @note Every pixel of the output image is overwritten, so that the same image
+ * may be reused for the difference images of many stamps of the same size.
+ *
+ * @note A background function is evaluated in the pixel coordinates of the output image.
+ *
+ * @ingroup diffim
+ */
+template <typename PixelT, typename BackgroundT>
+void convolveAndSubtract(
+    lsst::afw::image::MaskedImage<PixelT> &convolvedMaskedImage,     ///< Output difference image D
+    lsst::afw::image::MaskedImage<PixelT> const &templateImage,      ///< Image T to convolve with Kernel
+    lsst::afw::image::MaskedImage<PixelT> const &scienceMaskedImage, ///< Image I to subtract T from
+    lsst::afw::math::Kernel const &convolutionKernel,                ///< PSF-matching Kernel used
+    BackgroundT background,                                  ///< Differential background
+    bool invert                                              ///< Invert the output difference image
+    ) {
 
     boost::timer t;
     t.restart();
 
-    afwImage::MaskedImage<PixelT> convolvedMaskedImage(templateImage.getDimensions());
+    if (convolvedMaskedImage.getDimensions() != templateImage.getDimensions()) {
+        throw LSST_EXCEPT(pexExcept::LengthError,
+                          "Output image and template have different dimensions");
+    }
     afwMath::ConvolutionControl convolutionControl = afwMath::ConvolutionControl();
     convolutionControl.setDoNormalize(false);
     afwMath::convolve(convolvedMaskedImage, templateImage,
@@ -143,8 +172,6 @@ afwImage::MaskedImage<PixelT> convolveAndSubtract(
     double time = t.elapsed();
     LOGL_DEBUG("TRACE4.ip.diffim.convolveAndSubtract",
                "Total compute time to convolve and subtract : %.2f s", time);
-
-    return convolvedMaskedImage;
 }
 
 /**
@@ -170,11 +197,40 @@ afwImage::MaskedImage<PixelT> convolveAndSubtract(
     BackgroundT background,                                  ///< Differential background
     bool invert                                              ///< Invert the output difference image
     ) {
+    afwImage::MaskedImage<PixelT> convolvedMaskedImage(templateImage.getDimensions());
+    convolveAndSubtract<PixelT, BackgroundT>(convolvedMaskedImage, templateImage, scienceMaskedImage,
+                                             convolutionKernel, background, invert);
+    return convolvedMaskedImage;
+}
+
+/**
+ * @brief Implement fundamental difference imaging step of convolution and
+ * subtraction into an existing image : D = I - (K.x.T + bg)
+ *
+ * @note Every pixel of the output image is overwritten, so that the same image
+ * may be reused for the difference images of many stamps of the same size.
+ *
+ * @note A background function is evaluated in the pixel coordinates of the output image.
+ *
+ * @ingroup diffim
+ */
+template <typename PixelT, typename BackgroundT>
+void convolveAndSubtract(
+    lsst::afw::image::MaskedImage<PixelT> &convolvedMaskedImage,     ///< Output difference image D
+    lsst::afw::image::Image<PixelT> const &templateImage,            ///< Image T to convolve with Kernel
+    lsst::afw::image::MaskedImage<PixelT> const &scienceMaskedImage, ///< Image I to subtract T from
+    lsst::afw::math::Kernel const &convolutionKernel,                ///< PSF-matching Kernel used
+    BackgroundT background,                                  ///< Differential background
+    bool invert                                              ///< Invert the output difference image
+    ) {
 
     boost::timer t;
     t.restart();
 
-    afwImage::MaskedImage<PixelT> convolvedMaskedImage(templateImage.getDimensions());
+    if (convolvedMaskedImage.getDimensions() != templateImage.getDimensions()) {
+        throw LSST_EXCEPT(pexExcept::LengthError,
+                          "Output image and template have different dimensions");
+    }
     afwMath::ConvolutionControl convolutionControl = afwMath::ConvolutionControl();
     convolutionControl.setDoNormalize(false);
     afwMath::convolve(*convolvedMaskedImage.getImage(), templateImage,
@@ -196,8 +252,6 @@ afwImage::MaskedImage<PixelT> convolveAndSubtract(
     double time = t.elapsed();
     LOGL_DEBUG("TRACE4.ip.diffim.convolveAndSubtract",
                "Total compute time to convolve and subtract : %.2f s", time);
-
-    return convolvedMaskedImage;
 }
 
 /***********************************************************************************************************/
@@ -233,6 +287,24 @@ template class ImageStatistics<double>;
         lsst::afw::math::Kernel const& convolutionKernel, \
         lsst::afw::math::Function2<double> const& backgroundFunction, \
         bool invert); \
+    \
+    template \
+    void convolveAndSubtract( \
+        lsst::afw::image::MaskedImage<TYPE> & outputImage, \
+        lsst::afw::image::TEMPLATE_IMAGE_T<TYPE> const& templateImage, \
+        lsst::afw::image::MaskedImage<TYPE> const& scienceMaskedImage, \
+        lsst::afw::math::Kernel const& convolutionKernel, \
+        double background, \
+        bool invert); \
+    \
+    template \
+    void convolveAndSubtract( \
+        lsst::afw::image::MaskedImage<TYPE> & outputImage, \
+        lsst::afw::image::TEMPLATE_IMAGE_T<TYPE> const& templateImage, \
+        lsst::afw::image::MaskedImage<TYPE> const& scienceMaskedImage, \
+        lsst::afw::math::Kernel const& convolutionKernel, \
+        lsst::afw::math::Function2<double> const& backgroundFunction, \
+        bool invert); \
 
 #define INSTANTIATE_convolveAndSubtract(TYPE) \
 p_INSTANTIATE_convolveAndSubtract(Image, TYPE) \
@@ -143,6 +143,8 @@ void KernelCandidate<PixelT>::_buildKernelSolution(lsst::afw::math::KernelList c
         ctype = KernelSolution::SVD;
     } else if (conditionNumberType == "EIGENVALUE") {
         ctype = KernelSolution::EIGENVALUE;
+    } else if (conditionNumberType == "LDLT") {
+        ctype = KernelSolution::LDLT;
     } else {
         throw LSST_EXCEPT(pexExcept::Exception, "conditionNumberType not recognized");
     }
@@ -161,6 +163,7 @@ void KernelCandidate<PixelT>::_buildKernelSolution(lsst::afw::math::KernelList c
                 if (_kernelSolutionPca->getConditionNumber(ctype) > maxConditionNumber) {
                     LOGL_DEBUG("TRACE4.ip.diffim.KernelCandidate",
                                "Candidate %d solution has bad condition number", this->getId());
+                    _kernelSolutionPca->releaseDecomposition();
                     this->setStatus(afwMath::SpatialCellCandidate::BAD);
                     return;
                 }
@@ -175,6 +178,7 @@ void KernelCandidate<PixelT>::_buildKernelSolution(lsst::afw::math::KernelList c
                 if (_kernelSolutionOrig->getConditionNumber(ctype) > maxConditionNumber) {
                     LOGL_DEBUG("TRACE4.ip.diffim.KernelCandidate",
                                "Candidate %d solution has bad condition number", this->getId());
+                    _kernelSolutionOrig->releaseDecomposition();
                     this->setStatus(afwMath::SpatialCellCandidate::BAD);
                     return;
                 }
@@ -193,6 +197,7 @@ void KernelCandidate<PixelT>::_buildKernelSolution(lsst::afw::math::KernelList c
                 if (_kernelSolutionPca->getConditionNumber(ctype) > maxConditionNumber) {
                     LOGL_DEBUG("TRACE4.ip.diffim.KernelCandidate",
                                "Candidate %d solution has bad condition number", this->getId());
+                    _kernelSolutionPca->releaseDecomposition();
                     this->setStatus(afwMath::SpatialCellCandidate::BAD);
                     return;
                 }
@@ -207,6 +212,7 @@ void KernelCandidate<PixelT>::_buildKernelSolution(lsst::afw::math::KernelList c
                 if (_kernelSolutionOrig->getConditionNumber(ctype) > maxConditionNumber) {
                     LOGL_DEBUG("TRACE4.ip.diffim.KernelCandidate",
                                "Candidate %d solution has bad condition number", this->getId());
+                    _kernelSolutionOrig->releaseDecomposition();
                     this->setStatus(afwMath::SpatialCellCandidate::BAD);
                     return;
                 }
@@ -345,21 +351,29 @@ std::shared_ptr<StaticKernelSolution<PixelT> > KernelCandidate<PixelT>::getKerne
 
 template <typename PixelT>
 lsst::afw::image::MaskedImage<PixelT> KernelCandidate<PixelT>::getDifferenceImage(CandidateSwitch cand) {
+    afwImage::MaskedImage<PixelT> diffIm(_templateMaskedImage->getDimensions());
+    getDifferenceImage(diffIm, cand);
+    return diffIm;
+}
+
+template <typename PixelT>
+void KernelCandidate<PixelT>::getDifferenceImage(lsst::afw::image::MaskedImage<PixelT>& diffim,
+                                                 CandidateSwitch cand) {
     if (cand == KernelCandidate::ORIG) {
         if (_kernelSolutionOrig)
-            return getDifferenceImage(_kernelSolutionOrig->getKernel(), _kernelSolutionOrig->getBackground());
+            getDifferenceImage(diffim, _kernelSolutionOrig->getKernel(), _kernelSolutionOrig->getBackground());
         else
             throw LSST_EXCEPT(pexExcept::Exception, "Original kernel does not exist");
     } else if (cand == KernelCandidate::PCA) {
         if (_kernelSolutionPca)
-            return getDifferenceImage(_kernelSolutionPca->getKernel(), _kernelSolutionPca->getBackground());
+            getDifferenceImage(diffim, _kernelSolutionPca->getKernel(), _kernelSolutionPca->getBackground());
         else
             throw LSST_EXCEPT(pexExcept::Exception, "Pca kernel does not exist");
     } else if (cand == KernelCandidate::RECENT) {
         if (_kernelSolutionPca)
-            return getDifferenceImage(_kernelSolutionPca->getKernel(), _kernelSolutionPca->getBackground());
+            getDifferenceImage(diffim, _kernelSolutionPca->getKernel(), _kernelSolutionPca->getBackground());
         else if (_kernelSolutionOrig)
-            return getDifferenceImage(_kernelSolutionOrig->getKernel(), _kernelSolutionOrig->getBackground());
+            getDifferenceImage(diffim, _kernelSolutionOrig->getKernel(), _kernelSolutionOrig->getBackground());
         else
             throw LSST_EXCEPT(pexExcept::Exception, "No kernels exist");
     } else {
@@ -367,15 +381,68 @@ lsst::afw::image::MaskedImage<PixelT> KernelCandidate<PixelT>::getDifferenceImag
     }
 }
 
+template <typename PixelT>
+void KernelCandidate<PixelT>::setKernelSolution(std::shared_ptr<StaticKernelSolution<PixelT>> kernelSolution) {
+    _kernelSolutionOrig = kernelSolution;
+    _kernelSolutionPca.reset();
+    _isInitialized = true;
+}
+
 template <typename PixelT>
 lsst::afw::image::MaskedImage<PixelT> KernelCandidate<PixelT>::getDifferenceImage(
         std::shared_ptr<lsst::afw::math::Kernel> kernel, double background) {
     /* Make diffim and set chi2 from result */
-    afwImage::MaskedImage<PixelT> diffIm =
-            convolveAndSubtract(*_templateMaskedImage, *_scienceMaskedImage, *kernel, background);
+    afwImage::MaskedImage<PixelT> diffIm(_templateMaskedImage->getDimensions());
+    getDifferenceImage(diffIm, kernel, background);
     return diffIm;
 }
 
+template <typename PixelT>
+void KernelCandidate<PixelT>::getDifferenceImage(lsst::afw::image::MaskedImage<PixelT>& diffim,
+                                                 std::shared_ptr<lsst::afw::math::Kernel> kernel,
+                                                 double background) {
+    convolveAndSubtract(diffim, *_templateMaskedImage, *_scienceMaskedImage, *kernel, background);
+}
+
+template <typename PixelT>
+int insertKernelCandidates(afwMath::SpatialCellSet& kernelCellSet,
+                           ndarray::Array<float const, 1, 1> const& xCenters,
+                           ndarray::Array<float const, 1, 1> const& yCenters,
+                           ndarray::Array<PixelT, 3, 3> const& templateStamps,
+                           ndarray::Array<PixelT, 3, 3> const& scienceStamps,
+                           lsst::daf::base::PropertySet const& ps) {
+    int const nCandidates = xCenters.template getSize<0>();
+    if (yCenters.template getSize<0>() != nCandidates ||
+        templateStamps.template getSize<0>() != nCandidates ||
+        scienceStamps.template getSize<0>() != nCandidates) {
+        throw LSST_EXCEPT(pexExcept::LengthError, "Candidate positions and stamps have different lengths");
+    }
+    if (templateStamps.template getSize<1>() != scienceStamps.template getSize<1>() ||
+        templateStamps.template getSize<2>() != scienceStamps.template getSize<2>()) {
+        throw LSST_EXCEPT(pexExcept::LengthError, "Template and science stamps have different dimensions");
+    }
+    if (nCandidates == 0) {
+        return 0;
+    }
+
+    lsst::geom::Extent2I const dimensions(templateStamps.template getSize<2>(),
+                                          templateStamps.template getSize<1>());
+    /* The stamps are noiseless, so share one mask and variance plane between all candidates */
+    auto mask = std::make_shared<afwImage::Mask<afwImage::MaskPixel>>(dimensions, 0x0);
+    auto variance = std::make_shared<afwImage::Image<afwImage::VariancePixel>>(dimensions, 1.0);
+
+    for (int i = 0; i < nCandidates; ++i) {
+        auto templateImage = std::make_shared<afwImage::Image<PixelT>>(templateStamps[i], false);
+        auto scienceImage = std::make_shared<afwImage::Image<PixelT>>(scienceStamps[i], false);
+        auto templateMaskedImage =
+                std::make_shared<afwImage::MaskedImage<PixelT>>(templateImage, mask, variance);
+        auto scienceMaskedImage = std::make_shared<afwImage::MaskedImage<PixelT>>(scienceImage, mask, variance);
+        kernelCellSet.insertCandidate(makeKernelCandidate(xCenters[i], yCenters[i], templateMaskedImage,
+                                                          scienceMaskedImage, ps));
+    }
+    return nCandidates;
+}
+
 /***********************************************************************************************************/
 //
 // Explicit instantiations
@@ -384,6 +451,13 @@ typedef float PixelT;
 
 template class KernelCandidate<PixelT>;
 
+template int insertKernelCandidates<PixelT>(afwMath::SpatialCellSet&,
+                                            ndarray::Array<float const, 1, 1> const&,
+                                            ndarray::Array<float const, 1, 1> const&,
+                                            ndarray::Array<PixelT, 3, 3> const&,
+                                            ndarray::Array<PixelT, 3, 3> const&,
+                                            lsst::daf::base::PropertySet const&);
+
 }  // namespace diffim
 }  // namespace ip
 }  // namespace lsst
@@ -17,7 +17,6 @@
 #include "lsst/pex/exceptions/Exception.h"
 #include "lsst/daf/base/PropertySet.h"
 
-#include "lsst/ip/diffim/FindSetBits.h"
 #include "lsst/ip/diffim/KernelCandidateDetection.h"
 
 namespace geom      = lsst::geom;
@@ -37,7 +36,9 @@ namespace diffim {
         ) :
         _ps(ps.deepCopy()),
         _badBitMask(0),
-        _footprints(std::vector<std::shared_ptr<lsst::afw::detection::Footprint>>()) {
+        _footprints(std::vector<std::shared_ptr<lsst::afw::detection::Footprint>>()),
+        _badPixelIntegral(),
+        _badPixelBBox() {
 
         std::vector<std::string> detBadMaskPlanes = _ps->getArray<std::string>("badMaskPlanes");
         for (std::vector<std::string>::iterator mi = detBadMaskPlanes.begin();
@@ -125,6 +126,9 @@ namespace diffim {
                        footprintListInPtr->size(), detThreshold, detThresholdType.c_str());
         }
 
+        // Sum the bad pixels of both masks once, for the checks of all footprints
+        _buildBadPixelIntegral(templateMaskedImage, scienceMaskedImage);
+
         // Iterate over footprints, look for "good" ones
         for (std::vector<std::shared_ptr<afwDetect::Footprint>>::iterator i = footprintListInPtr->begin();
              i != footprintListInPtr->end(); ++i) {
@@ -132,6 +136,9 @@ namespace diffim {
             growCandidate((*i), fpGrowPix, templateMaskedImage, scienceMaskedImage);
         }
 
+        // Release the integral image
+        _badPixelIntegral.resize(0, 0);
+
         if (_footprints.size() == 0) {
             throw LSST_EXCEPT(pexExcept::Exception,
                               "Unable to find any footprints for Psf matching");
@@ -152,12 +159,6 @@ namespace diffim {
         ) {
         int fpNpixMax = _ps->getAsInt("fpNpixMax");
 
-        /* Functor to search through the images for masked pixels within *
-         * candidate footprints.  Might want to consider changing the default
-         * mask planes it looks through.
-         */
-        FindSetBits<afwImage::Mask<afwImage::MaskPixel> > fsb;
-
         geom::Box2I fpBBox = fp->getBBox();
         /* Failure Condition 1)
          *
@@ -229,43 +230,90 @@ namespace diffim {
             return false;
         }
 
-        /* Grab subimages; report any exception */
-        bool subimageHasFailed = false;
-        try {
-            afwImage::MaskedImage<PixelT> templateSubimage(*templateMaskedImage, fpGrowBBox);
-            afwImage::MaskedImage<PixelT> scienceSubimage(*scienceMaskedImage, fpGrowBBox);
-
-            // Search for any masked pixels within the footprint
-            fsb.apply(*(templateSubimage.getMask()));
-            if (fsb.getBits() & _badBitMask) {
-                LOGL_DEBUG("TRACE3.ip.diffim.KernelCandidateDetection.apply",
-                           "Footprint has masked pix (vals=%d) in image to convolve",
-                           fsb.getBits());
-                subimageHasFailed = true;
-            }
+        /* Failure Condition 3)
+         * Masked pixels within the grown footprint in either image
+         */
+        int nBad = _countBadPixels(fpGrowBBox, templateMaskedImage, scienceMaskedImage);
+        if (nBad > 0) {
+            LOGL_DEBUG("TRACE3.ip.diffim.KernelCandidateDetection.apply",
+                       "Footprint has %d masked pix in either image", nBad);
+            return false;
+        }
+
+        /* We have a good candidate */
+        _footprints.push_back(fpGrow);
+        return true;
+    }
 
-            fsb.apply(*(scienceSubimage.getMask()));
-            if (fsb.getBits() & _badBitMask) {
-                LOGL_DEBUG("TRACE3.ip.diffim.KernelCandidateDetection.apply",
-                           "Footprint has masked pix (vals=%d) in image not to convolve",
-                           fsb.getBits());
-                subimageHasFailed = true;
+    template <typename PixelT>
+    void KernelCandidateDetection<PixelT>::_buildBadPixelIntegral(
+        MaskedImagePtr const& templateMaskedImage,
+        MaskedImagePtr const& scienceMaskedImage
+        ) {
+        afwImage::Mask<afwImage::MaskPixel> const& templateMask = *(templateMaskedImage->getMask());
+        afwImage::Mask<afwImage::MaskPixel> const& scienceMask = *(scienceMaskedImage->getMask());
+        _badPixelBBox = templateMaskedImage->getBBox();
+        geom::Box2I const scienceBBox = scienceMaskedImage->getBBox();
+
+        int const width = _badPixelBBox.getWidth();
+        int const height = _badPixelBBox.getHeight();
+        _badPixelIntegral.setZero(height + 1, width + 1);
+        for (int y = 0; y < height; ++y) {
+            int const yScience = y + _badPixelBBox.getMinY() - scienceBBox.getMinY();
+            bool const rowInScience = (yScience >= 0) && (yScience < scienceBBox.getHeight());
+            int rowSum = 0;
+            afwImage::Mask<afwImage::MaskPixel>::const_x_iterator tPtr = templateMask.row_begin(y);
+            for (int x = 0; x < width; ++x, ++tPtr) {
+                int const xScience = x + _badPixelBBox.getMinX() - scienceBBox.getMinX();
+                /* Pixels that are not in the science image cannot be used */
+                bool isBad = (*tPtr & _badBitMask) ||
+                    !rowInScience || (xScience < 0) || (xScience >= scienceBBox.getWidth()) ||
+                    (scienceMask(xScience, yScience) & _badBitMask);
+                rowSum += isBad ? 1 : 0;
+                _badPixelIntegral(y + 1, x + 1) = _badPixelIntegral(y, x + 1) + rowSum;
             }
+        }
+    }
 
-        } catch (pexExcept::Exception& e) {
-            LOGL_DEBUG("TRACE3.ip.diffim.KernelCandidateDetection.apply",
-                       "Exception caught extracting Footprint");
-            LOGL_DEBUG("TRACE4.ip.diffim.KernelCandidateDetection.apply",
-                       e.what());
-            subimageHasFailed = true;
+    /*
+     * Count the pixels of bbox, which is within the template, with bad bits set in
+     * either mask or not in the science image.  Outside of apply(), the integral
+     * image is not built, and only the pixels of bbox are scanned.
+     */
+    template <typename PixelT>
+    int KernelCandidateDetection<PixelT>::_countBadPixels(
+        geom::Box2I const& bbox,
+        MaskedImagePtr const& templateMaskedImage,
+        MaskedImagePtr const& scienceMaskedImage
+        ) const {
+        if (_badPixelIntegral.size() > 0) {
+            int const x0 = bbox.getMinX() - _badPixelBBox.getMinX();
+            int const y0 = bbox.getMinY() - _badPixelBBox.getMinY();
+            int const x1 = bbox.getMaxX() - _badPixelBBox.getMinX() + 1;
+            int const y1 = bbox.getMaxY() - _badPixelBBox.getMinY() + 1;
+            return _badPixelIntegral(y1, x1) - _badPixelIntegral(y0, x1) -
+                _badPixelIntegral(y1, x0) + _badPixelIntegral(y0, x0);
         }
-        if (subimageHasFailed) {
-            return false;
-        } else {
-            /* We have a good candidate */
-            _footprints.push_back(fpGrow);
-            return true;
+
+        geom::Box2I const templateBBox = templateMaskedImage->getBBox();
+        geom::Box2I const scienceBBox = scienceMaskedImage->getBBox();
+        geom::Box2I inScience(bbox);
+        inScience.clip(scienceBBox);
+        int nBad = bbox.getArea() - inScience.getArea();
+        afwImage::Mask<afwImage::MaskPixel> const& templateMask = *(templateMaskedImage->getMask());
+        afwImage::Mask<afwImage::MaskPixel> const& scienceMask = *(scienceMaskedImage->getMask());
+        for (int y = inScience.getMinY(); y <= inScience.getMaxY(); ++y) {
+            afwImage::Mask<afwImage::MaskPixel>::const_x_iterator tPtr =
+                templateMask.x_at(inScience.getMinX() - templateBBox.getMinX(), y - templateBBox.getMinY());
+            afwImage::Mask<afwImage::MaskPixel>::const_x_iterator sPtr =
+                scienceMask.x_at(inScience.getMinX() - scienceBBox.getMinX(), y - scienceBBox.getMinY());
+            for (int x = inScience.getMinX(); x <= inScience.getMaxX(); ++x, ++tPtr, ++sPtr) {
+                if ((*tPtr | *sPtr) & _badBitMask) {
+                    ++nBad;
+                }
+            }
         }
+        return nBad;
     }
 
 /***********************************************************************************************************/
@@ -9,6 +9,13 @@
  * @ingroup ip_diffim
  */
 
+#include <algorithm>
+#include <random>
+
+#include "Eigen/Core"
+#include "Eigen/QR"
+#include "Eigen/SVD"
+
 #include "lsst/afw/math.h"
 #include "lsst/afw/image.h"
 #include "lsst/log/Log.h"
@@ -138,6 +145,11 @@ namespace detail {
                    "Subtracting mean feature before Pca");
 
         _mean = _imagePca->getMean();
+        if (_imagePca->getNComponents() > 0) {
+            /* A truncated Pca stacks the images anyway; subtract the mean there */
+            _imagePca->setMean(_mean);
+            return;
+        }
         KernelPca<ImageT>::ImageList imageList = _imagePca->getImageList();
         for (typename KernelPca<ImageT>::ImageList::const_iterator ptr = imageList.begin(),
                  end = imageList.end(); ptr != end; ++ptr) {
@@ -158,11 +170,29 @@ namespace detail {
      * @note This override normalizes the resulting eigenImages to have peak
      * value of 1.0.
      *
+     * @note If fewer components than images are requested, only the leading
+     * components are computed, with a randomized decomposition of the stacked
+     * images (see _analyzeTruncated).  Otherwise the full decomposition of
+     * the base class is used.
+     *
      */
     template <typename ImageT>
     void KernelPca<ImageT>::analyze()
     {
-        Super::analyze();
+        typename Super::ImageList const &imageList = this->getImageList();
+        int const nImage = imageList.size();
+        if ((_nComponents > 0) && (_nComponents < nImage)) {
+            _analyzeTruncated();
+        } else {
+            if (_mean) {
+                for (typename Super::ImageList::const_iterator ptr = imageList.begin(),
+                         end = imageList.end(); ptr != end; ++ptr) {
+                    **ptr -= *_mean;
+                }
+                _mean.reset();
+            }
+            Super::analyze();
+        }
 
         typename Super::ImageList const &eImageList = this->getEigenImages();
         typename Super::ImageList::const_iterator iter = eImageList.begin(), end = eImageList.end();
@@ -185,6 +215,98 @@ namespace detail {
     }
 
 
+    /**
+     * @brief Compute the leading _nComponents components with a randomized SVD
+     *
+     * @note The images are stacked as the columns of a (nPixel x nImage)
+     * matrix, minus the mean image if one was set, and the range of that
+     * matrix is sampled with a few more random vectors than components.  Two
+     * power iterations sharpen the sampled range, after which the SVD of the
+     * small projected matrix gives the leading singular vectors (Halko,
+     * Martinsson & Tropp 2011).  This scales as nPixel * nImage *
+     * nComponents, rather than as nPixel * nImage^2 for the Gram matrix of the
+     * full decomposition.
+     *
+     * @note As in the base class the eigenvalues are those of the Gram matrix
+     * divided by the number of images, but only the leading ones are
+     * computed.  All images are weighted equally, which is how
+     * KernelPcaVisitor adds them.
+     */
+    template <typename ImageT>
+    void KernelPca<ImageT>::_analyzeTruncated()
+    {
+        typename Super::ImageList const &imageList = this->getImageList();
+        int const nImage = imageList.size();
+        int const width  = imageList[0]->getWidth();
+        int const height = imageList[0]->getHeight();
+        int const nPixel = width * height;
+        int const nSample = std::min({_nComponents + 10, nImage, nPixel});
+        int const nComponents = std::min(_nComponents, nSample);
+        int const nPowerIterations = 2;
+
+        Eigen::MatrixXd data(nPixel, nImage);
+        for (int j = 0; j < nImage; ++j) {
+            ImageT const &image = *imageList[j];
+            for (int y = 0, idx = 0; y < height; ++y) {
+                for (typename ImageT::const_x_iterator ptr = image.row_begin(y), end = image.row_end(y);
+                     ptr != end; ++ptr, ++idx) {
+                    data(idx, j) = *ptr;
+                }
+            }
+        }
+        if (_mean) {
+            Eigen::VectorXd meanVec(nPixel);
+            for (int y = 0, idx = 0; y < height; ++y) {
+                for (typename ImageT::const_x_iterator ptr = _mean->row_begin(y), end = _mean->row_end(y);
+                     ptr != end; ++ptr, ++idx) {
+                    meanVec(idx) = *ptr;
+                }
+            }
+            data.colwise() -= meanVec;
+        }
+
+        /* Fixed seed, so that the basis is reproducible */
+        std::mt19937 generator(1);
+        std::normal_distribution<double> normal(0.0, 1.0);
+        Eigen::MatrixXd omega(nImage, nSample);
+        for (int j = 0; j < nSample; ++j) {
+            for (int i = 0; i < nImage; ++i) {
+                omega(i, j) = normal(generator);
+            }
+        }
+
+        Eigen::MatrixXd const thinIdentity = Eigen::MatrixXd::Identity(nPixel, nSample);
+        Eigen::MatrixXd qMat = data * omega;
+        for (int i = 0; i < nPowerIterations; ++i) {
+            qMat = Eigen::HouseholderQR<Eigen::MatrixXd>(qMat).householderQ() * thinIdentity;
+            qMat = data * (data.transpose() * qMat);
+        }
+        qMat = Eigen::HouseholderQR<Eigen::MatrixXd>(qMat).householderQ() * thinIdentity;
+
+        Eigen::MatrixXd const bMat = qMat.transpose() * data;
+        Eigen::JacobiSVD<Eigen::MatrixXd> svd(bMat, Eigen::ComputeThinU);
+        Eigen::MatrixXd const uMat = qMat * svd.matrixU();
+        Eigen::VectorXd const sVec = svd.singularValues();
+
+        std::vector<double> &eigenValues = this->_getEigenValues();
+        typename Super::ImageList &eigenImages = this->_getEigenImages();
+        eigenValues.clear();
+        eigenImages.clear();
+        for (int i = 0; i < nComponents; ++i) {
+            eigenValues.push_back(sVec(i) * sVec(i) / nImage);
+            std::shared_ptr<ImageT> eImage = std::make_shared<ImageT>(width, height);
+            eImage->setXY0(imageList[0]->getXY0());
+            for (int y = 0, idx = 0; y < height; ++y) {
+                for (typename ImageT::x_iterator ptr = eImage->row_begin(y), end = eImage->row_end(y);
+                     ptr != end; ++ptr, ++idx) {
+                    *ptr = uMat(idx, i);
+                }
+            }
+            eigenImages.push_back(eImage);
+        }
+        _mean.reset();
+    }
+
     typedef float PixelT;
     template class KernelPcaVisitor<PixelT>;
     template class KernelPca<afwImage::Image<afwMath::Kernel::Pixel> >;
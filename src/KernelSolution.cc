@@ -47,6 +47,41 @@ namespace afwGeom        = lsst::afw::geom;
 namespace afwImage       = lsst::afw::image;
 namespace pexExcept      = lsst::pex::exceptions;
 
+namespace {
+
+    double eigenConditionNumber(Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> const& eigenSolver) {
+        Eigen::VectorXd const& eValues = eigenSolver.eigenvalues();
+        double eMax = eValues.maxCoeff();
+        double eMin = eValues.minCoeff();
+        LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.getConditionNumber",
+                   "EIGENVALUE eMax / eMin = %.3e", eMax / eMin);
+        return (eMax / eMin);
+    }
+
+    /*
+     * Estimate of the reciprocal 1-norm condition number, from the factorization used to solve.
+     * LDLT::rcond() skips zero pivots, so a singular M is recognised from the diagonal of D.
+     */
+    double ldltRcond(Eigen::LDLT<Eigen::MatrixXd> const& ldlt) {
+        if (ldlt.info() != Eigen::Success) {
+            return 0.0;
+        }
+        Eigen::VectorXd dValues = ldlt.vectorD().cwiseAbs();
+        if (dValues.minCoeff() <= std::numeric_limits<double>::epsilon() * dValues.maxCoeff()) {
+            return 0.0;
+        }
+        return ldlt.rcond();
+    }
+
+    double ldltConditionNumber(Eigen::LDLT<Eigen::MatrixXd> const& ldlt) {
+        double rCond = ldltRcond(ldlt);
+        LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.getConditionNumber",
+                   "LDLT 1 / rcond = %.3e", 1.0 / rCond);
+        return (rCond > 0.0) ? 1.0 / rCond : std::numeric_limits<double>::infinity();
+    }
+
+} // anonymous namespace
+
 namespace lsst {
 namespace ip {
 namespace diffim {
@@ -87,12 +122,50 @@ namespace diffim {
         _fitForBackground(true)
     {};
 
+    /*
+     * @note A decomposition of M made by a preceding condition check is used to
+     * solve, and then released, so that M is decomposed only once and the
+     * decomposition is not kept with the solution.
+     */
     void KernelSolution::solve() {
-        solve(_mMat, _bVec);
+        std::shared_ptr<Eigen::LDLT<Eigen::MatrixXd> > ldlt;
+        std::shared_ptr<Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> > eigenSolver;
+        ldlt.swap(_ldlt);
+        eigenSolver.swap(_eigenSolver);
+        _solve(_mMat, _bVec, ldlt, eigenSolver);
     }
 
+    /*
+     * @note Until the solution is solved, the decomposition of _mMat is kept
+     * for solve() to use
+     */
     double KernelSolution::getConditionNumber(ConditionNumberType conditionType) {
-        return getConditionNumber(_mMat, conditionType);
+        if (_solvedBy != NONE) {
+            return getConditionNumber(_mMat, conditionType);
+        }
+        switch (conditionType) {
+        case EIGENVALUE:
+            {
+            if (!_eigenSolver) {
+                _eigenSolver = std::make_shared<Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> >(_mMat);
+            }
+            return eigenConditionNumber(*_eigenSolver);
+            break;
+            }
+        case LDLT:
+            {
+            if (!_ldlt) {
+                _ldlt = std::make_shared<Eigen::LDLT<Eigen::MatrixXd> >(_mMat);
+            }
+            return ldltConditionNumber(*_ldlt);
+            break;
+            }
+        default:
+            {
+            return getConditionNumber(_mMat, conditionType);
+            break;
+            }
+        }
     }
 
     double KernelSolution::getConditionNumber(Eigen::MatrixXd const& mMat,
@@ -100,13 +173,7 @@ namespace diffim {
         switch (conditionType) {
         case EIGENVALUE:
             {
-            Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> eVecValues(mMat);
-            Eigen::VectorXd eValues = eVecValues.eigenvalues();
-            double eMax = eValues.maxCoeff();
-            double eMin = eValues.minCoeff();
-            LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.getConditionNumber",
-                       "EIGENVALUE eMax / eMin = %.3e", eMax / eMin);
-            return (eMax / eMin);
+            return eigenConditionNumber(Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd>(mMat));
             break;
             }
         case SVD:
@@ -119,10 +186,15 @@ namespace diffim {
             return (sMax / sMin);
             break;
             }
+        case LDLT:
+            {
+            return ldltConditionNumber(Eigen::LDLT<Eigen::MatrixXd>(mMat));
+            break;
+            }
         default:
             {
             throw LSST_EXCEPT(pexExcept::InvalidParameterError,
-                              "Undefined ConditionNumberType : only EIGENVALUE, SVD allowed.");
+                              "Undefined ConditionNumberType : only EIGENVALUE, SVD, LDLT allowed.");
             break;
             }
         }
@@ -130,6 +202,19 @@ namespace diffim {
 
     void KernelSolution::solve(Eigen::MatrixXd const& mMat,
                                Eigen::VectorXd const& bVec) {
+        _solve(mMat, bVec, nullptr, nullptr);
+    }
+
+    /*
+     * @note M is symmetric, so it is factorized with a pivoted LDLt.  Only if
+     * the factorization shows M to be singular is the solution found by
+     * pseudo-inversion of its eigensystem.  If only the eigensystem of M has
+     * already been computed, the solution is found from it directly.
+     */
+    void KernelSolution::_solve(Eigen::MatrixXd const& mMat,
+                                Eigen::VectorXd const& bVec,
+                                std::shared_ptr<Eigen::LDLT<Eigen::MatrixXd> > ldlt,
+                                std::shared_ptr<Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> > eigenSolver) {
 
         if (DEBUG_MATRIX) {
             std::cout << "M " << std::endl;
@@ -145,44 +230,56 @@ namespace diffim {
 
         LOGL_DEBUG("TRACE2.ip.diffim.KernelSolution.solve",
                    "Solving for kernel");
-		_solvedBy = LU;
-		Eigen::FullPivLU<Eigen::MatrixXd> lu(mMat);
-		if (lu.isInvertible()) {
-			aVec = lu.solve(bVec);
-		} else {
-			LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
-                                   "Unable to determine kernel via LU");
-			/* LAST RESORT */
-			try {
-
-				_solvedBy = EIGENVECTOR;
-				Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> eVecValues(mMat);
-				Eigen::MatrixXd const& rMat = eVecValues.eigenvectors();
-				Eigen::VectorXd eValues = eVecValues.eigenvalues();
-
-				for (int i = 0; i != eValues.rows(); ++i) {
-					if (eValues(i) != 0.0) {
-						eValues(i) = 1.0/eValues(i);
-					}
-				}
-
-				aVec = rMat * eValues.asDiagonal() * rMat.transpose() * bVec;
-			} catch (pexExcept::Exception& e) {
-
-				_solvedBy = NONE;
-				LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
-                                           "Unable to determine kernel via eigen-values");
-
-				throw LSST_EXCEPT(pexExcept::Exception, "Unable to determine kernel solution");
-			}
-		}
+        bool solved = false;
+        if (ldlt || !eigenSolver) {
+            _solvedBy = CHOLESKY_LDLT;
+            if (!ldlt) {
+                ldlt = std::make_shared<Eigen::LDLT<Eigen::MatrixXd> >(mMat);
+            }
+            double rCond = ldltRcond(*ldlt);
+            if (rCond > std::numeric_limits<double>::epsilon()) {
+                aVec = ldlt->solve(bVec);
+                solved = true;
+            } else {
+                LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
+                           "Unable to determine kernel via LDLT");
+            }
+            ldlt.reset();
+        }
+        if (!solved) {
+            /* LAST RESORT, unless the eigensystem is already at hand */
+            try {
+
+                _solvedBy = EIGENVECTOR;
+                if (!eigenSolver) {
+                    eigenSolver = std::make_shared<Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> >(mMat);
+                }
+                Eigen::MatrixXd const& rMat = eigenSolver->eigenvectors();
+                Eigen::VectorXd eValues = eigenSolver->eigenvalues();
+
+                for (int i = 0; i != eValues.rows(); ++i) {
+                    if (eValues(i) != 0.0) {
+                        eValues(i) = 1.0/eValues(i);
+                    }
+                }
+
+                aVec = rMat * eValues.asDiagonal() * rMat.transpose() * bVec;
+            } catch (pexExcept::Exception& e) {
+
+                _solvedBy = NONE;
+                LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
+                           "Unable to determine kernel via eigen-values");
+
+                throw LSST_EXCEPT(pexExcept::Exception, "Unable to determine kernel solution");
+            }
+        }
 
         double time = t.elapsed();
         LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
                    "Compute time for matrix math : %.2f s", time);
 
         if (DEBUG_MATRIX) {
-		  std::cout << "A " << std::endl;
+            std::cout << "A " << std::endl;
             std::cout << aVec << std::endl;
         }
 
@@ -247,6 +344,14 @@ namespace diffim {
         return _kSum;
     }
 
+    template <typename InputT>
+    double StaticKernelSolution<InputT>::getWeightedScienceNorm() {
+        if (_iVec.size() == 0) {
+            throw LSST_EXCEPT(pexExcept::Exception, "Kernel not built; cannot return science norm");
+        }
+        return (_iVec.array().square() * _ivVec.array()).sum();
+    }
+
     template <typename InputT>
     std::pair<std::shared_ptr<lsst::afw::math::Kernel>, double>
     StaticKernelSolution<InputT>::getSolutionPair() {
@@ -388,10 +493,31 @@ namespace diffim {
         _iVec = eigenScience.col(0);
 
         /* Make these outside of solve() so I can check condition number */
+        releaseDecomposition();
         _mMat = _cMat.transpose() * (_ivVec.asDiagonal() * _cMat);
         _bVec = _cMat.transpose() * (_ivVec.asDiagonal() * _iVec);
     }
 
+    template <typename InputT>
+    void StaticKernelSolution<InputT>::setNormalEquations(
+        Eigen::MatrixXd const& mMat,
+        Eigen::VectorXd const& bVec
+        ) {
+        int const nKernelParameters     =
+            std::dynamic_pointer_cast<afwMath::LinearCombinationKernel>(_kernel)->getKernelList().size();
+        int const nBackgroundParameters = _fitForBackground ? 1 : 0;
+        int const nParameters           = nKernelParameters + nBackgroundParameters;
+        if ((mMat.rows() != nParameters) || (mMat.cols() != nParameters) || (bVec.size() != nParameters)) {
+            throw LSST_EXCEPT(pexExcept::LengthError,
+                              str(boost::format("M (%d x %d) and B (%d) do not match %d parameters") %
+                                  mMat.rows() % mMat.cols() % bVec.size() % nParameters));
+        }
+        releaseDecomposition();
+        _mMat = mMat;
+        _bVec = bVec;
+        _solvedBy = KernelSolution::NONE;
+    }
+
     template <typename InputT>
     void StaticKernelSolution<InputT>::solve() {
         LOGL_DEBUG("TRACE3.ip.diffim.StaticKernelSolution.solve",
@@ -656,6 +782,7 @@ namespace diffim {
         this->_iVec = eigenScience;
 
         /* Make these outside of solve() so I can check condition number */
+        this->releaseDecomposition();
         this->_mMat = this->_cMat.transpose() * this->_ivVec.asDiagonal() * (this->_cMat);
         this->_bVec = this->_cMat.transpose() * this->_ivVec.asDiagonal() * (this->_iVec);
     }
@@ -817,6 +944,7 @@ namespace diffim {
         this->_iVec = eigenScience.col(0);
 
         /* Make these outside of solve() so I can check condition number */
+        this->releaseDecomposition();
         this->_mMat = this->_cMat.transpose() * this->_ivVec.asDiagonal() * this->_cMat;
         this->_bVec = this->_cMat.transpose() * this->_ivVec.asDiagonal() * this->_iVec;
 
@@ -1049,6 +1177,7 @@ namespace diffim {
         this->_iVec = eigenScience.col(0);
 
         /* Make these outside of solve() so I can check condition number */
+        this->releaseDecomposition();
         this->_mMat = this->_cMat.transpose() * this->_ivVec.asDiagonal() * this->_cMat;
         this->_bVec = this->_cMat.transpose() * this->_ivVec.asDiagonal() * this->_iVec;
     }
@@ -1064,10 +1193,24 @@ namespace diffim {
         )
         :
         StaticKernelSolution<InputT>(basisList, fitForBackground),
-        _hMat(hMat),
+        _hSparse(hMat.sparseView()),
         _ps(ps.deepCopy())
     {};
 
+    /*
+     * @brief Return M + lambda H
+     *
+     * @note This copies the dense M, which is O(N^2).  H is a finite difference
+     * operator with a few entries per row, so adding its sparse form only
+     * touches those nonzeros rather than making a second dense pass.
+     */
+    template <typename InputT>
+    Eigen::MatrixXd RegularizedKernelSolution<InputT>::_makeMLambda(double lambda) {
+        Eigen::MatrixXd mLambda = this->_mMat;
+        mLambda += lambda * _hSparse;
+        return mLambda;
+    }
+
     template <typename InputT>
     double RegularizedKernelSolution<InputT>::estimateRisk(double maxCond) {
         Eigen::MatrixXd vMat      = this->_cMat.jacobiSvd().matrixV();
@@ -1095,10 +1238,118 @@ namespace diffim {
         Eigen::MatrixXd mInv    = rMat * eValues.asDiagonal() * rMat.transpose();
 
         std::vector<double> lambdas = _createLambdaSteps();
+        if (lambdas.empty()) {
+            throw LSST_EXCEPT(pexExcept::Exception, "No lambda steps to estimate the risk at");
+        }
+
+        /*
+           Simultaneously diagonalize B = M + lambda0 H and H, with lambda0 the
+           smallest lambda of the scan: with B = L L^T and the eigensystem
+           L^{-1} H L^{-T} = Q diag(mu) Q^T, the matrix X = L^{-T} Q has
+
+              X^T B X = I  and  X^T H X = diag(mu)
+
+           so that for every lambda
+
+              (M + lambda H)^{-1} = X diag(1 / (1 + (lambda - lambda0) mu)) X^T
+
+           and, writing d for that diagonal, P = V V^T and b = C^T Y,
+
+              a       = X (d * X^T b)
+              a^T P a = (d * X^T b)^T (X^T P X) (d * X^T b)
+              Tr(P (M + lambda H)^{-1}) = sum_i d_i (X^T P X)_ii
+              a^T M^{-1} b = (d * X^T b)^T (X^T M^{-1} b)
+
+           After the O(N^3) decomposition, the risk at each lambda costs O(N^2)
+           (only for the first term; the trace and cross term are O(N)) rather
+           than an O(N^3) solve and inversion.  This requires B to be positive
+           definite; if it is not, fall back to solving at each lambda.
+        */
+        double const lambda0 = *std::min_element(lambdas.begin(), lambdas.end());
+        Eigen::LLT<Eigen::MatrixXd> lltB(_makeMLambda(lambda0));
         std::vector<double> risks;
+        if (lltB.info() == Eigen::Success) {
+            Eigen::MatrixXd lInvH = lltB.matrixL().solve(Eigen::MatrixXd(_hSparse));
+            Eigen::MatrixXd sMat  = lltB.matrixL().solve(lInvH.transpose());
+            Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> sEigen(0.5 * (sMat + sMat.transpose()));
+            Eigen::VectorXd const& mu = sEigen.eigenvalues();
+            Eigen::MatrixXd xMat  = lltB.matrixU().solve(sEigen.eigenvectors());
+
+            Eigen::VectorXd beta  = xMat.transpose() * this->_bVec;
+            Eigen::VectorXd gamma = xMat.transpose() * (mInv * this->_bVec);
+            Eigen::MatrixXd gMat  = xMat.transpose() * vMatvMatT * xMat;
+            Eigen::VectorXd gDiag = gMat.diagonal();
+
+            auto riskAt = [&](double l) {
+                Eigen::VectorXd dVec = (Eigen::VectorXd::Ones(mu.size()) + (l - lambda0) * mu).cwiseInverse();
+                Eigen::VectorXd yVec = dVec.cwiseProduct(beta);
+                double term1  = yVec.dot(gMat * yVec);
+                double term2a = dVec.dot(gDiag);
+                double term2b = yVec.dot(gamma);
+                LOGL_DEBUG("TRACE5.ip.diffim.RegularizedKernelSolution.estimateRisk",
+                           "%.5e + 2 * (%.5e - %.5e)",
+                           term1, term2a, term2b);
+                return term1 + 2 * (term2a - term2b);
+            };
+
+            for (unsigned int i = 0; i < lambdas.size(); i++) {
+                risks.push_back(riskAt(lambdas[i]));
+                LOGL_DEBUG("TRACE4.ip.diffim.RegularizedKernelSolution.estimateRisk",
+                           "Lambda = %.3f, Risk = %.5e",
+                           lambdas[i], risks[i]);
+            }
+            std::vector<double>::iterator it = min_element(risks.begin(), risks.end());
+            int index = distance(risks.begin(), it);
+
+            if (_ps->getAsBool("lambdaRefine") && (lambdas.size() > 1)) {
+                /* Golden-section search between the neighbours of the grid minimum, in the steps' units */
+                bool const logSteps = (_ps->getAsString("lambdaStepType") == "log");
+                auto toLambda = [&](double t) { return logSteps ? pow(10, t) : t; };
+                double lo = lambdas[std::max(index - 1, 0)];
+                double hi = lambdas[std::min(index + 1, static_cast<int>(lambdas.size()) - 1)];
+                if (logSteps) {
+                    lo = log10(lo);
+                    hi = log10(hi);
+                }
+                double const invPhi = 0.5 * (sqrt(5.0) - 1.0);
+                double t1 = hi - invPhi * (hi - lo);
+                double t2 = lo + invPhi * (hi - lo);
+                double r1 = riskAt(toLambda(t1));
+                double r2 = riskAt(toLambda(t2));
+                for (int i = 0; i < 40; i++) {
+                    if (r1 < r2) {
+                        hi = t2;
+                        t2 = t1;
+                        r2 = r1;
+                        t1 = hi - invPhi * (hi - lo);
+                        r1 = riskAt(toLambda(t1));
+                    } else {
+                        lo = t1;
+                        t1 = t2;
+                        r1 = r2;
+                        t2 = lo + invPhi * (hi - lo);
+                        r2 = riskAt(toLambda(t2));
+                    }
+                }
+                double tBest = (r1 < r2) ? t1 : t2;
+                double rBest = std::min(r1, r2);
+                if (rBest < risks[index]) {
+                    LOGL_DEBUG("TRACE3.ip.diffim.RegularizedKernelSolution.estimateRisk",
+                               "Minimum Risk = %.3e at refined lambda = %.3e", rBest, toLambda(tBest));
+                    return toLambda(tBest);
+                }
+            }
+
+            LOGL_DEBUG("TRACE3.ip.diffim.RegularizedKernelSolution.estimateRisk",
+                       "Minimum Risk = %.3e at lambda = %.3e", risks[index], lambdas[index]);
+            return lambdas[index];
+        }
+
+        LOGL_DEBUG("TRACE3.ip.diffim.RegularizedKernelSolution.estimateRisk",
+                   "M + %.3e H is not positive definite; solving at each lambda", lambda0);
         for (unsigned int i = 0; i < lambdas.size(); i++) {
             double l = lambdas[i];
-            Eigen::MatrixXd mLambda = this->_mMat + l * _hMat;
+            Eigen::MatrixXd mLambda = _makeMLambda(l);
 
             try {
                 KernelSolution::solve(mLambda, this->_bVec);
@@ -1137,7 +1388,7 @@ namespace diffim {
     template <typename InputT>
     Eigen::MatrixXd RegularizedKernelSolution<InputT>::getM(bool includeHmat) {
         if (includeHmat == true) {
-            return this->_mMat + _lambda * _hMat;
+            return _makeMLambda(_lambda);
         }
         else {
             return this->_mMat;
@@ -1150,7 +1401,7 @@ namespace diffim {
         LOGL_DEBUG("TRACE3.ip.diffim.RegularizedKernelSolution.solve",
                    "cMat is %d x %d; vVec is %d; iVec is %d; hMat is %d x %d",
                    this->_cMat.rows(), this->_cMat.cols(), this->_ivVec.size(),
-                   this->_iVec.size(), _hMat.rows(), _hMat.cols());
+                   this->_iVec.size(), _hSparse.rows(), _hSparse.cols());
 
         if (DEBUG_MATRIX2) {
             std::cout << "ID: " << (this->_id) << std::endl;
@@ -1161,10 +1412,11 @@ namespace diffim {
             std::cout << "Y:" << std::endl;
             std::cout << this->_iVec << std::endl;
             std::cout << "H:" << std::endl;
-            std::cout << _hMat << std::endl;
+            std::cout << Eigen::MatrixXd(_hSparse) << std::endl;
         }
 
 
+        this->releaseDecomposition();
         this->_mMat = this->_cMat.transpose() * this->_ivVec.asDiagonal() * this->_cMat;
         this->_bVec = this->_cMat.transpose() * this->_ivVec.asDiagonal() * this->_iVec;
 
@@ -1223,7 +1475,7 @@ namespace diffim {
             _lambda = _ps->getAsDouble("lambdaValue");
         }
         else if (lambdaType ==  "relative") {
-            _lambda  = this->_mMat.trace() / this->_hMat.trace();
+            _lambda  = this->_mMat.trace() / this->_hSparse.diagonal().sum();
             _lambda *= _ps->getAsDouble("lambdaScaling");
         }
         else if (lambdaType ==  "minimizeBiasedRisk") {
@@ -1240,9 +1492,10 @@ namespace diffim {
         LOGL_DEBUG("TRACE3.ip.diffim.RegularizedKernelSolution.solve",
                    "Applying kernel regularization with lambda = %.2e", _lambda);
 
-
+        /* A condition check decomposes M, but M + lambda H is solved */
+        this->releaseDecomposition();
         try {
-            KernelSolution::solve(this->_mMat + _lambda * _hMat, this->_bVec);
+            KernelSolution::solve(_makeMLambda(_lambda), this->_bVec);
         } catch (pexExcept::Exception &e) {
             LSST_EXCEPT_ADD(e, "Unable to solve static kernel matrix");
             throw e;
@@ -1257,17 +1510,17 @@ namespace diffim {
 
         std::string lambdaStepType = _ps->getAsString("lambdaStepType");
         if (lambdaStepType == "linear") {
-            double lambdaLinMin   = _ps->getAsDouble("lambdaLinMin");
-            double lambdaLinMax   = _ps->getAsDouble("lambdaLinMax");
-            double lambdaLinStep  = _ps->getAsDouble("lambdaLinStep");
+            double lambdaLinMin   = _ps->getAsDouble("lambdaMin");
+            double lambdaLinMax   = _ps->getAsDouble("lambdaMax");
+            double lambdaLinStep  = _ps->getAsDouble("lambdaStep");
             for (double l = lambdaLinMin; l <= lambdaLinMax; l += lambdaLinStep) {
                 lambdas.push_back(l);
             }
         }
         else if (lambdaStepType == "log") {
-            double lambdaLogMin   = _ps->getAsDouble("lambdaLogMin");
-            double lambdaLogMax   = _ps->getAsDouble("lambdaLogMax");
-            double lambdaLogStep  = _ps->getAsDouble("lambdaLogStep");
+            double lambdaLogMin   = _ps->getAsDouble("lambdaMin");
+            double lambdaLogMax   = _ps->getAsDouble("lambdaMax");
+            double lambdaLogStep  = _ps->getAsDouble("lambdaStep");
             for (double l = lambdaLogMin; l <= lambdaLogMax; l += lambdaLogStep) {
                 lambdas.push_back(pow(10, l));
             }
@@ -1341,6 +1594,8 @@ namespace diffim {
         LOGL_DEBUG("TRACE5.ip.diffim.SpatialKernelSolution.addConstraint",
                    "Adding candidate at %f, %f", xCenter, yCenter);
 
+        releaseDecomposition();
+
         /* Calculate P matrices */
         /* Pure kernel terms */
         Eigen::VectorXd pK(_nkt);
@@ -1459,6 +1714,8 @@ namespace diffim {
     }
 
     void SpatialKernelSolution::solve() {
+        releaseDecomposition();
+
         /* Fill in the other half of mMat */
         for (int i = 0; i < _nt; i++) {
             for (int j = i+1; j < _nt; j++) {
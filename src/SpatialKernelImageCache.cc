@@ -0,0 +1,159 @@
+// -*- lsst-c++ -*-
+/**
+ * @file SpatialKernelImageCache.cc
+ *
+ * @brief Implementation of SpatialKernelImageCache
+ *
+ * @ingroup ip_diffim
+ */
+
+#include "lsst/afw/math.h"
+#include "lsst/afw/image.h"
+#include "lsst/log/Log.h"
+#include "lsst/pex/exceptions/Runtime.h"
+
+#include "lsst/ip/diffim/SpatialKernelImageCache.h"
+
+namespace afwMath        = lsst::afw::math;
+namespace afwImage       = lsst::afw::image;
+namespace geom           = lsst::geom;
+namespace pexExcept      = lsst::pex::exceptions;
+
+namespace lsst {
+namespace ip {
+namespace diffim {
+    /**
+     * @class SpatialKernelImageCache
+     * @ingroup ip_diffim
+     *
+     * @brief Shares the evaluations of a spatial solution between its consumers
+     *
+     * @code
+        SpatialKernelImageCache cache(spatialKernel, spatialBackground);
+        std::shared_ptr<afwMath::Kernel> kernel = cache.getKernel(x, y);
+        double background = cache.getBackground(x, y);
+        MaskedImageT diffim = kCandidate->getDifferenceImage(kernel, background);
+     * @endcode
+     *
+     * @note Positions are matched exactly, which is the case for the centers of
+     * KernelCandidates and for the points returned by fillGrid().
+     *
+     * @note The images returned by getKernelImage() are copies, and may be modified;
+     * the kernels returned by getKernel() are shared with the cache.
+     */
+    SpatialKernelImageCache::SpatialKernelImageCache(
+        std::shared_ptr<afwMath::LinearCombinationKernel> spatialKernel,
+        afwMath::Kernel::SpatialFunctionPtr spatialBackground
+        ) :
+        _spatialKernel(spatialKernel),
+        _spatialBackground(spatialBackground),
+        _kernelParameters(),
+        _backgroundParameters(),
+        _entries()
+    {
+        if (!_spatialKernel) {
+            throw LSST_EXCEPT(pexExcept::InvalidParameterError, "No spatial kernel");
+        }
+    };
+
+    std::shared_ptr<afwMath::Kernel> SpatialKernelImageCache::getKernel(double x, double y) {
+        return _getEntry(x, y).kernel;
+    }
+
+    std::shared_ptr<afwImage::Image<double>> SpatialKernelImageCache::getKernelImage(double x, double y) {
+        std::shared_ptr<afwMath::Kernel> kernel = _getEntry(x, y).kernel;
+        auto kImage = std::make_shared<afwImage::Image<double>>(kernel->getDimensions());
+        kernel->computeImage(*kImage, false);
+        return kImage;
+    }
+
+    double SpatialKernelImageCache::getKernelSum(double x, double y) {
+        return _getEntry(x, y).kSum;
+    }
+
+    double SpatialKernelImageCache::getBackground(double x, double y) {
+        return _getEntry(x, y).background;
+    }
+
+    /**
+     * @brief Evaluate the solution at the centers of an nx by ny grid of cells covering bbox
+     *
+     * @return The positions of the grid, row by row
+     */
+    std::vector<geom::Point2D> SpatialKernelImageCache::fillGrid(
+        geom::Box2I const& bbox,
+        int nx,
+        int ny
+        ) {
+        if ((nx < 1) || (ny < 1)) {
+            throw LSST_EXCEPT(pexExcept::InvalidParameterError, "Grid needs at least one cell per side");
+        }
+        geom::Box2D box(bbox);
+        double dx = box.getWidth() / nx;
+        double dy = box.getHeight() / ny;
+
+        std::vector<geom::Point2D> positions;
+        positions.reserve(nx * ny);
+        for (int j = 0; j < ny; ++j) {
+            double y = box.getMinY() + (j + 0.5) * dy;
+            for (int i = 0; i < nx; ++i) {
+                double x = box.getMinX() + (i + 0.5) * dx;
+                _getEntry(x, y);
+                positions.push_back(geom::Point2D(x, y));
+            }
+        }
+        return positions;
+    }
+
+    void SpatialKernelImageCache::clear() {
+        _entries.clear();
+        _kernelParameters.clear();
+        _backgroundParameters.clear();
+    }
+
+    /*
+       Empty the cache if the solution has been modified since the cached
+       entries were evaluated
+    */
+    void SpatialKernelImageCache::_checkSolution() {
+        std::vector<std::vector<double>> kernelParameters;
+        if (_spatialKernel->isSpatiallyVarying()) {
+            kernelParameters = _spatialKernel->getSpatialParameters();
+        } else {
+            kernelParameters.push_back(_spatialKernel->getKernelParameters());
+        }
+        std::vector<double> backgroundParameters;
+        if (_spatialBackground) {
+            backgroundParameters = _spatialBackground->getParameters();
+        }
+
+        if ((kernelParameters != _kernelParameters) || (backgroundParameters != _backgroundParameters)) {
+            if (!_entries.empty()) {
+                LOGL_DEBUG("TRACE3.ip.diffim.SpatialKernelImageCache._checkSolution",
+                           "Spatial solution changed; clearing %d cached evaluations",
+                           static_cast<int>(_entries.size()));
+            }
+            _entries.clear();
+            _kernelParameters.swap(kernelParameters);
+            _backgroundParameters.swap(backgroundParameters);
+        }
+    }
+
+    SpatialKernelImageCache::Entry const& SpatialKernelImageCache::_getEntry(double x, double y) {
+        _checkSolution();
+
+        std::pair<double, double> key(x, y);
+        auto found = _entries.find(key);
+        if (found != _entries.end()) {
+            return found->second;
+        }
+
+        afwImage::Image<double> kImage(_spatialKernel->getDimensions());
+        Entry entry;
+        entry.kSum = _spatialKernel->computeImage(kImage, false, x, y);
+        entry.kernel = std::make_shared<afwMath::FixedKernel>(kImage);
+        entry.background = _spatialBackground ? (*_spatialBackground)(x, y) : 0.0;
+        return _entries.emplace(key, entry).first->second;
+    }
+
+}}} // end of namespace lsst::ip::diffim
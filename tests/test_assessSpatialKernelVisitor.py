@@ -118,6 +118,74 @@ class DiffimTestCases(unittest.TestCase):
         self.assertEqual(askv.getNRejected(), 1)
         self.assertEqual(kc.getStatus(), afwMath.SpatialCellCandidate.BAD)
 
+    def testKernelImageCache(self):
+        sKernel = self.makeSpatialKernel(2)
+        sBg = afwMath.PolynomialFunction2D(1)
+        sBg.setParameters([1., 0.1, 0.2])
+        cache = ipDiffim.SpatialKernelImageCache(sKernel, sBg)
+
+        kImage = afwImage.ImageD(sKernel.getDimensions())
+        kSum = sKernel.computeImage(kImage, False, 30., 40.)
+        num.testing.assert_array_equal(cache.getKernelImage(30., 40.).getArray(), kImage.getArray())
+        self.assertEqual(cache.getKernelSum(30., 40.), kSum)
+        self.assertAlmostEqual(cache.getBackground(30., 40.), 1. + 3. + 8.)
+        self.assertEqual(len(cache), 1)
+
+        # Returned images are copies
+        cache.getKernelImage(30., 40.).set(0.)
+        num.testing.assert_array_equal(cache.getKernelImage(30., 40.).getArray(), kImage.getArray())
+        cache.getKernel(30., 40.).computeImage(kImage, False)
+        num.testing.assert_array_equal(cache.getKernelImage(30., 40.).getArray(), kImage.getArray())
+        self.assertEqual(len(cache), 1)
+
+        positions = cache.fillGrid(geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(100, 50)), 2, 1)
+        self.assertEqual([(p.getX(), p.getY()) for p in positions], [(24.5, 24.5), (74.5, 24.5)])
+        self.assertEqual(len(cache), 3)
+
+        # A new solution empties the cache
+        sBg.setParameters([2., 0.1, 0.2])
+        self.assertAlmostEqual(cache.getBackground(30., 40.), 2. + 3. + 8.)
+        self.assertEqual(len(cache), 1)
+        kCoeffs = sKernel.getSpatialParameters()
+        kCoeffs[1][0] = 0.5
+        sKernel.setSpatialParameters(kCoeffs)
+        sKernel.computeImage(kImage, False, 30., 40.)
+        num.testing.assert_array_equal(cache.getKernelImage(30., 40.).getArray(), kImage.getArray())
+
+    def testSharedCache(self):
+        ti = afwImage.MaskedImageF(geom.Extent2I(100, 100))
+        ti.getVariance().set(0.1)
+        ti[50, 50, afwImage.LOCAL] = (1., 0x0, 1.)
+        sKernel = self.makeSpatialKernel(2)
+        si = afwImage.MaskedImageF(ti.getDimensions())
+        afwMath.convolve(si, ti, sKernel, True)
+
+        bbox = geom.Box2I(geom.Point2I(25, 25),
+                          geom.Point2I(75, 75))
+        si = afwImage.MaskedImageF(si, bbox, origin=afwImage.LOCAL)
+        ti = afwImage.MaskedImageF(ti, bbox, origin=afwImage.LOCAL)
+        kc = ipDiffim.KernelCandidateF(50., 50., ti, si, self.ps)
+
+        sBg = afwMath.PolynomialFunction2D(1)
+        sBg.setParameters([0., 0., 0.])
+
+        bskv = ipDiffim.BuildSingleKernelVisitorF(self.kList, self.ps)
+        bskv.processCandidate(kc)
+
+        cache = ipDiffim.SpatialKernelImageCache(sKernel, sBg)
+        askv = ipDiffim.AssessSpatialKernelVisitorF(cache, self.ps)
+        askv.processCandidate(kc)
+        self.assertEqual(askv.getNRejected(), 0)
+        self.assertEqual(kc.getStatus(), afwMath.SpatialCellCandidate.GOOD)
+
+        # The evaluation at the candidate is available to the other consumers
+        self.assertIs(askv.getKernelImageCache(), cache)
+        self.assertEqual(len(cache), 1)
+        kernel = cache.getKernel(kc.getXCenter(), kc.getYCenter())
+        self.assertEqual(len(cache), 1)
+        diffim = kc.getDifferenceImage(kernel, cache.getBackground(kc.getXCenter(), kc.getYCenter()))
+        self.assertEqual(diffim.getDimensions(), ti.getDimensions())
+
 
 #####
 
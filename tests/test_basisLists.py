@@ -214,6 +214,47 @@ class DiffimTestCases(unittest.TestCase):
         except lsst.pex.exceptions.Exception as e:
             self.fail("Should not raise %s: order 1,2 allowed"%e)
 
+    def testRegularizationMatrix(self):
+        # Laplacian in the interior, border penalty on the edges, nothing on the background
+        bMat = ipDiffim.makeCentralDifferenceMatrix(5, 5, 5, 2.0, True)
+        self.assertEqual(bMat.shape, (26, 26))
+        expected = num.zeros(26)
+        expected[[7, 11, 13, 17]] = 1.
+        expected[12] = -4.
+        num.testing.assert_array_equal(bMat[12], expected)
+        expected = num.zeros(26)
+        expected[0] = 2.
+        num.testing.assert_array_equal(bMat[0], expected)
+        num.testing.assert_array_equal(bMat[25], 0.)
+        num.testing.assert_array_equal(bMat[:, 25], 0.)
+
+        # The two directions of each order are summed on the diagonal
+        bMat = ipDiffim.makeForwardDifferenceMatrix(5, 5, [1, 2], 0.0, False)
+        self.assertEqual(bMat[0, 0], -4.)
+        self.assertEqual(bMat[0, 1], 3.)
+        self.assertEqual(bMat[0, 5], 3.)
+
+        self.subconfigDF.kernelSize = 5
+        for regularizationType in ("centralDifference", "forwardDifference"):
+            self.subconfigDF.regularizationType = regularizationType
+            ps = pexConfig.makePropertySet(self.subconfigDF)
+            if regularizationType == "centralDifference":
+                bMat = ipDiffim.makeCentralDifferenceMatrix(5, 5, ps["centralRegularizationStencil"],
+                                                            ps["regularizationBorderPenalty"],
+                                                            ps["fitForBackground"])
+            else:
+                bMat = ipDiffim.makeForwardDifferenceMatrix(5, 5, ps.getArray("forwardRegularizationOrders"),
+                                                            ps["regularizationBorderPenalty"],
+                                                            ps["fitForBackground"])
+            num.testing.assert_allclose(ipDiffim.makeRegularizationMatrix(ps), bMat.T @ bMat)
+
+            # Tasks with the same kernel parameters share one matrix
+            task1 = ipDiffim.ImagePsfMatchTask(config=self.configDF)
+            task2 = ipDiffim.ImagePsfMatchTask(config=self.configDF)
+            self.assertIs(task1.hMat, task2.hMat)
+            self.assertFalse(task1.hMat.flags.writeable)
+            num.testing.assert_allclose(task1.hMat, bMat.T @ bMat)
+
     def testBadRegularization(self):
         with self.assertRaises(lsst.pex.exceptions.Exception):
             self.psDF["regularizationType"] = "foo"
@@ -24,6 +24,7 @@ from astropy.coordinates import SkyCoord, EarthLocation, Angle
 from astropy.time import Time
 import numpy as np
 from scipy import ndimage
+import tempfile
 import unittest
 
 from astro_metadata_translator import makeObservationInfo
@@ -34,8 +35,8 @@ import lsst.afw.image.utils as afwImageUtils
 import lsst.afw.math as afwMath
 import lsst.geom as geom
 from lsst.geom import arcseconds, degrees, radians, arcminutes
-from lsst.ip.diffim.dcrModel import (DcrModel, calculateDcr, calculateImageParallacticAngle,
-                                     applyDcr, wavelengthGenerator)
+from lsst.ip.diffim.dcrModel import (DcrModel, calculateDcr, calculateDcrArray,
+                                     calculateImageParallacticAngle, applyDcr, wavelengthGenerator)
 from lsst.obs.base import MakeRawVisitInfoViaObsInfo
 from lsst.meas.algorithms.testUtils import plantSources
 import lsst.utils.tests
@@ -278,6 +279,57 @@ class DcrModelTestTask(lsst.utils.tests.TestCase):
             self.assertFloatsAlmostEqual(shiftOld[1], shiftNew[1], rtol=1e-6, atol=1e-8)
             self.assertFloatsAlmostEqual(shiftOld[0], shiftNew[0], rtol=1e-6, atol=1e-8)
 
+    @staticmethod
+    def calculateDcrPerVisit(visitInfo, wcs, filterInfo, dcrNumSubfilters, splitSubfilters=False):
+        """Calculate the DCR shifts of one visit with a loop over subfilters,
+        independently of `calculateDcrArray`.
+        """
+        rotation = calculateImageParallacticAngle(visitInfo, wcs).asRadians()
+        pixelScale = wcs.getPixelScale().asArcseconds()
+        lambdaEff = filterInfo.getFilterProperty().getLambdaEff()
+        weight = [0.75, 0.25]
+        dcrShift = []
+        for wl0, wl1 in wavelengthGenerator(filterInfo, dcrNumSubfilters):
+            diffRefractPix = [differentialRefraction(wavelength=wl, wavelengthRef=lambdaEff,
+                                                     elevation=visitInfo.getBoresightAzAlt().getLatitude(),
+                                                     observatory=visitInfo.getObservatory(),
+                                                     weather=visitInfo.getWeather()).asArcseconds()/pixelScale
+                              for wl in (wl0, wl1)]
+            if splitSubfilters:
+                diffRefractArr = [diffRefractPix[0]*weight[0] + diffRefractPix[1]*weight[1],
+                                  diffRefractPix[0]*weight[1] + diffRefractPix[1]*weight[0]]
+                dcrShift.append([(pix*np.cos(rotation), pix*np.sin(rotation)) for pix in diffRefractArr])
+            else:
+                pix = (diffRefractPix[0] + diffRefractPix[1])/2.
+                dcrShift.append((pix*np.cos(rotation), pix*np.sin(rotation)))
+        return np.array(dcrShift)
+
+    def testDcrArrayCalculation(self):
+        """Test that DCR shifts for many visits match a per-visit calculation.
+        """
+        afwImageUtils.defineFilter("gTest", self.lambdaEff,
+                                   lambdaMin=self.lambdaMin, lambdaMax=self.lambdaMax)
+        filterInfo = afwImage.Filter("gTest")
+        pixelScale = 0.2*arcseconds
+        visitInfoList = []
+        wcsList = []
+        for testIter in range(self.nRandIter):
+            rotAngle = 360.*self.rng.rand()*degrees
+            azimuth = 360.*self.rng.rand()*degrees
+            elevation = (45. + self.rng.rand()*40.)*degrees  # Restrict to 45 < elevation < 85 degrees
+            visitInfo = self.makeDummyVisitInfo(azimuth, elevation)
+            visitInfoList.append(visitInfo)
+            wcsList.append(self.makeDummyWcs(rotAngle, pixelScale, crval=visitInfo.getBoresightRaDec()))
+        for splitSubfilters in [False, True]:
+            dcrShifts = calculateDcrArray(visitInfoList, wcsList, filterInfo, self.dcrNumSubfilters,
+                                          splitSubfilters=splitSubfilters)
+            refShape = (self.nRandIter, self.dcrNumSubfilters) + ((2, 2) if splitSubfilters else (2,))
+            self.assertEqual(dcrShifts.shape, refShape)
+            for visitInfo, wcs, dcrShift in zip(visitInfoList, wcsList, dcrShifts):
+                refShift = self.calculateDcrPerVisit(visitInfo, wcs, filterInfo, self.dcrNumSubfilters,
+                                                     splitSubfilters=splitSubfilters)
+                self.assertFloatsAlmostEqual(refShift, dcrShift, rtol=1e-10, atol=1e-12)
+
     def testCoordinateTransformDcrCalculation(self):
         """Check the DCR calculation using astropy coordinate transformations.
 
@@ -536,6 +588,90 @@ class DcrModelTestTask(lsst.utils.tests.TestCase):
         # Negative indices are allowed, so check that those return models from the end.
         self.assertFloatsEqual(refVals[-1], np.sum(dcrModels[-1].array))
 
+    def testPrefilterCache(self):
+        """Test that cached prefiltered planes match and are invalidated.
+        """
+        dcrModels = DcrModel(modelImages=self.makeTestImages())
+        subfilter = 1
+        refImage = ndimage.spline_filter(dcrModels[subfilter].array, order=3)
+        prefilteredImage = dcrModels.getPrefilteredImage(subfilter, self.bbox, order=3)
+        self.assertFloatsAlmostEqual(refImage, prefilteredImage)
+        # A repeated call should return the cached array.
+        self.assertIs(prefilteredImage, dcrModels.getPrefilteredImage(subfilter, self.bbox, order=3))
+        # Replacing a subfilter must invalidate its cached planes.
+        newModel = dcrModels[subfilter].clone()
+        newModel.array[:] *= 2.
+        dcrModels[subfilter] = newModel
+        self.assertFloatsAlmostEqual(2.*refImage, dcrModels.getPrefilteredImage(subfilter, self.bbox),
+                                     rtol=1e-6)
+
+    def testPrefilterCacheBound(self):
+        """Test that cached prefiltered planes are read-only, and that only
+        the most recently used regions are kept.
+        """
+        dcrModels = DcrModel(modelImages=self.makeTestImages())
+        prefilteredImage = dcrModels.getPrefilteredImage(0, self.bbox)
+        self.assertFalse(prefilteredImage.flags.writeable)
+        with self.assertRaises(ValueError):
+            prefilteredImage[0, 0] = 0.
+        maxEntries = dcrModels.cachedRegions*len(dcrModels)
+        for shrink in range(dcrModels.cachedRegions + 1):
+            subBBox = geom.Box2I(self.bbox)
+            subBBox.grow(-shrink)
+            for subfilter in range(len(dcrModels)):
+                dcrModels.getPrefilteredImage(subfilter, subBBox)
+            self.assertLessEqual(len(dcrModels._prefilterCache), maxEntries)
+        # The least recently used region was discarded
+        self.assertIsNot(prefilteredImage, dcrModels.getPrefilteredImage(0, self.bbox))
+        self.assertFloatsAlmostEqual(prefilteredImage, dcrModels.getPrefilteredImage(0, self.bbox))
+
+    def testFourierCache(self):
+        """Test that cached Fourier planes are read-only and bounded.
+        """
+        dcrModels = DcrModel(modelImages=self.makeTestImages())
+        fourierImage = dcrModels.getFourierImage(0, self.bbox, padding=4)
+        self.assertFalse(fourierImage.flags.writeable)
+        self.assertFloatsAlmostEqual(fourierImage,
+                                     np.fft.rfft2(np.pad(dcrModels[0].array, 4, mode='constant')))
+        self.assertIs(fourierImage, dcrModels.getFourierImage(0, self.bbox, padding=4))
+        maxEntries = dcrModels.cachedRegions*len(dcrModels)
+        for padding in range(dcrModels.cachedRegions + 1):
+            for subfilter in range(len(dcrModels)):
+                dcrModels.getFourierImage(subfilter, self.bbox, padding=padding)
+            self.assertLessEqual(len(dcrModels._fourierCache), maxEntries)
+        self.assertIsNot(fourierImage, dcrModels.getFourierImage(0, self.bbox, padding=4))
+
+    def testFourierMatchedTemplate(self):
+        """Test that the Fourier engine matches spline shifts for whole pixels.
+        """
+        dcrModels = DcrModel(modelImages=self.makeTestImages())
+        dcrShift = [(2., -1.), (0., 0.), (-1., 3.)]
+        splineTemplate = dcrModels.buildMatchedTemplate(bbox=self.bbox, dcrShift=dcrShift,
+                                                        splitSubfilters=False)
+        fourierTemplate = dcrModels.buildMatchedTemplate(bbox=self.bbox, dcrShift=dcrShift,
+                                                         splitSubfilters=False, useFourier=True)
+        self.assertFloatsAlmostEqual(splineTemplate.array, fourierTemplate.array, atol=1e-3)
+
+    def testArraysRoundTrip(self):
+        """Test that a model written as arrays can be read back by sub-region.
+        """
+        modelImages = self.makeTestImages()
+        variance = afwImage.ImageF(self.bbox)
+        variance.array[:] = self.rng.rand(*variance.array.shape)
+        dcrModels = DcrModel(modelImages=modelImages, mask=self.mask, variance=variance)
+        subBBox = geom.Box2I(self.bbox.getBegin() + geom.Extent2I(3, 5), geom.Extent2I(20, 17))
+        with tempfile.TemporaryDirectory() as directory:
+            dcrModels.writeArrays(directory)
+            newModels = DcrModel.fromArrays(directory, bbox=subBBox)
+            self.assertEqual(newModels.bbox, subBBox)
+            self.assertEqual(len(newModels), len(dcrModels))
+            for refModel, newModel in zip(dcrModels, newModels):
+                self.assertFloatsEqual(refModel[subBBox].array, newModel.array)
+            self.assertFloatsEqual(self.mask[subBBox].array, newModels.mask.array)
+            self.assertFloatsEqual(variance[subBBox].array, newModels.variance.array)
+            with self.assertRaises(ValueError):
+                DcrModel.fromArrays(directory, bbox=geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(5, 5)))
+
 
 def calculateAstropyDcr(visitInfo, wcs, filterInfo, dcrNumSubfilters):
     """Calculate the DCR shift using astropy coordinate transformations.
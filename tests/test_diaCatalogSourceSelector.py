@@ -118,6 +118,25 @@ class DiaCatalogSourceSelectorTest(lsst.utils.tests.TestCase):
             sources = self.sourceSelector.run(self.srcCat, matches=matches, exposure=self.exposure).sourceCat
             self.assertEqual(len(sources), nSrc-4)
 
+    def testNaN(self):
+        """Test that a NaN flux passes the flux limits, and a NaN color fails the color cut.
+        """
+        nSrc = 3
+        config = ipDiffim.DiaCatalogSourceSelectorTask.ConfigClass()
+        config.fluxLim = 5.
+        config.fluxMax = 20.
+        self.sourceSelector = ipDiffim.DiaCatalogSourceSelectorTask(config=config)
+
+        refCat = self.makeRefCatalog()
+        matches = self.makeMatches(refCat, self.srcCat, nSrc)
+        matches[0].second.set("slot_PsfFlux_instFlux", np.nan)
+        matches[1].first.set(getRefFluxField(refCat.schema, "g"), np.nan)
+        sources = self.sourceSelector.run(self.srcCat, matches=matches, exposure=self.exposure).sourceCat
+        self.assertEqual(len(sources), nSrc-1)
+        selectedIds = [source.getId() for source in sources]
+        self.assertIn(matches[0].second.getId(), selectedIds)
+        self.assertNotIn(matches[1].second.getId(), selectedIds)
+
 
 class TestMemory(lsst.utils.tests.MemoryTestCase):
     pass
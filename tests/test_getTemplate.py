@@ -0,0 +1,303 @@
+# This file is part of ip_diffim.
+#
+# LSST Data Management System
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+
+from collections import Counter
+import time
+import unittest
+
+import numpy as np
+
+import lsst.afw.geom as afwGeom
+import lsst.afw.image as afwImage
+import lsst.geom as geom
+import lsst.meas.algorithms as measAlg
+import lsst.pipe.base as pipeBase
+import lsst.utils.tests
+from lsst.ip.diffim.getTemplate import TemplatePatchCache, GetCoaddAsTemplateTask
+
+try:
+    from lsst.skymap import DiscreteSkyMap
+except ImportError:
+    DiscreteSkyMap = None
+
+
+class TemplatePatchCacheTest(lsst.utils.tests.TestCase):
+    """Tests of the least-recently-used cache of template patches.
+    """
+
+    def setUp(self):
+        self.bbox = geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(20, 10))
+        self.patchSize = TemplatePatchCache.getExposureSize(afwImage.ExposureF(self.bbox))
+
+    def makeKey(self, patch, subfilter=None):
+        return (0, "%d,0" % patch, "deepCoadd_sub", subfilter)
+
+    def testEviction(self):
+        """Test that the least recently used patch is evicted first.
+        """
+        cache = TemplatePatchCache(2*self.patchSize)
+        cache.put(self.makeKey(0), afwImage.ExposureF(self.bbox))
+        cache.put(self.makeKey(1), afwImage.ExposureF(self.bbox))
+        self.assertIsNotNone(cache.get(self.makeKey(0)))
+        cache.put(self.makeKey(2), afwImage.ExposureF(self.bbox))
+        self.assertEqual(len(cache), 2)
+        self.assertIn(self.makeKey(0), cache)
+        self.assertNotIn(self.makeKey(1), cache)
+        self.assertIn(self.makeKey(2), cache)
+        self.assertIsNone(cache.get(self.makeKey(1)))
+        self.assertEqual(cache.nBytes, 2*self.patchSize)
+
+    def testOversizedPatch(self):
+        """Test that patches larger than the memory budget are not cached.
+        """
+        cache = TemplatePatchCache(self.patchSize - 1)
+        cache.put(self.makeKey(0), afwImage.ExposureF(self.bbox))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nBytes, 0)
+
+    def testReplace(self):
+        """Test that adding an existing key does not double count its size.
+        """
+        cache = TemplatePatchCache(3*self.patchSize)
+        cache.put(self.makeKey(0, subfilter=1), afwImage.ExposureF(self.bbox))
+        cache.put(self.makeKey(0, subfilter=1), afwImage.ExposureF(self.bbox))
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.nBytes, self.patchSize)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nBytes, 0)
+
+
+class GetCoaddAsTemplateThreadsTest(lsst.utils.tests.TestCase):
+    """Tests that reading patches concurrently does not change the template.
+    """
+
+    class FakeTract:
+        def getId(self):
+            return 0
+
+    def makeReadPlan(self, nPatches):
+        """Make a read plan of overlapping patches along x.
+        """
+        patchArgList = []
+        for i in range(nPatches):
+            patchBBox = geom.Box2I(geom.Point2I(15*i, 0), geom.Extent2I(20, 10))
+            patchArgList.append((None, dict(datasetType="deepCoadd_sub", bbox=patchBBox, tract=0,
+                                            patch="%d,0" % i, numSubfilters=3)))
+        coaddBBox = geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(15*nPatches + 5, 10))
+        return pipeBase.Struct(tractInfo=self.FakeTract(), coaddWcs=None, coaddBBox=coaddBBox,
+                               patchArgList=patchArgList, patchExists={}, patchReadBBoxes={})
+
+    @staticmethod
+    def getPatchExposure(sensorRef, patchInfo, patchArgDict, readPlan, visitInfo):
+        """Return a patch filled with its index, later patches finishing first.
+        """
+        index = int(patchArgDict["patch"].split(",")[0])
+        time.sleep(0.01*(len(readPlan.patchArgList) - index))
+        if index == 2:
+            return None
+        patch = afwImage.ExposureF(patchArgDict["bbox"])
+        patch.image.array[:, :] = index
+        patch.setPsf(measAlg.DoubleGaussianPsf(11, 11, 2.0 + index))
+        return patch
+
+    def runTask(self, numPatchThreads, readPlan):
+        config = GetCoaddAsTemplateTask.ConfigClass()
+        config.numPatchThreads = numPatchThreads
+        task = GetCoaddAsTemplateTask(config=config)
+        task._getPatchExposure = self.getPatchExposure
+        exposure = afwImage.ExposureF(geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(10, 10)))
+        return task.run(exposure, None, readPlan=readPlan).exposure
+
+    def testThreads(self):
+        """Test that the template is the same whether patches are read
+        serially or concurrently.
+        """
+        readPlan = self.makeReadPlan(5)
+        serial = self.runTask(1, readPlan)
+        threaded = self.runTask(4, readPlan)
+        self.assertMaskedImagesEqual(threaded.maskedImage, serial.maskedImage)
+        self.assertEqual(threaded.getPsf().computeShape().getDeterminantRadius(),
+                         serial.getPsf().computeShape().getDeterminantRadius())
+        # Overlaps hold the later patch, and the missing patch is left as NO_DATA
+        np.testing.assert_array_equal(serial.image.array[0, 15:20], 1)
+        np.testing.assert_array_equal(serial.image.array[0, 30:35], 1)
+        self.assertTrue(np.all(np.isnan(serial.image.array[0, 35:45])))
+        np.testing.assert_array_equal(serial.image.array[0, 45:], 3 + (np.arange(35) >= 15))
+
+
+class FakeSensorRef:
+    """A data reference that returns a sky map, and counts the checks of
+    whether each patch exists.
+    """
+
+    def __init__(self, skyMap):
+        self.skyMap = skyMap
+        self.existsCalls = Counter()
+
+    def get(self, datasetType=None, **kwargs):
+        return self.skyMap
+
+    def datasetExists(self, **kwargs):
+        self.existsCalls[(kwargs["tract"], kwargs["patch"])] += 1
+        return True
+
+
+@unittest.skipIf(DiscreteSkyMap is None, "skymap is not set up")
+class PlanVisitReadsTest(lsst.utils.tests.TestCase):
+    """Tests of the template read plans of the CCDs of a visit.
+    """
+
+    def setUp(self):
+        config = DiscreteSkyMap.ConfigClass()
+        config.raList = [10.]
+        config.decList = [0.]
+        config.radiusList = [0.1]
+        config.pixelScale = 0.2
+        config.patchInnerDimensions = (1000, 1000)
+        config.patchBorder = 50
+        self.skyMap = DiscreteSkyMap(config)
+        self.bbox = geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(1200, 400))
+        self.task = GetCoaddAsTemplateTask()
+
+    def makeWcs(self, crpix):
+        cdMatrix = afwGeom.makeCdMatrix(scale=0.2*geom.arcseconds)
+        crval = geom.SpherePoint(10., 0., geom.degrees)
+        return afwGeom.makeSkyWcs(crpix=crpix, crval=crval, cdMatrix=cdMatrix)
+
+    def testPlanVisitReads(self):
+        """Test that two overlapping CCDs check each patch once, and read the
+        union of the regions they need.
+        """
+        sensorRef = FakeSensorRef(self.skyMap)
+        wcsList = [self.makeWcs(geom.Point2D(600, 200)), self.makeWcs(geom.Point2D(-300, 200))]
+        bboxList = [self.bbox, self.bbox]
+        readPlans = self.task.planVisitReads(sensorRef, wcsList, bboxList)
+        self.assertEqual(len(readPlans), 2)
+
+        expectedReadBBoxes = {}
+        patchKeys = []
+        for readPlan, wcs, bbox in zip(readPlans, wcsList, bboxList):
+            ccdReadPlan = self.task.makeReadPlan(self.skyMap, wcs, bbox)
+            self.assertEqual(readPlan.coaddBBox, ccdReadPlan.coaddBBox)
+            self.assertEqual([patchArgDict for _, patchArgDict in readPlan.patchArgList],
+                             [patchArgDict for _, patchArgDict in ccdReadPlan.patchArgList])
+            keys = set()
+            for _, patchArgDict in readPlan.patchArgList:
+                key = (patchArgDict["tract"], patchArgDict["patch"])
+                expectedReadBBoxes.setdefault(key, geom.Box2I()).include(patchArgDict["bbox"])
+                keys.add(key)
+            self.assertGreater(len(keys), 1)
+            patchKeys.append(keys)
+        # The CCDs share at least one patch
+        self.assertTrue(patchKeys[0] & patchKeys[1])
+
+        for readPlan in readPlans:
+            self.assertEqual(readPlan.patchReadBBoxes, expectedReadBBoxes)
+            self.assertEqual(readPlan.patchExists, {key: True for key in expectedReadBBoxes})
+        self.assertEqual(sensorRef.existsCalls, Counter(expectedReadBBoxes.keys()))
+
+
+class PatchSensorRef:
+    """A data reference that serves cut-outs of one full patch, and records
+    the arguments of each call to ``get``.
+    """
+
+    def __init__(self, fullPatch):
+        self.fullPatch = fullPatch
+        self.getCalls = []
+
+    def get(self, datasetType, **kwargs):
+        self.getCalls.append(dict(kwargs, datasetType=datasetType))
+        if datasetType.endswith("_sub"):
+            return afwImage.ExposureF(self.fullPatch, kwargs["bbox"], deep=True)
+        return afwImage.ExposureF(self.fullPatch, deep=True)
+
+
+class ReadPatchTest(lsst.utils.tests.TestCase):
+    """Tests of reading patch cut-outs through the patch cache.
+    """
+
+    def setUp(self):
+        self.patchBBox = geom.Box2I(geom.Point2I(100, 200), geom.Extent2I(40, 30))
+        self.fullPatch = afwImage.ExposureF(self.patchBBox)
+        y, x = np.indices(self.fullPatch.image.array.shape)
+        self.fullPatch.image.array[:, :] = 1000*y + x
+        self.sensorRef = PatchSensorRef(self.fullPatch)
+        config = GetCoaddAsTemplateTask.ConfigClass()
+        config.patchCacheSize = 1.
+        self.task = GetCoaddAsTemplateTask(config=config)
+
+    def makePatchArgDict(self, bbox):
+        return dict(datasetType="deepCoadd_sub", bbox=bbox, tract=0, patch="1,2", numSubfilters=3)
+
+    def assertCutOut(self, coaddPatch, bbox):
+        """Check that a cut-out holds the pixels of ``bbox`` of the full patch.
+        """
+        self.assertEqual(coaddPatch.getBBox(), bbox)
+        np.testing.assert_array_equal(coaddPatch.image.array,
+                                      self.fullPatch[bbox].image.array)
+
+    def testFullPatchRead(self):
+        """Test that the ``_sub`` dataset is read as the full patch, and that
+        later requests are served from the cache.
+        """
+        bbox1 = geom.Box2I(geom.Point2I(105, 210), geom.Extent2I(10, 8))
+        bbox2 = geom.Box2I(geom.Point2I(120, 201), geom.Extent2I(15, 20))
+        self.assertCutOut(self.task._readPatch(self.sensorRef, self.makePatchArgDict(bbox1)), bbox1)
+        self.assertEqual(self.sensorRef.getCalls,
+                         [dict(datasetType="deepCoadd", tract=0, patch="1,2", numSubfilters=3)])
+        self.assertCutOut(self.task._readPatch(self.sensorRef, self.makePatchArgDict(bbox1)), bbox1)
+        self.assertCutOut(self.task._readPatch(self.sensorRef, self.makePatchArgDict(bbox2)), bbox2)
+        self.assertEqual(len(self.sensorRef.getCalls), 1)
+
+    def testReadBBox(self):
+        """Test that only ``readBBox`` is read if it covers the request, and
+        that the full patch is read for a request outside of it.
+        """
+        readBBox = geom.Box2I(geom.Point2I(100, 200), geom.Extent2I(20, 15))
+        bbox1 = geom.Box2I(geom.Point2I(105, 205), geom.Extent2I(10, 8))
+        bbox2 = geom.Box2I(geom.Point2I(110, 210), geom.Extent2I(10, 5))
+        bbox3 = geom.Box2I(geom.Point2I(125, 220), geom.Extent2I(10, 8))
+        self.assertCutOut(self.task._readPatch(self.sensorRef, self.makePatchArgDict(bbox1),
+                                               readBBox=readBBox), bbox1)
+        self.assertEqual(self.sensorRef.getCalls, [self.makePatchArgDict(readBBox)])
+        self.assertCutOut(self.task._readPatch(self.sensorRef, self.makePatchArgDict(bbox2),
+                                               readBBox=readBBox), bbox2)
+        self.assertEqual(len(self.sensorRef.getCalls), 1)
+        self.assertCutOut(self.task._readPatch(self.sensorRef, self.makePatchArgDict(bbox3),
+                                               readBBox=readBBox), bbox3)
+        self.assertEqual(len(self.sensorRef.getCalls), 2)
+        self.assertEqual(self.sensorRef.getCalls[1]["datasetType"], "deepCoadd")
+        self.assertNotIn("bbox", self.sensorRef.getCalls[1])
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
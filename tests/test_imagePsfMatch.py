@@ -28,9 +28,12 @@ import lsst.utils.tests
 from lsst.afw.geom import makeSkyWcs
 import lsst.afw.image as afwImage
 import lsst.afw.math as afwMath
+import lsst.afw.table as afwTable
 import lsst.ip.diffim as ipDiffim
 import lsst.ip.diffim.diffimTools as diffimTools
 import lsst.daf.base as dafBase
+import lsst.geom as geom
+from lsst.log import Log
 import lsst.log.utils as logUtils
 import lsst.meas.algorithms as measAlg
 
@@ -239,6 +242,71 @@ class PsfMatchTestCases(unittest.TestCase):
                     if b != 4 and s != 0:
                         self.assertAlmostEqual(fitCoeffs[b][s]/fakeCoeffs[b][s], 1.0, 1)
 
+    def testInitialSolution(self):
+        """Test seeding the solve with the kernel and background of a previous match.
+        """
+        tMi, sMi, sK, kcs, confake = diffimTools.makeFakeKernelSet(bgValue=0.0, addNoise=False)
+        confake.kernel.active.spatialKernelClipping = True
+        basisList = ipDiffim.makeKernelBasisList(confake.kernel.active)
+        psfMatchAL = ipDiffim.ImagePsfMatchTask(config=confake)
+        spatialSolution, psfMatchingKernel, backgroundModel = psfMatchAL._solve(kcs, basisList)
+
+        initialSolution = ipDiffim.PsfMatchSolution.fromKernel(psfMatchingKernel, backgroundModel)
+        self.assertIsNone(initialSolution.basisList)
+        self.assertIsNone(initialSolution.getCandidateList(tMi.getBBox()))
+        self.assertEqual(len(initialSolution.spatialBasisList), len(basisList))
+
+        tMi, sMi, sK, kcs, confake = diffimTools.makeFakeKernelSet(bgValue=0.0, addNoise=False)
+        spatialSolution, warmKernel, warmBackground = psfMatchAL._solve(kcs, basisList,
+                                                                        initialSolution=initialSolution)
+        fitCoeffs = psfMatchingKernel.getSpatialParameters()
+        warmCoeffs = warmKernel.getSpatialParameters()
+        for b in range(len(fitCoeffs)):
+            for s in range(len(fitCoeffs[b])):
+                self.assertAlmostEqual(warmCoeffs[b][s], fitCoeffs[b][s], 5)
+
+        # A solution that subtracts every candidate poorly is ignored
+        badKernel = psfMatchingKernel.clone()
+        badKernel.setSpatialParameters([[10*c for c in coeffs] for coeffs in fitCoeffs])
+        badSolution = ipDiffim.PsfMatchSolution.fromKernel(badKernel, backgroundModel)
+        tMi, sMi, sK, kcs, confake = diffimTools.makeFakeKernelSet(bgValue=0.0, addNoise=False)
+        spatialSolution, warmKernel, warmBackground = psfMatchAL._solve(kcs, basisList,
+                                                                        initialSolution=badSolution)
+        warmCoeffs = warmKernel.getSpatialParameters()
+        self.assertAlmostEqual(warmCoeffs[0][0], fitCoeffs[0][0], 5)
+
+    def testSourceToFootprintList(self):
+        """Test the screening of candidate sources for masked pixels and image edges.
+        """
+        wcs = self.makeWcs()
+        templateExposure = afwImage.ExposureF(geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(200, 200)), wcs)
+        scienceExposure = afwImage.ExposureF(geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(200, 200)), wcs)
+        satBit = afwImage.Mask.getPlaneBitMask("SAT")
+        scienceExposure.mask[55, 150, afwImage.PARENT] = satBit
+        scienceExposure.mask[100, 41, afwImage.PARENT] = satBit
+        templateExposure.mask[145, 45, afwImage.PARENT] = satBit
+
+        config = ipDiffim.ImagePsfMatchTask.ConfigClass().kernel.active.detectionConfig
+        config.scaleByFwhm = False
+        config.fpGrowPix = 10
+
+        catalog = afwTable.SourceCatalog(afwTable.SourceTable.makeMinimalSchema())
+        for x, y in [(100, 100), (50, 150), (150, 50), (5, 100), (300, 100), (100, 30)]:
+            catalog.addNew().setCoord(wcs.pixelToSky(x, y))
+        footprints = diffimTools.sourceToFootprintList(list(catalog), templateExposure, scienceExposure,
+                                                       21, config, Log.getLogger("ip.diffim.test"))
+
+        # Masked in the science and template images, and outside the image
+        self.assertEqual([fp["source"].getId() for fp in footprints],
+                         [catalog[0].getId(), catalog[3].getId(), catalog[5].getId()])
+        self.assertEqual(footprints[0]["footprint"].getBBox(),
+                         geom.Box2I(geom.Point2I(90, 90), geom.Point2I(110, 110)))
+        # Shrunk on the far side to stay centered at the edge
+        self.assertEqual(footprints[1]["footprint"].getBBox(),
+                         geom.Box2I(geom.Point2I(0, 90), geom.Point2I(10, 110)))
+        self.assertEqual(footprints[2]["footprint"].getBBox(),
+                         geom.Box2I(geom.Point2I(90, 20), geom.Point2I(110, 40)))
+
     def tearDown(self):
         del self.configAL
         del self.configDF
@@ -125,6 +125,34 @@ class DiffimTestCases(unittest.TestCase):
         # even though these do
         self.assertAlmostEqual(imstat.getRms(), afwStat.getValue(afwMath.STDEV))
 
+    def testImageStatisticsRobust(self, core=3):
+        rng = num.random.RandomState(12345)
+        mi = afwImage.MaskedImageF(geom.Extent2I(20, 21))
+        mi.getImage().getArray()[:, :] = rng.normal(size=(21, 20))
+        mi.getVariance().getArray()[:, :] = rng.uniform(0.5, 2.0, size=(21, 20))
+        maskPlane = self.ps.getArray("badMaskPlanes")[0]
+        mi.getMask().getArray()[:5, :] = afwImage.Mask.getPlaneBitMask(maskPlane)
+        resid = mi.getImage().getArray().astype(float)/num.sqrt(mi.getVariance().getArray().astype(float))
+
+        imstat = ipDiffim.ImageStatisticsF(self.ps)
+        imstat.apply(mi)
+        self.assertTrue(num.isnan(imstat.getMedian()))
+        self.assertTrue(num.isnan(imstat.getIqr()))
+
+        imstat.setRobustStats(True)
+        imstat.apply(mi)
+        good = resid[5:, :]
+        self.assertEqual(imstat.getNpix(), good.size)
+        self.assertAlmostEqual(imstat.getMean(), good.mean())
+        self.assertAlmostEqual(imstat.getMedian(), num.median(good))
+        self.assertAlmostEqual(imstat.getIqr(), num.subtract(*num.percentile(good, [75, 25])))
+
+        imstat.apply(mi, core)
+        good = resid[10 - core:10 + core + 1, 10 - core:10 + core + 1]
+        self.assertEqual(imstat.getNpix(), (2*core+1)**2)
+        self.assertAlmostEqual(imstat.getMedian(), num.median(good))
+        self.assertAlmostEqual(imstat.getIqr(), num.subtract(*num.percentile(good, [75, 25])))
+
     def testImageStatisticsMask1(self):
         # Mask value that gets ignored
         maskPlane = self.ps.getArray("badMaskPlanes")[0]
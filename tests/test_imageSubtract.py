@@ -22,6 +22,7 @@
 import os
 import unittest
 
+import numpy as np
 
 import lsst.utils.tests
 import lsst.utils
@@ -30,6 +31,7 @@ import lsst.afw.math as afwMath
 import lsst.geom as geom
 import lsst.ip.diffim as ipDiffim
 import lsst.log.utils as logUtils
+import lsst.pex.exceptions
 
 verbosity = 3
 logUtils.traceSetAt("ip.diffim", verbosity)
@@ -118,6 +120,36 @@ class DiffimTestCases(lsst.utils.tests.TestCase):
         self.runConvolveAndSubtract2(bgOrder=0)
         self.runConvolveAndSubtract2(bgOrder=2)
 
+    def testConvolveAndSubtractInto(self):
+        rng = np.random.RandomState(12345)
+        imsize = 3*self.kSize
+        tmi = afwImage.MaskedImageF(imsize, imsize)
+        smi = afwImage.MaskedImageF(imsize, imsize)
+        for mi in (tmi, smi):
+            mi.getImage().getArray()[:, :] = rng.normal(size=(imsize, imsize))
+            mi.getVariance().set(1.0)
+        smi.getMask().getArray()[3, :] = afwImage.Mask.getPlaneBitMask("SAT")
+        bgFunc = afwMath.PolynomialFunction2D(1)
+        bgFunc.setParameters([1.0, 0.1, -0.2])
+
+        # The output is entirely overwritten, so the same image may be reused
+        diffIm = afwImage.MaskedImageF(imsize, imsize)
+        for template in (tmi, tmi.getImage()):
+            for background in (10., bgFunc):
+                diffIm.getImage().set(123.)
+                diffIm.getMask().set(0xff)
+                diffIm.getVariance().set(456.)
+                ipDiffim.convolveAndSubtract(diffIm, template, smi, self.gaussKernel, background)
+                expected = ipDiffim.convolveAndSubtract(template, smi, self.gaussKernel, background)
+                np.testing.assert_array_equal(diffIm.getImage().getArray(), expected.getImage().getArray())
+                np.testing.assert_array_equal(diffIm.getMask().getArray(), expected.getMask().getArray())
+                np.testing.assert_array_equal(diffIm.getVariance().getArray(),
+                                              expected.getVariance().getArray())
+
+        with self.assertRaises(lsst.pex.exceptions.LengthError):
+            ipDiffim.convolveAndSubtract(afwImage.MaskedImageF(imsize, imsize + 1), tmi, smi,
+                                         self.gaussKernel, 0.)
+
 #####
 
 
@@ -22,6 +22,8 @@
 import os
 import unittest
 
+import numpy as np
+
 import lsst.utils.tests
 import lsst.utils
 import lsst.afw.image as afwImage
@@ -29,6 +31,7 @@ import lsst.afw.math as afwMath
 import lsst.geom as geom
 import lsst.ip.diffim as ipDiffim
 import lsst.pex.config as pexConfig
+import lsst.pex.exceptions
 import lsst.log.utils as logUtils
 import lsst.afw.table as afwTable
 
@@ -352,6 +355,16 @@ class DiffimTestCases(lsst.utils.tests.TestCase):
                     print(kMethod)
                     self.fail()
 
+        # The difference image may be written into an existing image
+        expected = kc.getDifferenceImage(ipDiffim.KernelCandidateF.RECENT)
+        diffIm = afwImage.MaskedImageF(expected.getDimensions())
+        diffIm.getImage().set(123.)
+        kc.getDifferenceImage(diffIm, ipDiffim.KernelCandidateF.RECENT)
+        np.testing.assert_array_equal(diffIm.getImage().getArray(), expected.getImage().getArray())
+        kc.getDifferenceImage(diffIm, kc.getKernel(ipDiffim.KernelCandidateF.ORIG), 0.)
+        expected = kc.getDifferenceImage(kc.getKernel(ipDiffim.KernelCandidateF.ORIG), 0.)
+        np.testing.assert_array_equal(diffIm.getImage().getArray(), expected.getImage().getArray())
+
         self.verifyDeltaFunctionSolution(kc.getKernelSolution(ipDiffim.KernelCandidateF.RECENT))
 
     @unittest.skipIf(not defDataDir, "Warning: afwdata is not set up")
@@ -518,6 +531,235 @@ class DiffimTestCases(lsst.utils.tests.TestCase):
                 nSeen += 1
         self.assertEqual(nSeen, 1)
 
+    def testInsertMany(self):
+        """Test inserting candidates built from stacks of stamps.
+        """
+        nCandidates = 3
+        xCenters = np.array([5., 25., 45.], dtype=np.float32)
+        yCenters = np.array([5., 5., 35.], dtype=np.float32)
+        templateStamps = np.ones((nCandidates, 11, 13), dtype=np.float32)
+        scienceStamps = 2*templateStamps
+        kernelCellSet = afwMath.SpatialCellSet(geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(50, 50)),
+                                               10, 10)
+        nInserted = ipDiffim.insertKernelCandidates(kernelCellSet, xCenters, yCenters,
+                                                    templateStamps, scienceStamps, self.ps)
+        self.assertEqual(nInserted, nCandidates)
+        candidates = [cand for cell in kernelCellSet.getCellList() for cand in cell.begin(False)]
+        self.assertEqual(len(candidates), nCandidates)
+        for cand in candidates:
+            templateMI = cand.getTemplateMaskedImage()
+            scienceMI = cand.getScienceMaskedImage()
+            self.assertEqual(templateMI.getDimensions(), geom.Extent2I(13, 11))
+            self.assertFloatsEqual(templateMI.getImage().getArray(), 1.)
+            self.assertFloatsEqual(scienceMI.getImage().getArray(), 2.)
+            self.assertFloatsEqual(scienceMI.getVariance().getArray(), 1.)
+            self.assertFloatsEqual(scienceMI.getMask().getArray(), 0)
+
+        with self.assertRaises(lsst.pex.exceptions.LengthError):
+            ipDiffim.insertKernelCandidates(kernelCellSet, xCenters[:2], yCenters,
+                                            templateStamps, scienceStamps, self.ps)
+
+    def testSaveLoad(self):
+        """Test that saved candidates are restored with their solutions.
+        """
+        config = ipDiffim.ImagePsfMatchTask.ConfigClass()
+        config.kernel.name = "AL"
+        subconfig = config.kernel.active
+        subconfig.fitForBackground = True
+        ps = pexConfig.makePropertySet(subconfig)
+        basisList = ipDiffim.makeKernelBasisList(subconfig)
+
+        rng = np.random.RandomState(12345)
+        yy, xx = np.mgrid[0:100, 0:100]
+        templateMI = afwImage.MaskedImageF(geom.Extent2I(100, 100))
+        templateMI.setXY0(geom.Point2I(10, 20))
+        templateMI.getImage().getArray()[:, :] = 1000.*(np.exp(-((xx - 30)**2 + (yy - 50)**2)/8.) +
+                                                        np.exp(-((xx - 70)**2 + (yy - 50)**2)/8.))
+        templateMI.getImage().getArray()[:, :] += rng.normal(0., 1., (100, 100))
+        templateMI.getVariance().set(1.)
+        scienceMI = templateMI.clone()
+        scienceMI.getImage().getArray()[:, :] *= 2.
+        scienceMI.getImage().getArray()[:, :] += 10.
+
+        kernelCellSet = afwMath.SpatialCellSet(templateMI.getBBox(), 50, 50)
+        for i, (x, y) in enumerate([(40, 70), (80, 70)]):
+            bbox = geom.Box2I(geom.Point2I(x - 15, y - 15), geom.Extent2I(31, 31))
+            cand = ipDiffim.makeKernelCandidate(x, y,
+                                                afwImage.MaskedImageF(templateMI, bbox, afwImage.PARENT),
+                                                afwImage.MaskedImageF(scienceMI, bbox, afwImage.PARENT),
+                                                ps)
+            if i == 0:
+                cand.build(basisList)
+                cand.setStatus(afwMath.SpatialCellCandidate.GOOD)
+            kernelCellSet.insertCandidate(cand)
+
+        with lsst.utils.tests.getTempFilePath(".npz") as filename:
+            # The suffix is added when saving and loading alike
+            basename = filename[:-len(".npz")]
+            ipDiffim.saveKernelCellSet(kernelCellSet, basisList, basename)
+            loadedCellSet, loadedBasisList = ipDiffim.loadKernelCellSet(basename, templateMI, scienceMI, ps)
+
+        self.assertEqual(len(loadedBasisList), len(basisList))
+        for kernel, loadedKernel in zip(basisList, loadedBasisList):
+            image = afwImage.ImageD(kernel.getDimensions())
+            kernel.computeImage(image, False)
+            loadedImage = afwImage.ImageD(loadedKernel.getDimensions())
+            loadedKernel.computeImage(loadedImage, False)
+            self.assertImagesAlmostEqual(image, loadedImage)
+
+        candidates = [cand for cell in kernelCellSet.getCellList() for cand in cell.begin(False)]
+        loadedCandidates = [cand for cell in loadedCellSet.getCellList() for cand in cell.begin(False)]
+        self.assertEqual(len(loadedCandidates), len(candidates))
+        for cand, loadedCand in zip(candidates, loadedCandidates):
+            self.assertEqual(loadedCand.getXCenter(), cand.getXCenter())
+            self.assertEqual(loadedCand.getYCenter(), cand.getYCenter())
+            self.assertEqual(loadedCand.getStatus(), cand.getStatus())
+            self.assertEqual(loadedCand.isInitialized(), cand.isInitialized())
+            self.assertMaskedImagesEqual(loadedCand.getScienceMaskedImage(), cand.getScienceMaskedImage())
+            if not cand.isInitialized():
+                continue
+            solution = cand.getKernelSolution(ipDiffim.KernelCandidateF.ORIG)
+            loadedSolution = loadedCand.getKernelSolution(ipDiffim.KernelCandidateF.ORIG)
+            self.assertFloatsAlmostEqual(loadedSolution.getM(), solution.getM())
+            self.assertFloatsAlmostEqual(loadedSolution.getB(), solution.getB())
+            self.assertAlmostEqual(loadedCand.getBackground(ipDiffim.KernelCandidateF.ORIG),
+                                   cand.getBackground(ipDiffim.KernelCandidateF.ORIG))
+            self.assertImagesAlmostEqual(loadedCand.getKernelImage(ipDiffim.KernelCandidateF.ORIG),
+                                         cand.getKernelImage(ipDiffim.KernelCandidateF.ORIG))
+
+    def testSolve(self):
+        """Test the LDLT solution, its condition number and the eigenvector fallback.
+        """
+        basisList = ipDiffim.makeDeltaFunctionBasisList(2, 2)
+        rng = np.random.RandomState(12345)
+        aMat = rng.normal(size=(10, 4))
+        mMat = aMat.T @ aMat
+        bVec = rng.normal(size=4)
+
+        solution = ipDiffim.StaticKernelSolutionF(basisList, False)
+        solution.setNormalEquations(mMat, bVec)
+        eigenCondition = solution.getConditionNumber(ipDiffim.KernelSolution.EIGENVALUE)
+        ldltCondition = solution.getConditionNumber(ipDiffim.KernelSolution.LDLT)
+        eValues = np.linalg.eigvalsh(mMat)
+        self.assertAlmostEqual(eigenCondition/(eValues.max()/eValues.min()), 1.0)
+        self.assertGreater(ldltCondition, eigenCondition/4)
+        self.assertLess(ldltCondition, eigenCondition*4)
+        solution.solve()
+        self.assertEqual(solution.getSolvedBy(), ipDiffim.KernelSolution.CHOLESKY_LDLT)
+        self.assertFloatsAlmostEqual(np.array(solution.getKernel().getKernelParameters()),
+                                     np.linalg.solve(mMat, bVec), rtol=1e-10)
+
+        # The eigensystem of an EIGENVALUE check is used to solve
+        solution = ipDiffim.StaticKernelSolutionF(basisList, False)
+        solution.setNormalEquations(mMat, bVec)
+        self.assertAlmostEqual(solution.getConditionNumber(ipDiffim.KernelSolution.EIGENVALUE)/eigenCondition,
+                               1.0)
+        solution.solve()
+        self.assertEqual(solution.getSolvedBy(), ipDiffim.KernelSolution.EIGENVECTOR)
+        self.assertFloatsAlmostEqual(np.array(solution.getKernel().getKernelParameters()),
+                                     np.linalg.solve(mMat, bVec), rtol=1e-10)
+        self.assertAlmostEqual(solution.getConditionNumber(ipDiffim.KernelSolution.EIGENVALUE)/eigenCondition,
+                               1.0)
+
+        # A singular matrix is pseudo-inverted
+        mMat = np.diag([2., 3., 0., 5.])
+        solution = ipDiffim.StaticKernelSolutionF(basisList, False)
+        solution.setNormalEquations(mMat, bVec)
+        self.assertEqual(solution.getConditionNumber(ipDiffim.KernelSolution.LDLT), np.inf)
+        solution.solve()
+        self.assertEqual(solution.getSolvedBy(), ipDiffim.KernelSolution.EIGENVECTOR)
+        self.assertFloatsAlmostEqual(np.array(solution.getKernel().getKernelParameters()),
+                                     np.array([bVec[0]/2., bVec[1]/3., 0., bVec[3]/5.]), rtol=1e-10)
+
+    def testEstimateRisk(self):
+        """Test the scan and refinement of the regularization strength.
+        """
+        self.subconfig.kernelSize = 7
+        self.subconfig.kernelSizeMin = 7
+        self.subconfig.lambdaType = "minimizeUnbiasedRisk"
+        ps = pexConfig.makePropertySet(self.subconfig)
+        basisList = ipDiffim.makeKernelBasisList(self.subconfig)
+        hMat = ipDiffim.makeRegularizationMatrix(ps)
+
+        rng = np.random.RandomState(12345)
+        yy, xx = np.mgrid[0:31, 0:31]
+        template = afwImage.ImageF(31, 31)
+        template.getArray()[:, :] = 1000.*np.exp(-((xx - 15)**2 + (yy - 15)**2)/8.) + 100.
+        science = afwImage.ImageF(31, 31)
+        science.getArray()[:, :] = (1000.*np.exp(-((xx - 15)**2 + (yy - 15)**2)/12.) + 100. +
+                                    rng.normal(0., 10., (31, 31)))
+        variance = afwImage.ImageF(31, 31)
+        variance.set(100.)
+
+        lambdas = 10**np.arange(self.subconfig.lambdaMin, self.subconfig.lambdaMax + 1e-6,
+                                self.subconfig.lambdaStep)
+        solution = ipDiffim.RegularizedKernelSolutionF(basisList, False, hMat, ps)
+        solution.build(template, science, variance)
+        lambdaGrid = solution.estimateRisk(np.finfo(float).max)
+        self.assertFloatsAlmostEqual(np.min(np.abs(lambdas - lambdaGrid)), 0., atol=1e-6*lambdaGrid)
+
+        ps["lambdaRefine"] = True
+        solution = ipDiffim.RegularizedKernelSolutionF(basisList, False, hMat, ps)
+        solution.build(template, science, variance)
+        lambdaRefined = solution.estimateRisk(np.finfo(float).max)
+        self.assertGreaterEqual(lambdaRefined, lambdaGrid/10**self.subconfig.lambdaStep)
+        self.assertLessEqual(lambdaRefined, lambdaGrid*10**self.subconfig.lambdaStep)
+
+        solution.solve()
+        self.assertAlmostEqual(solution.getLambda(), lambdaRefined)
+
+    def testSubBasis(self):
+        """Test that lower-degree bases are solved from sub-blocks of the full normal equations.
+        """
+        config = ipDiffim.ImagePsfMatchTask.ConfigClass()
+        config.kernel.name = "AL"
+        subconfig = config.kernel.active
+        subconfig.alardDegGauss = (2, 2, 2)
+        basisList = ipDiffim.makeKernelBasisList(subconfig)
+        subDegGauss = [1, 2, 1]
+        subBasisList = ipDiffim.makeKernelBasisList(subconfig, basisDegGauss=subDegGauss)
+        indices = ipDiffim.NbasisEvaluator._subBasisIndices(subconfig.alardDegGauss, subDegGauss)
+        self.assertEqual(len(indices), len(subBasisList))
+        for i, kernel in zip(indices, subBasisList):
+            image = afwImage.ImageD(kernel.getDimensions())
+            kernel.computeImage(image, False)
+            fullImage = afwImage.ImageD(kernel.getDimensions())
+            basisList[i].computeImage(fullImage, False)
+            self.assertImagesAlmostEqual(image, fullImage)
+
+        rng = np.random.RandomState(12345)
+        yy, xx = np.mgrid[0:41, 0:41]
+        template = afwImage.ImageF(41, 41)
+        template.getArray()[:, :] = 1000.*np.exp(-((xx - 20)**2 + (yy - 20)**2)/8.)
+        science = afwImage.ImageF(41, 41)
+        science.getArray()[:, :] = (1000.*np.exp(-((xx - 21)**2 + (yy - 20)**2)/12.) + 10. +
+                                    rng.normal(0., 3., (41, 41)))
+        variance = afwImage.ImageF(41, 41)
+        variance.set(9.)
+
+        solution = ipDiffim.StaticKernelSolutionF(basisList, True)
+        solution.build(template, science, variance)
+        subSolution = ipDiffim.StaticKernelSolutionF(subBasisList, True)
+        subSolution.build(template, science, variance)
+        subSolution.solve()
+
+        idx = indices + [len(basisList)]
+        mMat = solution.getM()
+        bVec = solution.getB()
+        self.assertFloatsAlmostEqual(mMat[np.ix_(idx, idx)], subSolution.getM(), rtol=1e-10)
+        self.assertFloatsAlmostEqual(bVec[idx], subSolution.getB(), rtol=1e-10)
+
+        # The algebraic chi^2 matches that of the difference image
+        aSub = np.linalg.solve(mMat[np.ix_(idx, idx)], bVec[idx])
+        chi2 = solution.getWeightedScienceNorm() - np.dot(bVec[idx], aSub)
+        kernel, background = subSolution.getSolutionPair()
+        convolved = afwImage.ImageF(template.getDimensions())
+        afwMath.convolve(convolved, template, kernel, False)
+        bbox = kernel.shrinkBBox(template.getBBox(afwImage.LOCAL))
+        diffim = (afwImage.ImageF(science, bbox, afwImage.LOCAL).getArray() -
+                  afwImage.ImageF(convolved, bbox, afwImage.LOCAL).getArray() - background)
+        self.assertFloatsAlmostEqual(chi2, np.sum(diffim**2/9.), rtol=1e-4)
+
     @unittest.skipIf(not display, "display is None: skipping testDisp")
     def testDisp(self):
         afwDisplay.Display(frame=1).mtv(self.scienceImage2,
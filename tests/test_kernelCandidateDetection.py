@@ -4,6 +4,8 @@ import unittest
 
 import lsst.utils.tests
 import lsst.utils
+import lsst.afw.detection as afwDetect
+import lsst.afw.geom as afwGeom
 import lsst.afw.image as afwImage
 import lsst.afw.math as afwMath
 import lsst.geom as geom
@@ -97,6 +99,31 @@ class DiffimTestCases(lsst.utils.tests.TestCase):
         fpList3 = kcDetect.getFootprints()
         self.assertEqual(len(fpList3), (len(fpList1)-3))
 
+    def testGrowCandidate(self):
+        """Test the masked pixel checks of grown footprints, with offset images.
+        """
+        templateImage = afwImage.MaskedImageF(geom.Box2I(geom.Point2I(10, 20), geom.Extent2I(100, 100)))
+        scienceImage = afwImage.MaskedImageF(geom.Box2I(geom.Point2I(20, 20), geom.Extent2I(100, 100)))
+        detConfig = self.subconfig.detectionConfig
+        maskVal = afwImage.Mask.getPlaneBitMask(detConfig.badMaskPlanes[0])
+        kcDetect = ipDiffim.KernelCandidateDetectionF(pexConfig.makePropertySet(detConfig))
+
+        def makeFootprint(x, y):
+            return afwDetect.Footprint(afwGeom.SpanSet(geom.Box2I(geom.Point2I(x, y), geom.Extent2I(1, 1))))
+
+        self.assertTrue(kcDetect.growCandidate(makeFootprint(60, 70), 5, templateImage, scienceImage))
+        # Grown off the template, and into pixels that are not in the science image
+        self.assertFalse(kcDetect.growCandidate(makeFootprint(60, 22), 5, templateImage, scienceImage))
+        self.assertFalse(kcDetect.growCandidate(makeFootprint(22, 70), 5, templateImage, scienceImage))
+
+        # Masked pixels on the edge of the grown box and just outside it
+        scienceImage.mask[66, 70, afwImage.PARENT] = maskVal
+        self.assertFalse(kcDetect.growCandidate(makeFootprint(60, 70), 6, templateImage, scienceImage))
+        self.assertTrue(kcDetect.growCandidate(makeFootprint(60, 70), 5, templateImage, scienceImage))
+        templateImage.mask[60, 65, afwImage.PARENT] = maskVal
+        self.assertFalse(kcDetect.growCandidate(makeFootprint(60, 70), 5, templateImage, scienceImage))
+        self.assertEqual(len(kcDetect.getFootprints()), 2)
+
 #####
 
 
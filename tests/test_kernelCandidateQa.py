@@ -0,0 +1,99 @@
+#
+# LSST Data Management System
+# Copyright 2008-2016 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.afw.image as afwImage
+import lsst.ip.diffim as ipDiffim
+from lsst.ip.diffim.utils import calcCentroid, calcWidth
+
+try:
+    import scipy.stats
+except ImportError:
+    scipy = None
+
+
+class KernelCandidateQaTestCase(lsst.utils.tests.TestCase):
+
+    @unittest.skipIf(scipy is None, "scipy is not available")
+    def testBatchStats(self):
+        """Test the statistics of several difference images against scipy.
+        """
+        rng = np.random.RandomState(12345)
+        diList = []
+        residList = []
+        for size, scale in [(21, 1.0), (35, 1.5), (9, 0.7)]:
+            di = afwImage.MaskedImageF(size, size)
+            di.getImage().getArray()[:, :] = rng.normal(0.1, scale, (size, size))
+            di.getVariance().set(scale**2)
+            di.getMask().getArray()[0, :] = afwImage.Mask.getPlaneBitMask("SAT")
+            # Detections are kept
+            di.getMask().getArray()[1, :] = afwImage.Mask.getPlaneBitMask("DETECTED")
+            diList.append(di)
+            residList.append(di.getImage().getArray()[1:, :].astype(float).flatten()/scale)
+
+        results = ipDiffim.KernelCandidateQa._calculateBatchStats(diList, dof=2)
+        for i, (di, resid) in enumerate(zip(diList, residList)):
+            D, prob = scipy.stats.kstest(resid, "norm")
+            A2 = scipy.stats.anderson(resid, "norm")[0]
+            self.assertFloatsAlmostEqual(results["mean"][i], resid.mean(), rtol=1e-6)
+            self.assertFloatsAlmostEqual(results["stdev"][i], resid.std(), rtol=1e-6)
+            self.assertFloatsAlmostEqual(results["median"][i], np.median(resid), rtol=1e-6)
+            self.assertFloatsAlmostEqual(results["iqr"][i], np.subtract(*np.percentile(resid, [75, 25])),
+                                         rtol=1e-6)
+            self.assertFloatsAlmostEqual(results["rchisq"][i], np.sum(resid**2)/(len(resid) - 3),
+                                         rtol=1e-6)
+            self.assertFloatsAlmostEqual(results["D"][i], D, rtol=1e-6)
+            self.assertFloatsAlmostEqual(results["prob"][i], prob, rtol=1e-5)
+            self.assertFloatsAlmostEqual(results["A2"][i], A2, rtol=1e-5)
+
+            # A single image gives the same result
+            single = ipDiffim.KernelCandidateQa._calculateStats(di, dof=2)
+            self.assertFloatsAlmostEqual(single["A2"], results["A2"][i])
+            self.assertFloatsAlmostEqual(single["crit"], results["crit"][i])
+
+    def testMoments(self):
+        """Test the moments of a stack of kernel images.
+        """
+        rng = np.random.RandomState(12345)
+        images = rng.normal(size=(3, 19, 21))
+        centx, centy, stdx, stdy = ipDiffim.KernelCandidateQa._calcMoments(images)
+        for i, image in enumerate(images):
+            cx, cy = calcCentroid(image)
+            sx, sy = calcWidth(image, cx, cy)
+            self.assertFloatsAlmostEqual(np.array([centx[i], centy[i], stdx[i], stdy[i]]),
+                                         np.array([cx, cy, sx, sy]), rtol=1e-10)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 
+import numpy as np
 
 import lsst.utils.tests
 import lsst.afw.image as afwImage
@@ -106,6 +107,51 @@ class DiffimTestCases(lsst.utils.tests.TestCase):
                 self.assertLess(abs(kRefIm[x, y, afwImage.LOCAL] - kImage0[x, y, afwImage.LOCAL]) /
                                 kRefIm[x, y, afwImage.LOCAL], 0.2)
 
+    def testTruncated(self, size=21, nImage=50, nComponents=3):
+        """Test that the truncated Pca finds the leading components of the full Pca.
+        """
+        rng = np.random.RandomState(12345)
+        shapes = []
+        for sigmaX, sigmaY in ((1.5, 1.5), (2.5, 1.5), (1.5, 3.0)):
+            gaussKernel = afwMath.AnalyticKernel(size, size, afwMath.GaussianFunction2D(sigmaX, sigmaY))
+            kImage = afwImage.ImageD(gaussKernel.getDimensions())
+            gaussKernel.computeImage(kImage, True)
+            shapes.append(kImage.getArray())
+
+        imagePcaFull = ipDiffim.KernelPcaD()
+        imagePcaTrunc = ipDiffim.KernelPcaD(nComponents=nComponents)
+        self.assertEqual(imagePcaTrunc.getNComponents(), nComponents)
+        kpvFull = ipDiffim.KernelPcaVisitorF(imagePcaFull)
+        kpvTrunc = ipDiffim.KernelPcaVisitorF(imagePcaTrunc)
+        for i in range(nImage):
+            coeffs = rng.uniform(0.2, 1.0, len(shapes))
+            kImage = afwImage.ImageD(size, size)
+            kImage.getArray()[:, :] = sum(c*s for c, s in zip(coeffs, shapes))
+            kImage.getArray()[:, :] += rng.normal(0., 1e-5, (size, size))
+            imagePcaFull.addImage(kImage, 1.0)
+            imagePcaTrunc.addImage(afwImage.ImageD(kImage, True), 1.0)
+
+        kpvFull.subtractMean()
+        kpvTrunc.subtractMean()
+        imagePcaFull.analyze()
+        imagePcaTrunc.analyze()
+
+        eValFull = imagePcaFull.getEigenValues()
+        eValTrunc = imagePcaTrunc.getEigenValues()
+        self.assertEqual(len(eValTrunc), nComponents)
+        self.assertFloatsAlmostEqual(np.array(eValTrunc), np.array(eValFull[:nComponents]), rtol=1e-6)
+
+        # Mean kernel first, then the normalized eigenkernels
+        basisFull = kpvFull.getEigenKernels()
+        basisTrunc = kpvTrunc.getEigenKernels()
+        self.assertEqual(len(basisTrunc), nComponents + 1)
+        for kFull, kTrunc in zip(basisFull, basisTrunc):
+            imageFull = afwImage.ImageD(kFull.getDimensions())
+            kFull.computeImage(imageFull, False)
+            imageTrunc = afwImage.ImageD(kTrunc.getDimensions())
+            kTrunc.computeImage(imageTrunc, False)
+            self.assertImagesAlmostEqual(imageTrunc, imageFull, atol=1e-5)
+
     def testImagePca(self):
         # Test out the ImagePca behavior
         kc1 = self.makeCandidate(1, 0.0, 0.0)
@@ -116,6 +116,36 @@ class PsfMatchTestCases(lsst.utils.tests.TestCase):
         self.assertEqual(psfMatchedExposure.getInfo().getVisitInfo(),
                          self.exp.getInfo().getVisitInfo())
 
+    def testCachedPsf(self):
+        """Test that cached Psf evaluations match direct evaluations.
+        """
+        psf = self.exp.getPsf()
+        cachedPsf = ipDiffim.CachedPsf(psf, gridSpacing=10.)
+        positions = [geom.Point2D(x, y) for x in (12.3, 47.0) for y in (3.0, 88.6)]
+        cachedPsf.prefill(positions, doImage=True)
+        self.assertEqual(len(cachedPsf), 2*len(positions))
+        for position in positions:
+            gridPosition = cachedPsf.getGridPosition(position)
+            self.assertImagesAlmostEqual(cachedPsf.computeKernelImage(position),
+                                         psf.computeKernelImage(gridPosition))
+            self.assertImagesAlmostEqual(cachedPsf.computeImage(position), psf.computeImage(position))
+            self.assertEqual(cachedPsf.computeBBox(position), psf.computeBBox(gridPosition))
+
+        # Returned images are copies, so modifying them does not alter the cache
+        image = cachedPsf.computeKernelImage(positions[0])
+        image.set(0.)
+        self.assertGreater(cachedPsf.computeKernelImage(positions[0]).getArray().sum(), 0.)
+
+        # Nearby positions share an evaluation of the kernel image
+        cachedPsf.computeKernelImage(geom.Point2D(12.0, 3.4))
+        self.assertEqual(len(cachedPsf), 2*len(positions))
+
+        psfModel = measAlg.DoubleGaussianPsf(self.ksize + 2, self.ksize + 2, self.sigma2)
+        psfMatch = ipDiffim.ModelPsfMatchTask(config=self.config)
+        results = psfMatch.run(self.exp, psfModel)
+        nCandidates = sum(cell.size() for cell in results.kernelCellSet.getCellList())
+        self.assertEqual(nCandidates, 16)
+
     def tearDown(self):
         del self.exp
         del self.subconfig
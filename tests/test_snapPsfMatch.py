@@ -111,6 +111,39 @@ class PsfMatchTestCases(lsst.utils.tests.TestCase):
         psfMatchDF.subtractMaskedImages(tMi, sMi, psfMatchDF.makeCandidateList(tExp, sExp, self.ksize))
         psfMatchDFr.subtractMaskedImages(tMi, sMi, psfMatchDFr.makeCandidateList(tExp, sExp, self.ksize))
 
+    def testReuseSolution(self):
+        """Test seeding a snap subtraction with the solution of a previous one.
+        """
+        tMi, sMi, sK, kcs, confake = diffimTools.makeFakeKernelSet(bgValue=self.bgValue)
+        tExp = afwImage.ExposureF(tMi, self.makeWcs(offset=0))
+        sExp = afwImage.ExposureF(sMi, self.makeWcs(offset=0))
+        sExp.setPsf(self.psf)
+
+        for config in (self.configAL, self.configDF, self.configDFr):
+            psfMatch = ipDiffim.SnapPsfMatchTask(config=config)
+            candidateList = psfMatch.makeCandidateList(tExp, sExp, self.ksize)
+            results = psfMatch.subtractMaskedImages(tMi, sMi, candidateList)
+            solution = results.solution
+            self.assertEqual(solution.bbox, tMi.getBBox())
+
+            refit = psfMatch.subtractMaskedImages(tMi, sMi, candidateList, initialSolution=solution)
+            self.assertEqual(len(refit.solution.spatialBasisList), len(solution.spatialBasisList))
+            self.assertEqual(refit.solution.isPcaBasis, solution.isPcaBasis)
+            kImage = afwImage.ImageD(results.psfMatchingKernel.getDimensions())
+            results.psfMatchingKernel.computeImage(kImage, False)
+            refitImage = afwImage.ImageD(refit.psfMatchingKernel.getDimensions())
+            refit.psfMatchingKernel.computeImage(refitImage, False)
+            self.assertImagesAlmostEqual(kImage, refitImage, atol=1e-4)
+
+        # The task remembers the previous solution, and reuses its candidates
+        self.configAL.doReuseSolution = True
+        psfMatch = ipDiffim.SnapPsfMatchTask(config=self.configAL)
+        self.assertIsNone(psfMatch.solution)
+        first = psfMatch.subtractExposures(tExp, sExp)
+        second = psfMatch.subtractExposures(tExp, sExp)
+        self.assertIs(psfMatch.solution, second.solution)
+        self.assertEqual(len(second.solution.candidateList), len(first.solution.candidateList))
+
     def tearDown(self):
         del self.configAL
         del self.configDF
@@ -1,9 +1,11 @@
+import gc
 import os
 import unittest
 
 
 import lsst.utils.tests
 import lsst.utils
+import lsst.afw.geom as afwGeom
 import lsst.afw.image as afwImage
 import lsst.afw.math as afwMath
 import lsst.geom as geom
@@ -173,6 +175,45 @@ class DiffimTestCases(lsst.utils.tests.TestCase):
         else:
             self.fail()
 
+    def testWarpedTemplateCache(self):
+        bbox = geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(20, 30))
+        crval = geom.SpherePoint(45.0, 45.0, geom.degrees)
+        cdMatrix = afwGeom.makeCdMatrix(scale=0.2*geom.arcseconds)
+        wcs = afwGeom.makeSkyWcs(crpix=geom.Point2D(10, 15), crval=crval, cdMatrix=cdMatrix)
+        templateExposure = afwImage.ExposureF(bbox, wcs)
+        warpedExposure = afwImage.ExposureF(bbox, wcs)
+        warpedExposure.image.array[:] = 1.
+        warpingConfig = self.subconfig.warpingConfig
+
+        cache = ipDiffim.WarpedTemplateCache(maxSize=1)
+        self.assertIsNone(cache.get(templateExposure, wcs, bbox, warpingConfig))
+        cache.put(templateExposure, wcs, bbox, warpingConfig, warpedExposure)
+        cached = cache.get(templateExposure, wcs, bbox, warpingConfig)
+        self.assertFloatsEqual(cached.image.array, warpedExposure.image.array)
+
+        # Copies are returned, so modifying them must not change the cache
+        cached.image.array[:] = 2.
+        cached = cache.get(templateExposure, wcs, bbox, warpingConfig)
+        self.assertFloatsEqual(cached.image.array, warpedExposure.image.array)
+
+        # Only the same template object, destination bbox, and config match
+        self.assertIsNone(cache.get(templateExposure.clone(), wcs, bbox, warpingConfig))
+        subBBox = geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(10, 10))
+        self.assertIsNone(cache.get(templateExposure, wcs, subBBox, warpingConfig))
+        otherConfig = type(warpingConfig)()
+        otherConfig.warpingKernelName = "bilinear"
+        self.assertIsNone(cache.get(templateExposure, wcs, bbox, otherConfig))
+
+        # The least recently used entry is evicted
+        cache.put(templateExposure, wcs, subBBox, warpingConfig, warpedExposure[subBBox])
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.get(templateExposure, wcs, bbox, warpingConfig))
+
+        # The cache does not keep the input template alive
+        del templateExposure
+        gc.collect()
+        self.assertEqual(len(cache), 0)
+
     def testXY0(self):
         self.runXY0('polynomial')
         self.runXY0('chebyshev1')